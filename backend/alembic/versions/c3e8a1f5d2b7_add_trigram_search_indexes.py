@@ -0,0 +1,40 @@
+"""Add trigram indexes for invoice and contact search
+
+Revision ID: c3e8a1f5d2b7
+Revises: 81a00dbfa409
+Create Date: 2026-10-18 10:12:31.402518
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3e8a1f5d2b7'
+down_revision: Union[str, None] = '81a00dbfa409'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TRIGRAM_INDEXES = [
+    ('ix_invoices_invoice_number_trgm', 'invoices', 'invoice_number'),
+    ('ix_contacts_name_trgm', 'contacts', 'name'),
+    ('ix_contacts_email_trgm', 'contacts', 'email'),
+]
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    # Build concurrently so large tables stay writable; that cannot run inside a transaction
+    with op.get_context().autocommit_block():
+        for name, table, column in TRIGRAM_INDEXES:
+            op.create_index(name, table, [column], unique=False, postgresql_using='gin',
+                            postgresql_ops={column: 'gin_trgm_ops'}, postgresql_concurrently=True,
+                            if_not_exists=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, _ in TRIGRAM_INDEXES:
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,53 @@
+"""Add tenant-scoped composite indexes on invoices and contacts
+
+Revision ID: d4f9b2c6e8a1
+Revises: c3e8a1f5d2b7
+Create Date: 2026-10-18 11:47:05.918234
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4f9b2c6e8a1'
+down_revision: Union[str, None] = 'c3e8a1f5d2b7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+COMPOSITE_INDEXES = [
+    ('ix_invoices_user_id_id', 'invoices', ['user_id', 'id']),
+    ('ix_invoices_user_id_invoice_date', 'invoices', ['user_id', 'invoice_date', 'id']),
+    ('ix_invoices_user_id_total', 'invoices', ['user_id', 'total', 'id']),
+    ('ix_invoices_user_id_invoice_number', 'invoices', ['user_id', 'invoice_number', 'id']),
+    ('ix_invoices_user_id_status_invoice_date', 'invoices', ['user_id', 'status', 'invoice_date', 'id']),
+    ('ix_invoices_user_id_bill_to_id_invoice_date', 'invoices', ['user_id', 'bill_to_id', 'invoice_date', 'id']),
+    ('ix_contacts_user_id_name', 'contacts', ['user_id', 'name', 'id']),
+]
+# Superseded by the composite indexes above
+SINGLE_COLUMN_INDEXES = [
+    ('ix_invoices_invoice_date', 'invoice_date'),
+    ('ix_invoices_total', 'total'),
+    ('ix_invoices_status', 'status'),
+]
+
+
+def upgrade() -> None:
+    # Build concurrently so the table stays writable; that cannot run inside a transaction
+    with op.get_context().autocommit_block():
+        for name, table, columns in COMPOSITE_INDEXES:
+            op.create_index(name, table, columns, unique=False,
+                            postgresql_concurrently=True, if_not_exists=True)
+        for name, _ in SINGLE_COLUMN_INDEXES:
+            op.drop_index(name, table_name='invoices', postgresql_concurrently=True, if_exists=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, column in SINGLE_COLUMN_INDEXES:
+            op.create_index(name, 'invoices', [column], unique=False,
+                            postgresql_concurrently=True, if_not_exists=True)
+        for name, table, _ in COMPOSITE_INDEXES:
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
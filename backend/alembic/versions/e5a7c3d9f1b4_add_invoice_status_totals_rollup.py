@@ -0,0 +1,41 @@
+"""Add the per-user invoice status totals rollup
+
+Revision ID: e5a7c3d9f1b4
+Revises: d4f9b2c6e8a1
+Create Date: 2026-10-18 15:02:47.118305
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5a7c3d9f1b4'
+down_revision: Union[str, None] = 'd4f9b2c6e8a1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'invoice_status_totals',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('status', postgresql.ENUM('PAID', 'UNPAID', 'OVERDUE', name='invoicestatusenum', create_type=False),
+                  nullable=False),
+        sa.Column('invoice_count', sa.Integer(), nullable=False),
+        sa.Column('total_amount', sa.DECIMAL(precision=14, scale=2), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('user_id', 'status'),
+    )
+    # Start from the existing invoices; the invoice writes keep it current from here
+    op.execute(
+        "INSERT INTO invoice_status_totals (user_id, status, invoice_count, total_amount) "
+        "SELECT user_id, status, count(*), coalesce(sum(total), 0) FROM invoices GROUP BY user_id, status"
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('invoice_status_totals')
@@ -1,4 +1,5 @@
 from .contacts import router as contacts_router
 from .invoices import router as invoices_router
+from .render_jobs import router as render_jobs_router
 from .templates import router as templates_router
 from .auth import router as auth_router
\ No newline at end of file
@@ -1,3 +1,4 @@
+from datetime import date
 from typing import List
 from fastapi import APIRouter, Depends, Query
 from sqlalchemy.exc import IntegrityError
@@ -9,6 +10,8 @@ from ..database import get_async_db
 from ..schemas.contact import Contact, ContactCreate
 from ..schemas.user import User
 from ..services.contact import crud
+from ..services.invoice.statement import generate_statement_pdf
+from .responses import pdf_response
 
 router = APIRouter()
 
@@ -93,4 +96,22 @@ async def delete_contact(
     except NotFoundError:
         raise NotFoundError("contact")
     except BadRequestError as e:
-        raise BadRequestError(str(e))
\ No newline at end of file
+        raise BadRequestError(str(e))
+
+
+@router.get("/{contact_id}/statement")
+async def get_contact_statement(
+    contact_id: int,
+    template_id: int,
+    date_from: date | None = None,
+    date_to: date | None = None,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Render every invoice billed to the contact in the date range into one statement PDF.
+    """
+    rendered = await generate_statement_pdf(
+        db, contact_id, template_id, current_user.id, date_from=date_from, date_to=date_to
+    )
+    return pdf_response(rendered, filename=f"statement_{contact_id}.pdf")
@@ -2,24 +2,41 @@ import logging
 from datetime import date
 from typing import Optional, List
 
-from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi import (APIRouter, Depends, Header, HTTPException, Query, Request,
+                     WebSocket, WebSocketDisconnect)
+from fastapi.responses import HTMLResponse, StreamingResponse
+from pydantic import ValidationError as PydanticValidationError
+from starlette.status import WS_1008_POLICY_VIOLATION
 from sqlalchemy import func, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from backend.app.models.invoice import Invoice, InvoiceStatusEnum
+from backend.app.models.invoice import Invoice
+from backend.app.services.invoice.instrumentation import trace_render
 from backend.app.services.invoice.pdf import \
     generate_invoice_pdf as generate_invoice_pdf_file
 from backend.app.services.invoice.pdf import \
     generate_preview_pdf as generate_preview_pdf_file
+from backend.app.services.invoice.html_renderer import render_html
+from backend.app.services.invoice.pdf import draft_payload, invoice_pdf_key
+from backend.app.services.invoice.calculate import calculate_invoice
+from backend.app.services.invoice.export import stream_invoice_archive
+from backend.app.services.invoice.payload import build_render_payload, template_payload
+from backend.app.services.invoice.prerender import prerender_queue
+from backend.app.services.invoice.preview_session import PreviewSession
+from backend.app.services.invoice.totals import get_invoice_totals as get_invoice_totals_summary
 from backend.app.services.template.crud import get_template
+from backend.app.services.template.fonts import prepare_fonts
 
-from ..core.deps import get_current_user
-from ..core.exceptions import (AlreadyExistsError, BadRequestError,
+from ..core.deps import get_current_user, get_websocket_user
+from ..core.exceptions import (AlreadyExistsError, AppException, BadRequestError,
                                NotFoundError, ValidationError)
 from ..database import get_async_db
-from ..schemas.invoice import InvoiceCreate, InvoiceDetail, InvoiceListResponse, InvoiceSummary, InvoiceTotals
+from ..schemas.invoice import (InvoiceCalculation, InvoiceCreate, InvoiceDetail, InvoiceExportRequest,
+                               InvoiceListResponse, InvoiceSummary, InvoiceTotals)
+from ..schemas.preview import preview_message
 from ..schemas.user import User
 from ..services.invoice import crud
+from .responses import etag_matches, not_modified, pdf_response, thumbnail_response
 
 logger = logging.getLogger(__name__)
 
@@ -36,7 +53,9 @@ async def create_invoice(
     try:
         if not invoice.invoice_number:
             raise ValidationError("invoice_number")
-        return await crud.create_invoice(db, invoice, current_user.id)
+        db_invoice = await crud.create_invoice(db, invoice, current_user.id)
+        prerender_queue.schedule(db_invoice.id, current_user.id)
+        return db_invoice
     except AlreadyExistsError:
         raise AlreadyExistsError("invoice_number")
 
@@ -45,6 +64,8 @@ async def create_invoice(
 async def read_invoices(
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
+    count: str = Query('auto', enum=['auto', 'exact', 'estimated']),
     sort_by: Optional[str] = Query(None, enum=['invoice_number', 'bill_to_name', 'send_to_name', 'date', 'total', 'status', 'client_type', 'invoice_type']),
     sort_order: str = Query('desc', enum=['asc', 'desc']),
     group_by: List[str] = Query(default=[], enum=['bill_to', 'send_to', 'month', 'year', 'status', 'client_type', 'invoice_type']),
@@ -62,8 +83,8 @@ async def read_invoices(
     current_user: User = Depends(get_current_user)
 ):
     try:
-        invoices, total_count = await crud.get_invoices(
-            db, current_user.id, skip=skip, limit=limit,
+        invoices, total_count, total_kind, next_cursor = await crud.get_invoices(
+            db, current_user.id, skip=skip, limit=limit, cursor=cursor, count=count,
             sort_by=sort_by, sort_order=sort_order, group_by=group_by,
             invoice_number=invoice_number, bill_to_name=bill_to_name,
             send_to_name=send_to_name, client_type=client_type,
@@ -72,7 +93,10 @@ async def read_invoices(
             total_min=total_min, total_max=total_max
         )
         
-        return InvoiceListResponse(items=invoices, total=total_count)
+        return InvoiceListResponse(items=invoices, total=total_count, total_kind=total_kind,
+                                   next_cursor=next_cursor)
+    except AppException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
@@ -83,21 +107,7 @@ async def get_invoice_totals(
     current_user: User = Depends(get_current_user)
 ):
     try:
-        total_count = await db.scalar(select(func.count()).where(Invoice.user_id == current_user.id))
-        total_amount = await db.scalar(select(func.sum(Invoice.total)).where(Invoice.user_id == current_user.id))
-        
-        status_counts = {}
-        for status in InvoiceStatusEnum:
-            count = await db.scalar(
-                select(func.count()).where(Invoice.user_id == current_user.id).where(Invoice.status == status)
-            )
-            status_counts[status.value] = count
-
-        return InvoiceTotals(
-            total_count=total_count,
-            total_amount=total_amount,
-            status_counts=status_counts
-        )
+        return InvoiceTotals(**await get_invoice_totals_summary(db, current_user.id))
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
@@ -145,6 +155,7 @@ async def update_invoice(
 ):
     try:
         db_invoice = await crud.update_invoice(db, invoice_id, invoice, current_user.id)
+        prerender_queue.schedule(invoice_id, current_user.id)
         return InvoiceDetail.model_validate(db_invoice)
     except NotFoundError:
         raise NotFoundError("invoice")
@@ -164,9 +175,20 @@ async def delete_invoice(
     db_invoice = await crud.delete_invoice(db, invoice_id, current_user.id)
     if db_invoice is None:
         raise NotFoundError("invoice")
+    prerender_queue.cancel(invoice_id)
     return db_invoice
 
 
+@router.post("/calculate", response_model=InvoiceCalculation)
+async def calculate_invoice_totals(
+    invoice: InvoiceCreate,
+    current_user: User = Depends(get_current_user)
+):
+    # Pure arithmetic on the draft: no contact lookups and no rendering,
+    # so the form can call it on every edit and only request a PDF preview on demand.
+    return calculate_invoice(invoice)
+
+
 @router.post("/preview-pdf")
 async def preview_invoice_pdf(
     invoice: InvoiceCreate,
@@ -178,40 +200,134 @@ async def preview_invoice_pdf(
     if not template:
         raise NotFoundError("template")
     
-    pdf_content = await generate_preview_pdf_file(db, invoice, template, current_user.id)
-    return Response(content=pdf_content, media_type="application/pdf")
+    with trace_render(template_id) as trace:
+        rendered = await generate_preview_pdf_file(db, invoice, template, current_user.id)
+    return pdf_response(rendered, trace=trace)
+
+
+@router.post("/preview-html", response_class=HTMLResponse)
+async def preview_invoice_html(
+    invoice: InvoiceCreate,
+    template_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    template = await get_template(db, template_id, current_user.id)
+    if not template:
+        raise NotFoundError("template")
+
+    payload = await draft_payload(db, invoice, template, current_user.id)
+    await prepare_fonts(payload.template)
+    return HTMLResponse(render_html(payload.invoice, payload.template))
+
+
+@router.websocket("/preview/ws")
+async def live_preview(websocket: WebSocket):
+    current_user = await get_websocket_user(websocket)
+    if current_user is None:
+        await websocket.close(code=WS_1008_POLICY_VIOLATION)
+        return
+
+    await websocket.accept()
+    session = PreviewSession(current_user.id, websocket.send_json, websocket.send_bytes)
+    try:
+        while True:
+            data = await websocket.receive()
+            if data["type"] == "websocket.disconnect":
+                break
+            try:
+                # Invalid JSON, unknown message types and ill-typed fields all fail validation
+                message = preview_message.validate_json(data.get("text") or data.get("bytes") or "")
+                await session.handle(message)
+            except PydanticValidationError as e:
+                detail = e.errors(include_url=False, include_context=False, include_input=False)
+                await websocket.send_json({"type": "error", "version": session.version, "detail": detail})
+            except AppException as e:
+                await websocket.send_json({"type": "error", "version": session.version, "detail": e.detail})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        await session.close()
+
+
+@router.post("/export/pdf")
+async def export_invoice_pdfs(
+    export: InvoiceExportRequest,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    template = None
+    if export.template_id is not None:
+        db_template = await get_template(db, export.template_id, current_user.id)
+        if not db_template:
+            raise NotFoundError("template")
+        template = template_payload(db_template)
+
+    invoice_ids = await crud.get_invoice_ids(
+        db, current_user.id,
+        invoice_ids=export.invoice_ids,
+        **export.model_dump(exclude={'invoice_ids', 'template_id'})
+    )
+    logger.info(f"Exporting {len(invoice_ids)} invoice PDFs for user {current_user.id}")
+
+    return StreamingResponse(
+        stream_invoice_archive(current_user.id, invoice_ids, template),
+        media_type="application/zip",
+        headers={"Content-Disposition": "attachment; filename=invoices.zip"}
+    )
 
 
 @router.get("/{invoice_id}/pdf")
 async def get_invoice_pdf(
     invoice_id: int,
     template_id: int,
+    if_none_match: Optional[str] = Header(None),
     db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
-    pdf_content = await generate_invoice_pdf_file(db, invoice_id, template_id, current_user.id)
-    return Response(content=pdf_content, media_type="application/pdf", headers={
-        "Content-Disposition": f"attachment; filename=invoice_{invoice_id}.pdf"
-    })
+    # Observed only once a PDF is sent, so 304s don't count as renders
+    with trace_render(template_id, observe=False) as trace:
+        loaded = None
+        if if_none_match:
+            # Reused by the render below when it had to load the invoice to hash it
+            loaded = await invoice_pdf_key(db, invoice_id, template_id, current_user.id)
+            if etag_matches(if_none_match, loaded.key):
+                return not_modified(loaded.key)
+        rendered, key = await generate_invoice_pdf_file(db, invoice_id, template_id, current_user.id, loaded)
+    if trace is not None:
+        trace.observe()
+    return pdf_response(rendered, filename=f"invoice_{invoice_id}.pdf", etag=key, trace=trace)
 
 
-@router.post("/{invoice_id}/regenerate")
-async def regenerate_invoice(
+@router.get("/{invoice_id}/thumbnail")
+async def get_invoice_thumbnail(
     invoice_id: int,
-    template_name: str,
+    request: Request,
+    v: Optional[str] = None,
     db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
-    db_invoice = await crud.get_invoice(db, invoice_id, current_user.id)
-    if db_invoice is None:
+    invoices = await crud.get_invoices_by_ids(db, current_user.id, [invoice_id])
+    if not invoices:
         raise NotFoundError("invoice")
+    if invoices[0].template is None:
+        raise NotFoundError("template")
+    return thumbnail_response(build_render_payload(invoices[0], invoices[0].template), request, v)
+
 
-    template = await get_template(db, template_name, current_user.id)
+@router.post("/{invoice_id}/regenerate")
+async def regenerate_invoice(
+    invoice_id: int,
+    template_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    template = await get_template(db, template_id, current_user.id)
     if template is None:
         raise NotFoundError("template")
 
-    pdf = await crud.regenerate_invoice(db_invoice, template)
-    return Response(content=pdf, media_type="application/pdf")
+    rendered, key = await generate_invoice_pdf_file(db, invoice_id, template_id, current_user.id)
+    return pdf_response(rendered, filename=f"invoice_{invoice_id}.pdf", etag=key)
 
 
 @router.get("/grouped", response_model=dict)
@@ -0,0 +1,87 @@
+import logging
+from dataclasses import replace
+
+from fastapi import APIRouter, Depends, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.app.services.invoice.render_jobs import RenderJobStatus, render_jobs
+from backend.app.services.template.crud import get_template
+
+from ..core.deps import get_current_user
+from ..core.exceptions import BadRequestError, NotFoundError
+from ..database import get_async_db
+from ..schemas.render_job import RenderJob, RenderJobCreate
+from ..schemas.user import User
+from ..services.invoice import crud
+from .responses import pdf_response
+
+logger = logging.getLogger(__name__)
+router = APIRouter()
+
+
+def _job_response(job, request: Request) -> RenderJob:
+    download_url = None
+    if job.status == RenderJobStatus.DONE:
+        download_url = str(request.url_for("download_render_job", job_id=job.id))
+    return RenderJob(
+        id=job.id,
+        status=job.status.value,
+        invoice_id=job.invoice_id,
+        template_id=job.template_id,
+        created_at=job.created_at,
+        finished_at=job.finished_at,
+        error=job.error,
+        download_url=download_url,
+    )
+
+
+@router.post("/", response_model=RenderJob, status_code=202)
+async def create_render_job(
+    job_in: RenderJobCreate,
+    request: Request,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    if await crud.get_invoice(db, job_in.invoice_id, current_user.id) is None:
+        raise NotFoundError("invoice")
+    if await get_template(db, job_in.template_id, current_user.id) is None:
+        raise NotFoundError("template")
+
+    job = render_jobs.submit(current_user.id, job_in.invoice_id, job_in.template_id)
+    logger.info(f"Queued render job {job.id} for invoice {job_in.invoice_id} (user {current_user.id})")
+    return _job_response(job, request)
+
+
+@router.get("/{job_id}", response_model=RenderJob)
+async def read_render_job(
+    job_id: str,
+    request: Request,
+    current_user: User = Depends(get_current_user)
+):
+    return _job_response(render_jobs.get(job_id, current_user.id), request)
+
+
+@router.get("/{job_id}/pdf", name="download_render_job")
+async def download_render_job(
+    job_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    job = render_jobs.get(job_id, current_user.id)
+    if job.status == RenderJobStatus.FAILED:
+        raise BadRequestError(f"Render job failed: {job.error}")
+    if job.status != RenderJobStatus.DONE:
+        raise BadRequestError(f"Render job is still {job.status.value}")
+
+    rendered = job.result
+    if rendered.content is None and not rendered.path.exists():
+        raise NotFoundError("rendered PDF")
+    # The job owns the file until it expires, so it can be downloaded more than once
+    return pdf_response(replace(rendered, temporary=False), filename=f"invoice_{job.invoice_id}.pdf")
+
+
+@router.delete("/{job_id}", status_code=204)
+async def delete_render_job(
+    job_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    render_jobs.cancel(job_id, current_user.id)
@@ -0,0 +1,181 @@
+import os
+import re
+
+import anyio
+from fastapi import Request, Response
+from fastapi.responses import FileResponse, RedirectResponse
+from starlette.background import BackgroundTask
+from starlette.datastructures import Headers
+from starlette.types import Receive, Scope, Send
+
+from ..core.config import settings
+from ..services.invoice.instrumentation import RenderTrace
+from ..services.invoice.payload import RenderPayload
+from ..services.invoice.spool import RenderedPDF
+from ..services.invoice.thumbnail import placeholder, thumbnail_key, thumbnail_store
+
+# Versioned thumbnail URLs never change content
+IMMUTABLE_CACHE_CONTROL = "private, max-age=31536000, immutable"
+# A single byte range; anything else (including multiple ranges) is answered with the whole file
+BYTE_RANGE = re.compile(r"bytes=(\d*)-(\d*)")
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def parse_byte_range(header: str | None, size: int) -> tuple[int, int] | None:
+    """Inclusive ``(first, last)`` byte positions requested by a ``Range`` header.
+
+    Returns None when the whole file should be sent, and raises
+    ``RangeNotSatisfiable`` when the range lies entirely past the end of the file.
+    """
+    match = BYTE_RANGE.fullmatch(header.strip()) if header else None
+    if match is None or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if not first:
+        # Suffix range: the last N bytes
+        if int(last) == 0 or size == 0:
+            raise RangeNotSatisfiable()
+        return max(0, size - int(last)), size - 1
+    first = int(first)
+    if first >= size:
+        raise RangeNotSatisfiable()
+    last = min(int(last), size - 1) if last else size - 1
+    if last < first:
+        return None
+    return first, last
+
+
+class RangeFileResponse(FileResponse):
+    """``FileResponse`` that honours single ``Range`` requests, so downloads can be resumed.
+
+    The file is handed to the server with the ``http.response.zerocopysend`` or
+    ``http.response.pathsend`` ASGI extensions when it offers them, which lets it
+    use sendfile; otherwise it is streamed in ``chunk_size`` reads, so it is
+    never held in memory whole.
+    """
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if self.stat_result is None:
+            try:
+                self.stat_result = await anyio.to_thread.run_sync(os.stat, self.path)
+            except FileNotFoundError:
+                raise RuntimeError(f"File at path {self.path} does not exist.")
+            self.set_stat_headers(self.stat_result)
+        size = self.stat_result.st_size
+        self.headers["accept-ranges"] = "bytes"
+
+        request_headers = Headers(scope=scope)
+        status_code = self.status_code
+        first, last = 0, size - 1
+        try:
+            byte_range = None
+            if self._if_range_matches(request_headers.get("if-range")):
+                byte_range = parse_byte_range(request_headers.get("range"), size)
+        except RangeNotSatisfiable:
+            self.headers["content-range"] = f"bytes */{size}"
+            self.headers["content-length"] = "0"
+            await send({"type": "http.response.start", "status": 416, "headers": self.raw_headers})
+            await send({"type": "http.response.body", "body": b""})
+            if self.background is not None:
+                await self.background()
+            return
+        if byte_range is not None:
+            first, last = byte_range
+            status_code = 206
+            self.headers["content-range"] = f"bytes {first}-{last}/{size}"
+            self.headers["content-length"] = str(last - first + 1)
+
+        await send({"type": "http.response.start", "status": status_code, "headers": self.raw_headers})
+        if scope["method"].upper() == "HEAD":
+            await send({"type": "http.response.body", "body": b""})
+        else:
+            await self._send_file(scope, send, first, last - first + 1, size)
+        if self.background is not None:
+            await self.background()
+
+    def _if_range_matches(self, if_range: str | None) -> bool:
+        # A stale If-Range means the client's partial copy is outdated, so send everything
+        if if_range is None:
+            return True
+        return if_range in (self.headers.get("etag"), self.headers.get("last-modified"))
+
+    async def _send_file(self, scope: Scope, send: Send, offset: int, count: int, size: int) -> None:
+        extensions = scope.get("extensions") or {}
+        if "http.response.zerocopysend" in extensions:
+            with open(self.path, "rb") as file:
+                await send({"type": "http.response.zerocopysend", "file": file, "offset": offset, "count": count})
+            return
+        if "http.response.pathsend" in extensions and count == size:
+            await send({"type": "http.response.pathsend", "path": os.fspath(self.path)})
+            return
+
+        async with await anyio.open_file(self.path, mode="rb") as file:
+            await file.seek(offset)
+            remaining = count
+            while True:
+                chunk = await file.read(min(self.chunk_size, remaining)) if remaining > 0 else b""
+                remaining -= len(chunk)
+                more_body = remaining > 0 and len(chunk) > 0
+                await send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+                if not more_body:
+                    break
+
+
+def pdf_response(rendered: RenderedPDF, filename: str | None = None, etag: str | None = None,
+                 trace: RenderTrace | None = None) -> Response:
+    """Send a rendered PDF, streaming it from disk unless it is already in memory."""
+    headers = {"Content-Disposition": f"attachment; filename={filename}"} if filename else {}
+    if etag is not None:
+        headers.update(etag_headers(etag))
+    if trace is not None:
+        headers["Server-Timing"] = trace.server_timing()
+    if rendered.content is not None:
+        return Response(content=rendered.content, media_type="application/pdf", headers=headers)
+    background = BackgroundTask(rendered.discard) if rendered.temporary else None
+    return RangeFileResponse(rendered.path, media_type="application/pdf", headers=headers, background=background)
+
+
+def etag_headers(etag: str) -> dict:
+    # Invoices are private, so shared caches must not keep them and browsers must revalidate
+    return {"ETag": f'"{etag}"', "Cache-Control": "private, no-cache"}
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """Whether an ``If-None-Match`` header matches ``etag`` (weak comparison, as RFC 9110 requires)."""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate == '*':
+            return True
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate.strip('"') == etag:
+            return True
+    return False
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers=etag_headers(etag))
+
+
+def thumbnail_response(payload: RenderPayload, request: Request, version: str | None) -> Response:
+    """Serve a thumbnail, or a placeholder while it is rendered in the background.
+
+    The plain URL redirects to one carrying the thumbnail's content key as
+    ``?v=``, which is served with long-lived cache headers; an edit changes the
+    key and therefore the URL.
+    """
+    width = settings.thumbnail_width
+    key = thumbnail_key(payload, width)
+    path = thumbnail_store.get(key)
+    if path is None:
+        thumbnail_store.schedule(key, payload, width)
+        return Response(content=placeholder(width), media_type="image/png", headers={"Cache-Control": "no-store"})
+    if version != key:
+        return RedirectResponse(f"{request.url.path}?v={key}", status_code=307,
+                                headers={"Cache-Control": "private, no-cache"})
+    return FileResponse(path, media_type="image/png", headers={"Cache-Control": IMMUTABLE_CACHE_CONTROL})
@@ -1,26 +1,38 @@
+import asyncio
 import logging
 from typing import List
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, File, Form, Query, Request, UploadFile
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from ..core.config import settings
 from ..core.deps import get_current_user
-from ..core.exceptions import AlreadyExistsError, NotFoundError
+from ..core.exceptions import AlreadyExistsError, BadRequestError, NotFoundError
 from ..database import get_async_db
-from ..schemas.template import Template, TemplateCreate
+from ..schemas.template import Font, Template, TemplateCreate
 from ..schemas.user import User
-from ..services.template import crud
+from ..services.invoice.payload import template_payload
+from ..services.invoice.thumbnail import template_sample_payload
+from ..services.template import crud, fonts
+from .responses import thumbnail_response
 
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
 
+def _check_fonts(template: TemplateCreate, user_id: int) -> None:
+    missing = fonts.unknown_fonts(template.fonts.values(), user_id)
+    if missing:
+        raise BadRequestError(f"Unknown fonts: {', '.join(missing)}. Upload them to /templates/fonts first.")
+
+
 @router.post("/", response_model=Template)
 async def create_template(
     template: TemplateCreate,
     db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
+    _check_fonts(template, current_user.id)
     try:
         logger.info(f"Creating template for user {current_user.id}")
         return await crud.create_template(db, template, current_user.id)
@@ -41,6 +53,28 @@ async def read_templates(
     return await crud.get_templates(db, current_user.id, skip=skip, limit=limit, sort_by=sort_by, sort_order=sort_order)
 
 
+@router.get("/fonts", response_model=List[Font])
+async def read_fonts(current_user: User = Depends(get_current_user)):
+    return (
+        [Font(name=name, builtin=True) for name in sorted(fonts.STANDARD_FONTS)]
+        + [Font(name=name, builtin=False) for name in fonts.stored_fonts(current_user.id)]
+    )
+
+
+@router.post("/fonts", response_model=Font, status_code=201)
+async def upload_font(
+    file: UploadFile = File(...),
+    name: str | None = Form(None),
+    current_user: User = Depends(get_current_user)
+):
+    name = name or (file.filename or '').rsplit('.', 1)[0]
+    data = await file.read(settings.font_max_bytes + 1)
+    logger.info(f"Uploading font {name} for user {current_user.id}")
+    # Parsing a large font takes a while; keep it off the event loop
+    await asyncio.to_thread(fonts.store_font, current_user.id, name, data)
+    return Font(name=name, builtin=False)
+
+
 @router.get("/{template_id}", response_model=Template)
 async def read_template(
     template_id: int,
@@ -55,6 +89,20 @@ async def read_template(
     return db_template
 
 
+@router.get("/{template_id}/thumbnail")
+async def read_template_thumbnail(
+    template_id: int,
+    request: Request,
+    v: str | None = None,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    db_template = await crud.get_template(db, template_id, current_user.id)
+    if db_template is None:
+        raise NotFoundError("template")
+    return thumbnail_response(template_sample_payload(template_payload(db_template)), request, v)
+
+
 @router.put("/{template_id}", response_model=Template)
 async def update_template(
     template_id: int,
@@ -63,6 +111,7 @@ async def update_template(
     current_user: User = Depends(get_current_user)
 ):
     logger.info(f"Updating template {template_id} for user {current_user.id}")
+    _check_fonts(template, current_user.id)
     db_template = await crud.update_template(db, template_id, template, current_user.id)
     if db_template is None:
         logger.error(f"Template {template_id} not found for user {current_user.id}")
@@ -78,6 +127,7 @@ async def customize_template(
     current_user: User = Depends(get_current_user)
 ):
     logger.info(f"Customizing template {template_id} for user {current_user.id}")
+    _check_fonts(template_update, current_user.id)
     db_template = await crud.get_template(db, template_id, current_user.id)
     if db_template is None:
         logger.error(f"Template {template_id} not found for user {current_user.id}")
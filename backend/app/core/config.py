@@ -1,4 +1,5 @@
 import os
+import tempfile
 
 from dotenv import load_dotenv
 from pydantic_settings import BaseSettings
@@ -13,6 +14,71 @@ class Settings(BaseSettings):
     refresh_token_expire_days: int = 7
     PRODUCTION: bool = os.getenv("PRODUCTION", "False").lower() == "true"
 
+    # PDF rendering runs in a process pool so ReportLab never blocks the event loop.
+    # A pool size of 0 renders in a worker thread instead.
+    render_pool_size: int = 2
+    render_pool_start_method: str = "spawn"
+    render_queue_max: int = 32
+    render_timeout_seconds: float = 30.0
+    render_spool_dir: str = os.path.join(tempfile.gettempdir(), "invoice-generator", "spool")
+
+    # Rendered PDFs are cached in memory and on disk, keyed by a hash of their content
+    pdf_cache_enabled: bool = True
+    pdf_cache_dir: str = os.path.join(tempfile.gettempdir(), "invoice-generator", "pdf-cache")
+    pdf_cache_memory_max_bytes: int = 64 * 1024 * 1024
+    # Larger PDFs are only cached on disk and always streamed from there
+    pdf_cache_memory_entry_max_bytes: int = 512 * 1024
+    pdf_cache_disk_max_bytes: int = 1024 * 1024 * 1024
+
+    # Asynchronous render jobs: bounded queue, per-user limit and how long finished results are kept
+    render_jobs_max_queue: int = 64
+    render_jobs_per_user: int = 4
+    render_jobs_concurrency: int = 2
+    render_job_ttl_seconds: int = 900
+
+    # Render invoices in the background after they are saved so the first download is a cache hit
+    prerender_enabled: bool = False
+    prerender_concurrency: int = 1
+    prerender_delay_seconds: float = 2.0
+    prerender_max_pending: int = 256
+
+    # Invoices with more item and subitem rows than this lay out their items table page by page
+    large_invoice_row_threshold: int = 500
+
+    # PNG previews of page one, rendered in the background and purged when unused
+    thumbnail_dir: str = os.path.join(tempfile.gettempdir(), "invoice-generator", "thumbnails")
+    thumbnail_width: int = 240
+    thumbnail_concurrency: int = 1
+    thumbnail_max_age_days: int = 30
+
+    # Custom TrueType fonts uploaded for templates
+    font_dir: str = "fonts"
+    font_max_bytes: int = 20 * 1024 * 1024
+
+    # Bulk exports load invoices in chunks and keep a bounded number of render batches in flight
+    export_chunk_size: int = 100
+    export_max_in_flight: int = 4
+    # Invoices sharing a template are rendered this many at a time per pool call
+    render_batch_size: int = 25
+
+    # Invoice list totals are cached per filter, and estimated by the planner past this many rows
+    invoice_count_cache_ttl_seconds: float = 30.0
+    invoice_count_cache_max_entries: int = 10000
+    invoice_count_estimate_threshold: int = 100000
+
+    # Serve /invoices/totals from the per-user rollup table instead of aggregating the invoices
+    invoice_totals_rollup: bool = False
+
+    # Statements render every invoice for a contact into one document
+    statement_max_invoices: int = 1000
+    statement_timeout_seconds: float = 120.0
+
+    # Time each phase of PDF renders, record histograms served at /metrics and send Server-Timing headers
+    render_instrumentation: bool = False
+
+    # Live preview sessions wait this long after the last edit before re-rendering
+    preview_debounce_ms: int = 300
+
     class Config:
         env_file = ".env"
 
@@ -1,9 +1,9 @@
-from fastapi import Depends, HTTPException, status, Request
+from fastapi import Depends, HTTPException, status, Request, WebSocket
 from fastapi.security import OAuth2
 from jose import JWTError, jwt
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from ..database import get_async_db
+from ..database import async_session, get_async_db
 from ..core.config import settings
 from ..services.user import crud
 
@@ -51,4 +51,10 @@ async def get_current_user_optional(token: str = Depends(oauth2_scheme), db: Asy
     except JWTError:
         return None
     user = await crud.get_user_by_email(db, email=email)
-    return user
\ No newline at end of file
+    return user
+
+
+async def get_websocket_user(websocket: WebSocket):
+    # Long-lived sockets must not pin a pooled connection, so use a short session for the lookup
+    async with async_session() as db:
+        return await get_current_user_optional(websocket.cookies.get("access_token"), db)
@@ -3,8 +3,8 @@ from fastapi.responses import JSONResponse
 
 
 class AppException(HTTPException):
-    def __init__(self, status_code: int, detail: str):
-        super().__init__(status_code=status_code, detail=detail)
+    def __init__(self, status_code: int, detail: str, headers: dict | None = None):
+        super().__init__(status_code=status_code, detail=detail, headers=headers)
 
 
 class ValidationError(AppException):
@@ -42,10 +42,22 @@ class UnauthorizedError(AppException):
                          detail="Could not validate credentials")
 
 
+class ServiceUnavailableError(AppException):
+    def __init__(self, detail: str):
+        super().__init__(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=detail)
+
+
+class TooManyRequestsError(AppException):
+    def __init__(self, detail: str, retry_after: int | None = None):
+        headers = {"Retry-After": str(retry_after)} if retry_after else None
+        super().__init__(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail=detail, headers=headers)
+
+
 async def app_exception_handler(request, exc: AppException):
     return JSONResponse(
         status_code=exc.status_code,
-        content={"message": exc.detail}
+        content={"message": exc.detail},
+        headers=exc.headers
     )
 
 
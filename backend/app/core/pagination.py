@@ -0,0 +1,30 @@
+"""Opaque cursors for keyset pagination.
+
+A cursor records the sort it was issued for and the sort values of the last
+row of a page, so the next page can start right after that row with a
+``WHERE (sort_value, id) > (...)`` condition instead of an ``OFFSET``. It is
+base64-encoded JSON: opaque to clients but not a secret, since it only holds
+values from rows the client has already seen.
+"""
+import base64
+import json
+from typing import Any, List
+
+from .exceptions import BadRequestError
+
+
+def encode_cursor(sort_by: str | None, sort_order: str, values: List[Any]) -> str:
+    data = json.dumps([sort_by, sort_order, values], separators=(',', ':'), default=str)
+    return base64.urlsafe_b64encode(data.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str, sort_by: str | None, sort_order: str) -> List[Any]:
+    """The row values stored in ``cursor``, which must have been issued for the same sort."""
+    try:
+        data = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        cursor_sort_by, cursor_sort_order, values = json.loads(data)
+    except (ValueError, TypeError):
+        raise BadRequestError("Invalid cursor")
+    if (cursor_sort_by, cursor_sort_order) != (sort_by, sort_order) or not isinstance(values, list):
+        raise BadRequestError("The cursor was issued for a different sort order")
+    return values
@@ -0,0 +1,34 @@
+"""Substring search over text columns.
+
+Filters match ``ILIKE '%term%'`` with the term's wildcards escaped. On
+PostgreSQL every searched column has a pg_trgm GIN index, which serves these
+patterns for terms of three or more characters instead of a sequential scan.
+
+Lists that are filtered but not explicitly sorted put prefix matches first:
+``prefix_rank`` orders rows whose value starts with the term ahead of the
+ones that merely contain it.
+"""
+from sqlalchemy import case
+from sqlalchemy.sql.elements import ColumnElement
+
+LIKE_ESCAPE = '\\'
+
+
+def escape_like(term: str) -> str:
+    return term.replace(LIKE_ESCAPE, LIKE_ESCAPE * 2).replace('%', f'{LIKE_ESCAPE}%').replace('_', f'{LIKE_ESCAPE}_')
+
+
+def contains(column, term: str) -> ColumnElement:
+    return column.ilike(f"%{escape_like(term)}%", escape=LIKE_ESCAPE)
+
+
+def prefix_rank(column, term: str, descending: bool = False) -> ColumnElement:
+    """Sort expression that puts values starting with ``term`` first, in either sort direction."""
+    first, rest = (1, 0) if descending else (0, 1)
+    return case((column.ilike(f"{escape_like(term)}%", escape=LIKE_ESCAPE), first), else_=rest)
+
+
+def prefix_rank_value(value: str | None, term: str, descending: bool = False) -> int:
+    """``prefix_rank`` of a loaded value, for building cursors."""
+    first, rest = (1, 0) if descending else (0, 1)
+    return first if (value or '').lower().startswith(term.lower()) else rest
@@ -5,14 +5,22 @@ from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 
+from backend.app.services.invoice.prerender import prerender_queue
+from backend.app.services.invoice.render_jobs import render_jobs
+from backend.app.services.invoice.render_pool import render_pool
+from backend.app.services.invoice.spool import purge_spool
+from backend.app.services.invoice.thumbnail import purge_thumbnails, thumbnail_store
 from backend.app.services.template import crud
 from backend.app.services.template.crud import purge_deleted_templates
+from backend.app.services.template.fonts import register_fonts
 
 from .api import (auth_router, contacts_router, invoices_router,
-                  templates_router)
+                  render_jobs_router, templates_router)
 from .core.exceptions import (AppException, app_exception_handler,
                               global_exception_handler)
+from .core.metrics import registry
 from .database import engine, get_async_db
 from .models import contact, invoice, template, user
 
@@ -47,11 +55,19 @@ async def lifespan(app: FastAPI):
     logger.info("Starting up...")
     await create_tables()
     await async_create_or_update_default_templates()
+    register_fonts()
     scheduler.add_job(scheduled_purge, CronTrigger(hour=0, minute=0))
+    scheduler.add_job(purge_spool, CronTrigger(minute=30))
+    scheduler.add_job(purge_thumbnails, CronTrigger(hour=1, minute=0))
     scheduler.start()
+    render_pool.start()
     yield
     # Shutdown
     scheduler.shutdown()
+    prerender_queue.shutdown()
+    render_jobs.shutdown()
+    thumbnail_store.shutdown()
+    render_pool.shutdown()
     logger.info("Shutting down...")
 
 
@@ -77,8 +93,15 @@ app.include_router(auth_router, prefix="/api/v1/auth", tags=["auth"])
 app.include_router(contacts_router, prefix="/api/v1/contacts", tags=["contacts"])
 app.include_router(invoices_router, prefix="/api/v1/invoices", tags=["invoices"])
 app.include_router(templates_router, prefix="/api/v1/templates", tags=["templates"])
+app.include_router(render_jobs_router, prefix="/api/v1/render-jobs", tags=["render-jobs"])
 
 
 @app.get("/")
 async def root():
-    return {"message": "Welcome to the Invoice Generator API"}
\ No newline at end of file
+    return {"message": "Welcome to the Invoice Generator API"}
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    # Prometheus text exposition format
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
@@ -34,6 +34,25 @@ class InvoiceTypeEnum(str, Enum):
     PRODUCT = "PRODUCT"
 
 
+def calculate_line_total(quantity, unit_price, discount_percentage):
+    """Line total after the item discount; works on Decimals and on SQL column expressions."""
+    return quantity * unit_price * (Decimal('1') - discount_percentage / Decimal('100'))
+
+
+def calculate_invoice_totals(subtotal: Decimal, discount_percentage: Decimal, tax_rate: Decimal) -> dict:
+    """Discount, tax and total for an invoice subtotal, as stored by ``Invoice.calculate_totals``."""
+    discount_amount = subtotal * (discount_percentage / Decimal('100'))
+    discounted_subtotal = subtotal - discount_amount
+    tax = discounted_subtotal * (tax_rate / Decimal('100'))
+    return {
+        'subtotal': subtotal,
+        'discount_amount': discount_amount,
+        'discounted_subtotal': discounted_subtotal,
+        'tax': tax,
+        'total': discounted_subtotal + tax,
+    }
+
+
 class InvoiceItem(Base):
     __tablename__ = "invoice_items"
     __table_args__ = (
@@ -58,7 +77,7 @@ class InvoiceItem(Base):
 
     @hybrid_property
     def line_total(self):
-        return self.quantity * self.unit_price * (Decimal('1') - self.discount_percentage / Decimal('100'))
+        return calculate_line_total(self.quantity, self.unit_price, self.discount_percentage)
 
 
 class InvoiceSubItem(Base):
@@ -75,13 +94,22 @@ class InvoiceSubItem(Base):
 class Invoice(Base):
     __tablename__ = "invoices"
     __table_args__ = (
-        Index('ix_invoices_invoice_date', 'invoice_date'),
-        Index('ix_invoices_total', 'total'),
+        # Every list query is scoped to one user, so these lead with user_id and end
+        # with the id that breaks ties in sorting and cursor pagination
+        Index('ix_invoices_user_id_id', 'user_id', 'id'),
+        Index('ix_invoices_user_id_invoice_date', 'user_id', 'invoice_date', 'id'),
+        Index('ix_invoices_user_id_total', 'user_id', 'total', 'id'),
+        Index('ix_invoices_user_id_invoice_number', 'user_id', 'invoice_number', 'id'),
+        Index('ix_invoices_user_id_status_invoice_date', 'user_id', 'status', 'invoice_date', 'id'),
+        # Statements: one contact's invoices in date order
+        Index('ix_invoices_user_id_bill_to_id_invoice_date', 'user_id', 'bill_to_id', 'invoice_date', 'id'),
         Index('ix_invoices_bill_to_id', 'bill_to_id'),
         Index('ix_invoices_send_to_id', 'send_to_id'),
-        Index('ix_invoices_status', 'status'),
         Index('ix_invoices_client_type', 'client_type'),
         Index('ix_invoices_invoice_type', 'invoice_type'),
+        # Serves ILIKE '%term%' searches (PostgreSQL, pg_trgm)
+        Index('ix_invoices_invoice_number_trgm', 'invoice_number', postgresql_using='gin',
+              postgresql_ops={'invoice_number': 'gin_trgm_ops'}),
     )
 
     id = Column(Integer, primary_key=True, index=True)
@@ -116,9 +144,12 @@ class Invoice(Base):
 
     def calculate_totals(self):
         """Calculates and updates the subtotal, tax, and total for the invoice."""
-        self.subtotal = sum(item.line_total for item in self.items)
-        self.tax = self.discounted_subtotal * (self.tax_rate / Decimal('100'))
-        self.total = self.discounted_subtotal + self.tax
+        totals = calculate_invoice_totals(
+            sum(item.line_total for item in self.items), self.discount_percentage, self.tax_rate
+        )
+        self.subtotal = totals['subtotal']
+        self.tax = totals['tax']
+        self.total = totals['total']
 
     @property
     def discount_amount(self):
@@ -126,4 +157,14 @@ class Invoice(Base):
     
     @property
     def discounted_subtotal(self):
-        return self.subtotal - self.discount_amount
\ No newline at end of file
+        return self.subtotal - self.discount_amount
+
+
+class InvoiceStatusTotal(Base):
+    """Running count and total amount of a user's invoices in one status, kept current by the invoice writes."""
+    __tablename__ = "invoice_status_totals"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    status = Column(SQLEnum(InvoiceStatusEnum), primary_key=True)
+    invoice_count = Column(Integer, nullable=False, default=0)
+    total_amount = Column(DECIMAL(14, 2), nullable=False, default=Decimal('0.00'))
@@ -153,6 +153,10 @@ class InvoiceSummary(BaseModel):
 class InvoiceListResponse(BaseModel):
     items: List[InvoiceSummary]
     total: int
+    # "exact", "cached" (exact as of a recent request) or "estimated" by the database planner
+    total_kind: str = "exact"
+    # Pass back as ``cursor`` to fetch the next page; None on the last page
+    next_cursor: Optional[str] = None
 
 
 class InvoiceTotals(BaseModel):
@@ -160,4 +164,35 @@ class InvoiceTotals(BaseModel):
     total_amount: Decimal
     status_counts: Dict[str, int]
 
-    model_config = ConfigDict(from_attributes=True)
\ No newline at end of file
+    model_config = ConfigDict(from_attributes=True)
+
+
+class InvoiceFilters(BaseModel):
+    invoice_number: Optional[str] = None
+    bill_to_name: Optional[str] = None
+    send_to_name: Optional[str] = None
+    client_type: Optional[str] = None
+    invoice_type: Optional[str] = None
+    status: Optional[str] = None
+    date_from: Optional[date] = None
+    date_to: Optional[date] = None
+    total_min: Optional[float] = None
+    total_max: Optional[float] = None
+
+
+class InvoiceExportRequest(InvoiceFilters):
+    invoice_ids: Optional[List[int]] = None
+    template_id: Optional[int] = Field(None, gt=0)
+
+
+class InvoiceLineCalculation(BaseModel):
+    line_total: Decimal
+
+
+class InvoiceCalculation(BaseModel):
+    items: List[InvoiceLineCalculation]
+    subtotal: Decimal
+    discount_amount: Decimal
+    discounted_subtotal: Decimal
+    tax: Decimal
+    total: Decimal
@@ -0,0 +1,44 @@
+from typing import Annotated, Any, Dict, Literal, Union
+
+from pydantic import BaseModel, Field, TypeAdapter
+
+
+class PreviewInit(BaseModel):
+    type: Literal['init']
+    format: Literal['html', 'pdf'] = 'html'
+    invoice: Dict[str, Any] = {}
+    template_id: int | None = None
+
+
+class PreviewPatch(BaseModel):
+    type: Literal['patch']
+    changes: Dict[str, Any] = {}
+
+
+class PreviewItem(BaseModel):
+    type: Literal['item']
+    item: Dict[str, Any]
+    # Appends when omitted
+    index: int | None = None
+    insert: bool = False
+
+
+class PreviewRemoveItem(BaseModel):
+    type: Literal['remove_item']
+    index: int
+
+
+class PreviewTemplate(BaseModel):
+    type: Literal['template']
+    template_id: int
+
+
+class PreviewDownload(BaseModel):
+    type: Literal['download']
+
+
+PreviewMessage = Annotated[
+    Union[PreviewInit, PreviewPatch, PreviewItem, PreviewRemoveItem, PreviewTemplate, PreviewDownload],
+    Field(discriminator='type'),
+]
+preview_message = TypeAdapter(PreviewMessage)
@@ -0,0 +1,21 @@
+from datetime import datetime
+
+from pydantic import BaseModel, ConfigDict
+
+
+class RenderJobCreate(BaseModel):
+    invoice_id: int
+    template_id: int
+
+
+class RenderJob(BaseModel):
+    id: str
+    status: str
+    invoice_id: int
+    template_id: int
+    created_at: datetime
+    finished_at: datetime | None = None
+    error: str | None = None
+    download_url: str | None = None
+
+    model_config = ConfigDict(from_attributes=True)
@@ -26,6 +26,12 @@ class TemplateBase(BaseModel):
             raise ValueError('Must be a valid JSON object')
         return v
 
+    @field_validator('layout')
+    def validate_renderer(cls, v):
+        if v.get('renderer', 'platypus') not in ('platypus', 'canvas'):
+            raise ValueError("renderer must be 'platypus' or 'canvas'")
+        return v
+
 
 class TemplateCreate(TemplateBase):
     pass
@@ -38,4 +44,8 @@ class Template(TemplateBase):
     updated_at: datetime | None = None
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class Font(BaseModel):
+    name: str
+    builtin: bool
@@ -8,8 +8,11 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from backend.app.models.invoice import Invoice
 
 from ...core.exceptions import BadRequestError, NotFoundError
+from ...core.search import contains, prefix_rank
 from ...models.contact import Contact
 from ...schemas.contact import ContactCreate
+from ..invoice.counts import invoice_counts
+from ..invoice.pdf_cache import pdf_cache
 
 logger = logging.getLogger(__name__)
 
@@ -39,9 +42,9 @@ async def get_contacts(
 
         # Apply filters
         if name:
-            stmt = stmt.filter(Contact.name.ilike(f"%{name}%"))
+            stmt = stmt.filter(contains(Contact.name, name))
         if email:
-            stmt = stmt.filter(Contact.email.ilike(f"%{email}%"))
+            stmt = stmt.filter(contains(Contact.email, email))
 
         # Apply sorting
         if sort_by:
@@ -52,6 +55,10 @@ async def get_contacts(
                 stmt = stmt.order_by(order_func(Contact.email))
             elif sort_by == 'created_at':
                 stmt = stmt.order_by(order_func(Contact.created_at))
+        elif name or email:
+            # List prefix matches first
+            ranks = [prefix_rank(column, term) for column, term in ((Contact.name, name), (Contact.email, email)) if term]
+            stmt = stmt.order_by(*ranks, Contact.name, Contact.id)
 
         # Apply pagination
         stmt = stmt.offset(skip).limit(limit)
@@ -85,6 +92,15 @@ async def update_contact(db: AsyncSession, contact_id: int, contact: ContactCrea
         await db.commit()
         await db.refresh(db_contact)
         logger.info(f"Updated contact: id={contact_id}, user_id={user_id}")
+
+        # Rendered PDFs embed the contact's address, so drop them for every invoice using it
+        result = await db.execute(
+            select(Invoice.id).where((Invoice.bill_to_id == contact_id) | (Invoice.send_to_id == contact_id))
+        )
+        for invoice_id in result.scalars():
+            pdf_cache.invalidate_invoice(invoice_id)
+        # Invoice lists filter on contact names
+        invoice_counts.invalidate_user(user_id)
         return db_contact
     except Exception as e:
         logger.error(f"Error updating contact: {str(e)}")
@@ -0,0 +1,178 @@
+"""Rendering many invoices with shared setup.
+
+Batch jobs (exports, template-change regeneration) render one template across
+many invoices. Instead of one pool call per invoice, invoices that share a
+template are grouped and each group is sent to a worker in a single call: the
+template crosses the process boundary once, is compiled once, and the worker
+renders the invoices back to back, each into its own spool file. Invoices are
+loaded in chunks with their items, subitems and contacts eager-loaded.
+"""
+import asyncio
+import logging
+from typing import AsyncIterable, AsyncIterator, Dict, Iterable, List
+
+from ...core.config import settings
+from ...core.exceptions import ServiceUnavailableError
+from ...database import async_session
+from . import crud
+from .compiled_template import compile_template, template_fingerprint
+from .payload import RenderInvoice, RenderPayload, RenderTemplate, invoice_payload, template_payload
+from .pdf import generate_pdf
+from .pdf_cache import content_key, pdf_cache
+from .render_pool import render_pool
+from .spool import RenderedPDF, spool_path
+
+logger = logging.getLogger(__name__)
+
+RENDER_ATTEMPTS = 3
+
+
+def render_invoice_batch(template: RenderTemplate, invoices: List[RenderInvoice],
+                         output_paths: List[str]) -> List[str | None]:
+    """Render-pool entry point: render each invoice to its path and return an error (or None) per invoice."""
+    compile_template(template)
+    errors = []
+    for invoice, output_path in zip(invoices, output_paths):
+        try:
+            generate_pdf(invoice, template, output=output_path, invariant=True)
+            errors.append(None)
+        except Exception as e:
+            errors.append(f"{type(e).__name__}: {e}")
+    return errors
+
+
+async def _run_batch(template: RenderTemplate, invoices: List[RenderInvoice], output_paths: List[str]) -> List[str | None]:
+    for attempt in range(1, RENDER_ATTEMPTS + 1):
+        try:
+            return await render_pool.run(
+                render_invoice_batch, template, invoices, output_paths,
+                timeout=settings.render_timeout_seconds * len(invoices)
+            )
+        except ServiceUnavailableError as e:
+            # Other requests share the pool; back off instead of failing the whole batch
+            if attempt == RENDER_ATTEMPTS:
+                return [e.detail] * len(invoices)
+            await asyncio.sleep(0.5 * attempt)
+        except Exception as e:
+            logger.error(f"Batch render of {len(invoices)} invoices failed: {str(e)}", exc_info=True)
+            return [str(e)] * len(invoices)
+
+
+async def _render_group(payloads: List[RenderPayload]) -> List[tuple[RenderPayload, RenderedPDF | None]]:
+    results = []
+    misses = []
+    for payload in payloads:
+        key = content_key(payload)
+        rendered = pdf_cache.lookup(key)
+        if rendered is not None:
+            results.append((payload, rendered))
+        else:
+            misses.append((payload, key))
+    if not misses:
+        return results
+
+    output_paths = [spool_path() for _ in misses]
+    errors = await _run_batch(
+        misses[0][0].template, [payload.invoice for payload, _ in misses], [str(path) for path in output_paths]
+    )
+    for (payload, key), output_path, error in zip(misses, output_paths, errors):
+        if error is None:
+            results.append((payload, pdf_cache.store(key, output_path)))
+        else:
+            output_path.unlink(missing_ok=True)
+            logger.error(f"Batch render failed for invoice {payload.invoice.invoice_number}: {error}")
+            results.append((payload, None))
+    return results
+
+
+async def render_batches(
+    payloads: AsyncIterable[RenderPayload],
+    batch_size: int | None = None,
+    max_in_flight: int | None = None,
+) -> AsyncIterator[tuple[RenderPayload, RenderedPDF | None]]:
+    """Yield ``(payload, rendered)`` as batches finish; ``rendered`` is None on failure.
+
+    Payloads are grouped by template, and a group is submitted once it holds
+    ``batch_size`` invoices or the input is exhausted. At most ``max_in_flight``
+    batches are rendering at once.
+    """
+    batch_size = max(1, batch_size or settings.render_batch_size)
+    max_in_flight = max(1, max_in_flight or settings.export_max_in_flight)
+    groups: Dict[str, List[RenderPayload]] = {}
+    pending: set[asyncio.Task] = set()
+    try:
+        async for payload in payloads:
+            fingerprint = template_fingerprint(payload.template)
+            group = groups.setdefault(fingerprint, [])
+            group.append(payload)
+            if len(group) < batch_size:
+                continue
+            del groups[fingerprint]
+            while len(pending) >= max_in_flight:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    for result in task.result():
+                        yield result
+            pending.add(asyncio.create_task(_render_group(group)))
+
+        for group in groups.values():
+            pending.add(asyncio.create_task(_render_group(group)))
+        groups.clear()
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                for result in task.result():
+                    yield result
+    finally:
+        # The consumer may stop early (e.g. a client disconnecting mid-export)
+        for task in pending:
+            task.cancel()
+        for task in pending:
+            if task.done() and not task.cancelled():
+                for _, rendered in task.result():
+                    if rendered is not None:
+                        rendered.discard()
+
+
+async def render_batch(
+    template: RenderTemplate,
+    invoices: Iterable[RenderInvoice] | AsyncIterable[RenderInvoice],
+) -> AsyncIterator[tuple[RenderInvoice, RenderedPDF | None]]:
+    """Render every invoice with ``template``, yielding ``(invoice, rendered)`` as batches finish."""
+    async def payloads():
+        if isinstance(invoices, AsyncIterable):
+            async for invoice in invoices:
+                yield RenderPayload(invoice=invoice, template=template)
+        else:
+            for invoice in invoices:
+                yield RenderPayload(invoice=invoice, template=template)
+
+    async for payload, rendered in render_batches(payloads()):
+        yield payload.invoice, rendered
+
+
+async def load_payloads(
+    user_id: int,
+    invoice_ids: List[int],
+    template: RenderTemplate | None = None,
+    chunk_size: int | None = None,
+) -> AsyncIterator[RenderPayload]:
+    """Load invoices in chunks and yield their render payloads.
+
+    Each invoice uses ``template`` when given, otherwise its own template.
+    """
+    chunk_size = chunk_size or settings.export_chunk_size
+    async with async_session() as db:
+        for start in range(0, len(invoice_ids), chunk_size):
+            invoices = await crud.get_invoices_by_ids(db, user_id, invoice_ids[start:start + chunk_size])
+            payloads = [
+                RenderPayload(
+                    invoice=invoice_payload(invoice),
+                    template=template or template_payload(invoice.template),
+                )
+                for invoice in invoices
+            ]
+            # Release the ORM graphs before rendering the chunk
+            db.expunge_all()
+            for payload in payloads:
+                yield payload
@@ -0,0 +1,26 @@
+from decimal import ROUND_HALF_UP, Decimal
+
+from ...models.invoice import calculate_invoice_totals, calculate_line_total
+from ...schemas.invoice import InvoiceCalculation, InvoiceCreate, InvoiceLineCalculation
+
+CENT = Decimal('0.01')
+
+
+def _to_cents(amount: Decimal) -> Decimal:
+    # Matches the rounding applied when totals are stored in DECIMAL(10, 2) columns
+    return Decimal(amount).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def calculate_invoice(invoice: InvoiceCreate) -> InvoiceCalculation:
+    """Per-line and invoice totals for a draft, using the same arithmetic as ``Invoice.calculate_totals``."""
+    line_totals = [
+        calculate_line_total(item.quantity, item.unit_price, item.discount_percentage)
+        for item in invoice.items
+    ]
+    totals = calculate_invoice_totals(
+        sum(line_totals, Decimal('0')), invoice.discount_percentage, invoice.tax_rate
+    )
+    return InvoiceCalculation(
+        items=[InvoiceLineCalculation(line_total=_to_cents(line_total)) for line_total in line_totals],
+        **{name: _to_cents(value) for name, value in totals.items()}
+    )
@@ -0,0 +1,363 @@
+"""Fast-path invoice renderer that draws straight onto a ReportLab canvas.
+
+The platypus engine builds a document template, nested tables and paragraphs,
+then lets them negotiate their sizes, for every invoice. This layout is fixed,
+so this engine works out the same coordinates directly from the compiled
+template and issues plain ``drawString``/``rect``/``line`` calls. The geometry
+mirrors what platypus produces (frame and cell paddings, paragraph leading,
+overlapping space between flowables), so templates can switch engines without a
+visible change.
+
+Only invoices that fit on a single page, with plain-text content and single-line
+header fields, take this path. Anything else raises ``UnsupportedLayout`` before
+anything is written, and the caller falls back to platypus.
+"""
+import html
+import re
+from dataclasses import dataclass
+from typing import BinaryIO, List
+
+from reportlab.lib.colors import HexColor, black, white
+from reportlab.lib.utils import simpleSplit
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.pdfgen.canvas import Canvas
+
+from .compiled_template import BALANCE_BACKGROUND, CompiledTemplate, compile_template
+from .instrumentation import TimedCanvas, phase, record
+from .layout import ITEMS_HEADER, address_lines, format_invoice_date, item_rows, totals_rows
+
+# Defaults of the platypus objects the layout is modelled on
+FRAME_PADDING = 6
+CELL_PADDING_X = 6
+CELL_PADDING_Y = 3
+CELL_FONT = 'Helvetica'
+CELL_FONT_SIZE = 10
+CELL_LEADING = 12
+FUZZ = 1e-6
+MARKUP_TAG = re.compile(r'<[^>]*>')
+
+
+class UnsupportedLayout(Exception):
+    """The invoice needs layout features only the platypus engine provides."""
+
+
+@dataclass(frozen=True)
+class TextOp:
+    font: str
+    size: float
+    color: object
+    x: float
+    y: float
+    text: str
+    align_right: bool = False
+
+
+@dataclass(frozen=True)
+class RectOp:
+    x: float
+    y: float
+    width: float
+    height: float
+    color: object
+
+
+@dataclass(frozen=True)
+class LineOp:
+    x1: float
+    y1: float
+    x2: float
+    y2: float
+    width: float
+    color: object
+
+
+class _Page:
+    """Places blocks top to bottom the way a platypus ``Frame`` does."""
+
+    def __init__(self, compiled: CompiledTemplate, strict: bool = True):
+        self.compiled = compiled
+        self.strict = strict
+        self.left = compiled.margin_left + FRAME_PADDING
+        self.width = compiled.available_width - 2 * FRAME_PADDING
+        self.bottom = compiled.margin_bottom + FRAME_PADDING
+        self.y = compiled.page_size[1] - compiled.margin_top - FRAME_PADDING
+        self.ops: list = []
+        self._at_top = True
+        self._prev_space_after = 0
+
+    def place(self, height: float, space_before: float = 0, space_after: float = 0) -> float:
+        """Reserve ``height`` points and return the bottom of the block."""
+        space = 0 if self._at_top else max(space_before - self._prev_space_after, 0)
+        self.y -= space + height
+        if self.strict and self.y < self.bottom - FUZZ:
+            raise UnsupportedLayout("Invoice does not fit on a single page")
+        bottom = self.y
+        self.y -= space_after
+        self._prev_space_after = space_after
+        self._at_top = False
+        return bottom
+
+    def text(self, style, x: float, y: float, text: str, align_right: bool = False) -> None:
+        self.ops.append(TextOp(style.fontName, style.fontSize, style.textColor, x, y, text, align_right))
+
+    def wrap(self, text: str, style, width: float) -> List[str]:
+        # Paragraphs collapse whitespace; markup and entities need the real parser
+        text = ' '.join(text.split())
+        if not text:
+            return []
+        if '<' in text or '&' in text:
+            if self.strict:
+                raise UnsupportedLayout("Text contains markup")
+            text = html.unescape(MARKUP_TAG.sub('', text))
+        lines = simpleSplit(text, style.fontName, style.fontSize, width)
+        if self.strict and any(stringWidth(line, style.fontName, style.fontSize) > width for line in lines):
+            raise UnsupportedLayout("Text contains a word wider than its column")
+        return lines
+
+    def single_line(self, text: str, style, width: float) -> List[str]:
+        lines = self.wrap(text, style, width)
+        if self.strict and len(lines) > 1:
+            raise UnsupportedLayout("Header text wraps")
+        return lines
+
+
+def _paragraph_lines(page: _Page, style, lines: List[str], x: float, bottom: float,
+                     right: float | None = None) -> None:
+    """Draw wrapped lines as a paragraph whose box starts at ``bottom``."""
+    y = bottom + len(lines) * style.leading - style.fontSize
+    for line in lines:
+        if right is None:
+            page.text(style, x + style.leftIndent, y, line)
+        else:
+            page.text(style, right, y, line, align_right=True)
+        y -= style.leading
+
+
+def _header(page: _Page, invoice) -> None:
+    compiled = page.compiled
+    styles = compiled.styles
+    table_left = page.left + (page.width - compiled.available_width) / 2
+    left_width, right_width = compiled.header_col_widths
+    column_width = left_width - 2 * CELL_PADDING_X
+    text_width = column_width - 2 * CELL_PADDING_X
+
+    # Left column: a row per line, top padding -2 and bottom padding 3
+    left_rows = [(None, 30), ('SectionHeader', "Bill To:")]
+    left_rows += [('AddressText', line) for line in address_lines(invoice.bill_to)]
+    left_rows += [(None, 10), ('SectionHeader', "Send To:")]
+    left_rows += [('AddressText', line) for line in address_lines(invoice.send_to)]
+    left = []
+    for style_name, content in left_rows:
+        if style_name is None:
+            left.append((None, None, content + 1))
+        else:
+            style = styles[style_name]
+            lines = page.single_line(content, style, text_width)
+            left.append((style, lines, len(lines) * style.leading + 1))
+
+    # Right column: rows have no vertical padding (top -3, bottom 3)
+    title_style = styles['InvoiceTitle']
+    number_style = styles['InvoiceNumber']
+    date_style = styles['RightAligned']
+    balance_style = styles['BalanceDue']
+    label_width, value_width = compiled.header_detail_col_widths
+    title = page.single_line("INVOICE", title_style, right_width - 4 * CELL_PADDING_X)
+    number = page.single_line(f"#{invoice.invoice_number}", number_style, right_width - 4 * CELL_PADDING_X)
+    date_label = page.single_line("Date:", date_style, label_width - 2 * CELL_PADDING_X)
+    date_value = page.single_line(format_invoice_date(invoice.invoice_date), date_style, value_width - 2 * CELL_PADDING_X)
+    balance_label = page.single_line("Balance Due:", balance_style, label_width - 2 * CELL_PADDING_X)
+    balance_value = page.single_line(f"${invoice.total:,.2f}", balance_style, value_width - 2 * CELL_PADDING_X)
+    date_height = max(len(date_label), len(date_value)) * date_style.leading + 2 * CELL_PADDING_Y
+    balance_height = max(len(balance_label), len(balance_value)) * balance_style.leading + 2 + 7
+    right_heights = [
+        len(title) * title_style.leading,
+        len(number) * number_style.leading,
+        20,
+        date_height,
+        10,
+        balance_height,
+    ]
+
+    height = max(sum(h for _, _, h in left), sum(right_heights)) + 2 * CELL_PADDING_Y
+    bottom = page.place(height)
+    top = bottom + height - CELL_PADDING_Y
+
+    y = top
+    x = table_left + 2 * CELL_PADDING_X
+    for style, lines, row_height in left:
+        y -= row_height
+        if style is not None:
+            _paragraph_lines(page, style, lines, x, y + CELL_PADDING_Y)
+
+    column_right = table_left + left_width + right_width - CELL_PADDING_X
+    detail_left = table_left + left_width + 2 * CELL_PADDING_X
+    label_right = detail_left + label_width - CELL_PADDING_X
+    value_right = detail_left + label_width + value_width - CELL_PADDING_X
+    rows = iter(right_heights)
+
+    y = top - next(rows)
+    _paragraph_lines(page, title_style, title, 0, y + CELL_PADDING_Y, right=column_right - CELL_PADDING_X)
+    y -= next(rows)
+    _paragraph_lines(page, number_style, number, 0, y + CELL_PADDING_Y, right=column_right - CELL_PADDING_X)
+    y -= next(rows)
+
+    y -= next(rows)
+    _paragraph_lines(page, date_style, date_label, 0, y + 2 * CELL_PADDING_Y, right=label_right)
+    _paragraph_lines(page, date_style, date_value, 0, y + 2 * CELL_PADDING_Y, right=value_right)
+    y -= next(rows)
+
+    y -= next(rows)
+    page.ops.append(RectOp(detail_left, y + CELL_PADDING_Y, label_width + value_width, balance_height,
+                          HexColor(BALANCE_BACKGROUND)))
+    _paragraph_lines(page, balance_style, balance_label, 0, y + CELL_PADDING_Y + 7, right=label_right)
+    _paragraph_lines(page, balance_style, balance_value, 0, y + CELL_PADDING_Y + 7, right=value_right)
+
+
+def _items(page: _Page, invoice) -> None:
+    compiled = page.compiled
+    styles = compiled.styles
+    widths = compiled.item_col_widths
+    table_left = page.left + (page.width - sum(widths)) / 2
+    columns = [table_left]
+    for width in widths:
+        columns.append(columns[-1] + width)
+
+    header_size = compiled.font_sizes['table_header']
+    header_height = header_size * 1.2 + CELL_PADDING_Y + 8
+    body = []
+    for style_name, description, *values in item_rows(invoice.items):
+        style = styles[style_name]
+        lines = page.wrap(description, style, widths[0] - 2 * CELL_PADDING_X - style.leftIndent)
+        height = max(len(lines) * style.leading, CELL_FONT_SIZE * 1.2) + 2
+        body.append((style, lines, values, height))
+
+    body_height = sum(height for *_, height in body)
+    bottom = page.place(header_height + body_height)
+    top = bottom + header_height + body_height
+    header_bottom = top - header_height
+    full_width = columns[-1] - table_left
+
+    page.ops.append(RectOp(table_left, header_bottom, full_width, header_height, compiled.accent_color))
+    if body:
+        page.ops.append(RectOp(table_left, bottom, full_width, body_height, white))
+
+    header_y = header_bottom + 8 + CELL_LEADING - header_size
+    for column, label in zip(columns, ITEMS_HEADER):
+        page.ops.append(TextOp(compiled.accent_font, header_size, white, column + CELL_PADDING_X, header_y, label))
+
+    y = header_bottom
+    for style, lines, values, height in body:
+        y -= height
+        _paragraph_lines(page, style, lines, table_left + CELL_PADDING_X, y + 1)
+        value_y = y + 1 + CELL_LEADING - CELL_FONT_SIZE
+        for right, value in zip(columns[2:], values):
+            if value:
+                page.ops.append(TextOp(CELL_FONT, CELL_FONT_SIZE, None, right - CELL_PADDING_X, value_y, value, True))
+
+    # Header grid in white, then the rule under the last row
+    for line_y in (top, header_bottom):
+        page.ops.append(LineOp(table_left, line_y, columns[-1], line_y, 1, white))
+    for column in columns:
+        page.ops.append(LineOp(column, header_bottom, column, top, 1, white))
+    page.ops.append(LineOp(table_left, bottom, columns[-1], bottom, 0.5, compiled.primary_color))
+
+
+def _totals(page: _Page, invoice) -> None:
+    compiled = page.compiled
+    widths = compiled.totals_col_widths
+    table_left = page.left + (page.width - sum(widths)) / 2
+    label_right = table_left + widths[0] + widths[1] - CELL_PADDING_X
+    amount_right = table_left + sum(widths) - CELL_PADDING_X
+    row_height = CELL_FONT_SIZE * 1.2 + 2 * CELL_PADDING_Y
+
+    rows = totals_rows(invoice)
+    bottom = page.place(row_height * len(rows))
+    y = bottom + row_height * len(rows)
+    for index, (label, amount) in enumerate(rows):
+        y -= row_height
+        font = compiled.accent_font if index == len(rows) - 1 else CELL_FONT
+        baseline = y + CELL_PADDING_Y + CELL_LEADING - CELL_FONT_SIZE
+        page.ops.append(TextOp(font, CELL_FONT_SIZE, None, label_right, baseline, label, True))
+        page.ops.append(TextOp(font, CELL_FONT_SIZE, None, amount_right, baseline, amount, True))
+    last_top = bottom + row_height
+    page.ops.append(LineOp(table_left + widths[0], last_top, table_left + sum(widths), last_top, 1,
+                          compiled.primary_color))
+
+
+def _notes(page: _Page, invoice) -> None:
+    styles = page.compiled.styles
+    page.place(15)
+    header_style = styles['SectionHeader']
+    bottom = page.place(header_style.leading, header_style.spaceBefore, header_style.spaceAfter)
+    _paragraph_lines(page, header_style, ["Notes"], page.left, bottom)
+
+    style = styles['PaymentTerms']
+    lines = page.wrap(invoice.notes, style, page.width - style.leftIndent - style.rightIndent)
+    bottom = page.place(len(lines) * style.leading, style.spaceBefore, style.spaceAfter)
+    _paragraph_lines(page, style, lines, page.left, bottom)
+
+
+def _draw(canvas: Canvas, ops: list) -> None:
+    for op in ops:
+        if isinstance(op, RectOp):
+            canvas.setFillColor(op.color)
+            canvas.rect(op.x, op.y, op.width, op.height, stroke=0, fill=1)
+
+    current_font = None
+    current_color = None
+    for op in ops:
+        if isinstance(op, TextOp):
+            if (op.font, op.size) != current_font:
+                canvas.setFont(op.font, op.size)
+                current_font = (op.font, op.size)
+            color = op.color or black
+            if color != current_color:
+                canvas.setFillColor(color)
+                current_color = color
+            if op.align_right:
+                canvas.drawRightString(op.x, op.y, op.text)
+            else:
+                canvas.drawString(op.x, op.y, op.text)
+
+    canvas.saveState()
+    canvas.setLineCap(1)
+    canvas.setLineJoin(1)
+    for op in ops:
+        if isinstance(op, LineOp):
+            canvas.setStrokeColor(op.color)
+            canvas.setLineWidth(op.width)
+            canvas.line(op.x1, op.y1, op.x2, op.y2)
+    canvas.restoreState()
+
+
+def layout_page(invoice, compiled: CompiledTemplate, strict: bool = True) -> list:
+    """Lay the invoice out as drawing operations.
+
+    Without ``strict`` nothing is rejected: markup is stripped, long text is
+    allowed to overflow and content past the bottom margin is laid out below the
+    page. That approximation is good enough for previews of page one.
+    """
+    page = _Page(compiled, strict)
+    _header(page, invoice)
+    page.place(24)
+    _items(page, invoice)
+    page.place(12)
+    _totals(page, invoice)
+    if invoice.notes:
+        _notes(page, invoice)
+    return page.ops
+
+
+def render_canvas(invoice, template, output: str | BinaryIO, invariant: bool = False) -> None:
+    with phase('styles'):
+        compiled = compile_template(template)
+    with phase('layout'):
+        ops = layout_page(invoice, compiled)
+
+    # Everything has been measured; only now touch the output
+    with phase('build'):
+        canvas = TimedCanvas(output, pagesize=compiled.page_size, invariant=invariant)
+        _draw(canvas, ops)
+        canvas.showPage()
+        canvas.save()
+    record(pages=1)
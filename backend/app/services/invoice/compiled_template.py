@@ -0,0 +1,245 @@
+"""Per-template render setup, compiled once and reused across invoices.
+
+Resolving a template into ReportLab objects (paragraph styles, colors, table
+styles and page geometry) is identical for every invoice rendered with it, so
+the result is cached by a fingerprint of the template's styling fields. Editing
+a template changes its fingerprint, which naturally yields a fresh compile.
+"""
+import json
+import logging
+from dataclasses import dataclass
+from functools import lru_cache
+
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4, letter
+from reportlab.lib.styles import ParagraphStyle, StyleSheet1, getSampleStyleSheet
+from reportlab.lib.units import inch
+from reportlab.platypus import TableStyle
+
+from ..template.fonts import ensure_font
+
+logger = logging.getLogger(__name__)
+
+# Fractions of the available width used by each table
+HEADER_COLUMN_RATIOS = (0.5, 0.5)
+HEADER_DETAIL_RATIOS = (0.4, 0.6)
+ITEM_COLUMN_RATIOS = (0.5, 0.15, 0.15, 0.2)
+TOTALS_COLUMN_RATIOS = (0.5, 0.3, 0.2)
+BALANCE_BACKGROUND = "#cccccc"
+DEFAULT_MAIN_FONT = 'Helvetica'
+DEFAULT_ACCENT_FONT = 'Helvetica-Bold'
+
+
+@dataclass(frozen=True)
+class CompiledTemplate:
+    page_size: tuple[float, float]
+    margin_top: float
+    margin_right: float
+    margin_bottom: float
+    margin_left: float
+    available_width: float
+    main_font: str
+    accent_font: str
+    font_sizes: dict
+    primary_color: colors.Color
+    secondary_color: colors.Color
+    accent_color: colors.Color
+    styles: StyleSheet1
+    header_col_widths: list[float]
+    header_detail_col_widths: list[float]
+    item_col_widths: list[float]
+    totals_col_widths: list[float]
+    header_table_style: TableStyle
+    date_table_style: TableStyle
+    balance_table_style: TableStyle
+    items_table_style: TableStyle
+    totals_table_style: TableStyle
+
+    @property
+    def available_height(self) -> float:
+        return self.page_size[1] - self.margin_top - self.margin_bottom
+
+
+def template_fingerprint(template) -> str:
+    return json.dumps(
+        {
+            'colors': template.colors,
+            'fonts': template.fonts,
+            'font_sizes': template.font_sizes,
+            'layout': template.layout,
+        },
+        sort_keys=True,
+    )
+
+
+def compile_template(template) -> CompiledTemplate:
+    return compile_fingerprint(template_fingerprint(template))
+
+
+def _usable_font(name: str, fallback: str) -> str:
+    # Compiles are cached, so a custom font is looked up at most once per process
+    if ensure_font(name):
+        return name
+    logger.warning(f"Font {name} is not available, using {fallback}")
+    return fallback
+
+
+def _build_styles(main_font: str, accent_font: str, font_sizes: dict,
+                  primary_color: colors.Color, secondary_color: colors.Color) -> StyleSheet1:
+    styles = getSampleStyleSheet()
+    styles.add(ParagraphStyle(
+        name='InvoiceTitle',
+        parent=styles['Title'],
+        fontName=accent_font,
+        fontSize=font_sizes['title'],
+        textColor=primary_color,
+        alignment=2,
+        spaceAfter=2
+    ))
+    styles.add(ParagraphStyle(
+        name='InvoiceNumber',
+        parent=styles['Normal'],
+        fontName=accent_font,
+        fontSize=font_sizes['invoice_number'],
+        textColor=primary_color,
+        alignment=2,
+        spaceAfter=12
+    ))
+    styles.add(ParagraphStyle(
+        name='SectionHeader',
+        parent=styles['Normal'],
+        fontName=accent_font,
+        fontSize=font_sizes['section_header'],
+        textColor=secondary_color,
+        leading=10,
+        spaceBefore=10,
+        spaceAfter=-10
+    ))
+    styles.add(ParagraphStyle(
+        name='AddressText',
+        parent=styles['Normal'],
+        fontName=main_font,
+        fontSize=font_sizes['normal_text'],
+        leading=10,
+        spaceBefore=0,
+        spaceAfter=10
+    ))
+    styles.add(ParagraphStyle(
+        name='RightAligned',
+        parent=styles['Normal'],
+        fontName=main_font,
+        alignment=2,
+        fontSize=font_sizes['normal_text'],
+        spaceAfter=2
+    ))
+    styles.add(ParagraphStyle(
+        name='BalanceDue',
+        parent=styles['Normal'],
+        fontName=accent_font,
+        fontSize=font_sizes['invoice_number'],
+        textColor=colors.black,
+        alignment=2,
+        spaceAfter=0
+    ))
+    styles.add(ParagraphStyle(
+        name='ItemDescription',
+        parent=styles['Normal'],
+        fontName=main_font,
+        fontSize=font_sizes['normal_text'],
+        textColor=primary_color,
+    ))
+    styles.add(ParagraphStyle(
+        name='SubItemDescription',
+        parent=styles['Normal'],
+        fontName=main_font,
+        fontSize=font_sizes['normal_text'] - 2,
+        textColor=secondary_color,
+        leftIndent=20
+    ))
+    styles.add(ParagraphStyle(
+        name='PaymentTerms',
+        parent=styles['Normal'],
+        fontName=accent_font,
+        fontSize=font_sizes.get('small_text', 7),
+        textColor=secondary_color,
+        spaceBefore=10,
+        spaceAfter=1
+    ))
+    return styles
+
+
+@lru_cache(maxsize=64)
+def compile_fingerprint(fingerprint: str) -> CompiledTemplate:
+    config = json.loads(fingerprint)
+    layout = config['layout']
+    font_sizes = config['font_sizes']
+
+    page_size = A4 if layout['page_size'].upper() == 'A4' else letter
+    margin_top = layout['margin_top'] * inch
+    margin_right = layout['margin_right'] * inch
+    margin_bottom = layout['margin_bottom'] * inch
+    margin_left = layout['margin_left'] * inch
+    available_width = page_size[0] - margin_left - margin_right
+
+    primary_color = colors.HexColor(config['colors']['primary'])
+    secondary_color = colors.HexColor(config['colors']['secondary'])
+    accent_color = colors.HexColor(config['colors']['accent'])
+
+    main_font = _usable_font(config['fonts']['main'], DEFAULT_MAIN_FONT)
+    accent_font = _usable_font(config['fonts']['accent'], DEFAULT_ACCENT_FONT)
+
+    half_width = available_width / 2
+
+    return CompiledTemplate(
+        page_size=page_size,
+        margin_top=margin_top,
+        margin_right=margin_right,
+        margin_bottom=margin_bottom,
+        margin_left=margin_left,
+        available_width=available_width,
+        main_font=main_font,
+        accent_font=accent_font,
+        font_sizes=font_sizes,
+        primary_color=primary_color,
+        secondary_color=secondary_color,
+        accent_color=accent_color,
+        styles=_build_styles(main_font, accent_font, font_sizes, primary_color, secondary_color),
+        header_col_widths=[available_width * ratio for ratio in HEADER_COLUMN_RATIOS],
+        header_detail_col_widths=[half_width * ratio for ratio in HEADER_DETAIL_RATIOS],
+        item_col_widths=[available_width * ratio for ratio in ITEM_COLUMN_RATIOS],
+        totals_col_widths=[available_width * ratio for ratio in TOTALS_COLUMN_RATIOS],
+        header_table_style=TableStyle([
+            ('ALIGN', (0, 0), (0, 0), 'LEFT'),
+            ('ALIGN', (1, 0), (1, 0), 'RIGHT'),
+            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+        ]),
+        date_table_style=TableStyle([('ALIGN', (0, 0), (-1, -1), 'RIGHT')]),
+        balance_table_style=TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), BALANCE_BACKGROUND),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
+            ('ALIGN', (0, 0), (-1, -1), 'RIGHT'),
+            ('LEFTPADDING', (0, 0), (0, 0), 6),
+            ('RIGHTPADDING', (1, 0), (1, 0), 6),
+            ('TOPPADDING', (0, 0), (-1, 0), 2),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 7),
+        ]),
+        items_table_style=TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), accent_color),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('ALIGN', (1, 1), (-1, -1), 'RIGHT'),
+            ('FONTNAME', (0, 0), (-1, 0), accent_font),
+            ('FONTSIZE', (0, 0), (-1, 0), font_sizes['table_header']),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
+            ('BACKGROUND', (0, 1), (-1, -1), colors.white),
+            ('GRID', (0, 0), (-1, 0), 1, colors.white),
+            ('LINEBELOW', (0, -1), (-1, -1), 0.5, primary_color),
+            ('TOPPADDING', (0, 1), (-1, -1), 1),
+            ('BOTTOMPADDING', (0, 1), (-1, -1), 1),
+        ]),
+        totals_table_style=TableStyle([
+            ('ALIGN', (1, 0), (2, -1), 'RIGHT'),
+            ('FONTNAME', (0, -1), (-1, -1), accent_font),
+            ('LINEABOVE', (1, -1), (2, -1), 1, primary_color),
+        ]),
+    )
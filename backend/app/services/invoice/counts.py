@@ -0,0 +1,134 @@
+"""Total counts for filtered invoice lists.
+
+Counting every matching row costs about as much as the list query itself, so
+``get_invoices`` picks a strategy per request and reports which kind of count
+it returned:
+
+- ``exact``: a ``COUNT(*) OVER ()`` column on the page query, so the count
+  comes back in the same round trip as the page. Cursor pages, and pages past
+  the end, fall back to a separate ``COUNT(*)``.
+- ``cached``: an exact count remembered per user and filter signature. Invoice
+  and contact writes drop a user's counts; other server processes may serve
+  one for up to ``invoice_count_cache_ttl_seconds`` after a write.
+- ``estimated``: the PostgreSQL planner's row estimate, used for result sets
+  larger than ``invoice_count_estimate_threshold``, where exact counting would
+  dominate the request. Asking the planner costs a round trip of its own, so
+  ``auto`` only does it for users whose last known invoice total reaches the
+  threshold; no filtered list can be larger than that.
+"""
+import json
+import time
+from collections import OrderedDict
+from enum import Enum
+from typing import Dict, Hashable, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ClauseElement, Executable
+
+from ...core.config import settings
+
+
+class CountKind(str, Enum):
+    EXACT = "exact"
+    CACHED = "cached"
+    ESTIMATED = "estimated"
+
+
+class Explain(Executable, ClauseElement):
+    """``EXPLAIN`` of a statement, returning the plan as JSON (PostgreSQL only)."""
+    inherit_cache = False
+
+    def __init__(self, statement, analyze: bool = False):
+        self.statement = statement
+        self.analyze = analyze
+
+
+@compiles(Explain, 'postgresql')
+def _compile_explain(element: Explain, compiler, **kw) -> str:
+    options = "ANALYZE, BUFFERS, FORMAT JSON" if element.analyze else "FORMAT JSON"
+    return f"EXPLAIN ({options}) {compiler.process(element.statement, **kw)}"
+
+
+async def explain(db: AsyncSession, statement, analyze: bool = False) -> dict:
+    """The top-level plan node of ``statement``."""
+    result = await db.execute(Explain(statement, analyze=analyze))
+    plan = result.scalar()
+    # asyncpg hands the JSON document back as text
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]
+
+
+async def estimate_count(db: AsyncSession, statement) -> int | None:
+    """The planner's estimate of the rows ``statement`` returns, or None if the database has no planner estimates."""
+    if db.get_bind().dialect.name != 'postgresql':
+        return None
+    plan = await explain(db, statement)
+    return int(plan['Plan']['Plan Rows'])
+
+
+class CountCache:
+    """Exact counts per user and filter signature.
+
+    Each user has a generation that writes bump; entries from older generations
+    are never returned and age out of the LRU. Callers read the generation
+    before counting and store the count under it, so a write that lands while a
+    count query runs leaves that count unreachable.
+
+    Separately, the cache remembers each user's last known unfiltered total as
+    a size hint. Writes do not drop it, since it only has to be roughly right
+    to decide whether estimating could pay off.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: OrderedDict[Tuple[int, int, Hashable], Tuple[int, float]] = OrderedDict()
+        self._generations: Dict[int, int] = {}
+        self._sizes: OrderedDict[int, int] = OrderedDict()
+
+    def generation(self, user_id: int) -> int:
+        return self._generations.get(user_id, 0)
+
+    def get(self, user_id: int, signature: Hashable) -> int | None:
+        key = (user_id, self._generations.get(user_id, 0), signature)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        count, stored_at = entry
+        if time.monotonic() - stored_at > self.ttl:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return count
+
+    def set(self, user_id: int, signature: Hashable, count: int, generation: int) -> None:
+        """Store ``count``, computed by a query that started at ``generation``."""
+        if self.max_entries <= 0:
+            return
+        key = (user_id, generation, signature)
+        self._entries[key] = (count, time.monotonic())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def user_size(self, user_id: int) -> int | None:
+        return self._sizes.get(user_id)
+
+    def set_user_size(self, user_id: int, count: int) -> None:
+        if self.max_entries <= 0:
+            return
+        self._sizes[user_id] = count
+        self._sizes.move_to_end(user_id)
+        while len(self._sizes) > self.max_entries:
+            self._sizes.popitem(last=False)
+
+    def invalidate_user(self, user_id: int) -> None:
+        self._generations[user_id] = self._generations.get(user_id, 0) + 1
+
+
+invoice_counts = CountCache(
+    max_entries=settings.invoice_count_cache_max_entries,
+    ttl=settings.invoice_count_cache_ttl_seconds,
+)
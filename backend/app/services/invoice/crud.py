@@ -1,27 +1,59 @@
 import logging
 from datetime import date
+from decimal import Decimal
 from typing import Any, Dict, List
 
-from sqlalchemy import Integer, select, func, or_, desc, asc
+from sqlalchemy import Integer, select, func, or_, desc, asc, tuple_
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import aliased, selectinload
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from ...core.config import settings
 from ...core.exceptions import BadRequestError, NotFoundError, AlreadyExistsError
+from ...core.pagination import decode_cursor, encode_cursor
+from ...core.search import contains, prefix_rank, prefix_rank_value
 from ...models.contact import Contact
 from ...models.template import Template
-from ...models.invoice import Invoice, InvoiceItem, InvoiceSubItem
+from ...models.invoice import Invoice, InvoiceItem, InvoiceStatusEnum, InvoiceSubItem
 from ...schemas.invoice import InvoiceCreate
+from .counts import CountKind, estimate_count, invoice_counts
+from .pdf_cache import pdf_cache
+from .totals import record_invoice_change, status_aggregates, status_counts
 
 logger = logging.getLogger(__name__)
 
-async def get_invoice(db: AsyncSession, invoice_id: int, user_id: int) -> Invoice | None:
+# Sort values of a loaded invoice, written into the cursor for the next page
+SORT_VALUES = {
+    'invoice_number': lambda invoice: invoice.invoice_number,
+    'bill_to_name': lambda invoice: invoice.bill_to.name or '',
+    'send_to_name': lambda invoice: invoice.send_to.name or '',
+    'date': lambda invoice: invoice.invoice_date,
+    'total': lambda invoice: invoice.total,
+    'template_name': lambda invoice: invoice.template.name or '',
+    'status': lambda invoice: invoice.status,
+    'client_type': lambda invoice: invoice.client_type,
+    'invoice_type': lambda invoice: invoice.invoice_type,
+}
+# Searched values of a loaded invoice, to rank prefix matches in the cursor for the next page
+SEARCH_VALUES = {
+    'invoice_number': lambda invoice: invoice.invoice_number,
+    'bill_to_name': lambda invoice: invoice.bill_to.name,
+    'send_to_name': lambda invoice: invoice.send_to.name,
+}
+# Cursor values that JSON does not carry as their column's Python type
+CURSOR_DECODERS = {'date': date.fromisoformat, 'total': Decimal}
+
+async def get_invoice(db: AsyncSession, invoice_id: int, user_id: int, for_update: bool = False) -> Invoice | None:
     stmt = select(Invoice).options(
         selectinload(Invoice.items).selectinload(InvoiceItem.subitems),
         selectinload(Invoice.bill_to),
         selectinload(Invoice.send_to),
         selectinload(Invoice.template)
     ).filter(Invoice.id == invoice_id, Invoice.user_id == user_id)
+    if for_update:
+        # Lock the invoice row until commit and re-read it even if the session
+        # already holds it, so writes see the status and total they replace
+        stmt = stmt.with_for_update(of=Invoice).execution_options(populate_existing=True)
     result = await db.execute(stmt)
     invoice = result.scalar_one_or_none()
     
@@ -34,6 +66,44 @@ async def get_invoice(db: AsyncSession, invoice_id: int, user_id: int) -> Invoic
     return invoice
 
 
+def apply_invoice_filters(
+    stmt,
+    bill_to_contact,
+    send_to_contact,
+    invoice_number: str | None = None,
+    bill_to_name: str | None = None,
+    send_to_name: str | None = None,
+    client_type: str | None = None,
+    invoice_type: str | None = None,
+    status: str | None = None,
+    date_from: date | None = None,
+    date_to: date | None = None,
+    total_min: float | None = None,
+    total_max: float | None = None
+):
+    if invoice_number:
+        stmt = stmt.filter(contains(Invoice.invoice_number, invoice_number))
+    if bill_to_name:
+        stmt = stmt.join(bill_to_contact, Invoice.bill_to).filter(contains(bill_to_contact.name, bill_to_name))
+    if send_to_name:
+        stmt = stmt.join(send_to_contact, Invoice.send_to).filter(contains(send_to_contact.name, send_to_name))
+    if client_type:
+        stmt = stmt.filter(Invoice.client_type == client_type)
+    if invoice_type:
+        stmt = stmt.filter(Invoice.invoice_type == invoice_type)
+    if status:
+        stmt = stmt.filter(Invoice.status == status)
+    if date_from:
+        stmt = stmt.filter(Invoice.invoice_date >= date_from)
+    if date_to:
+        stmt = stmt.filter(Invoice.invoice_date <= date_to)
+    if total_min is not None:
+        stmt = stmt.filter(Invoice.total >= total_min)
+    if total_max is not None:
+        stmt = stmt.filter(Invoice.total <= total_max)
+    return stmt
+
+
 async def get_invoices(
     db: AsyncSession,
     user_id: int,
@@ -51,8 +121,16 @@ async def get_invoices(
     date_from: date | None = None,
     date_to: date | None = None,
     total_min: float | None = None,
-    total_max: float | None = None
-) -> tuple[Dict[str, Any], int]:
+    total_max: float | None = None,
+    cursor: str | None = None,
+    count: str = 'auto'
+) -> tuple[Dict[str, Any], int, CountKind, str | None]:
+    """A page of invoices, the total count, the kind of count and the cursor of the next page.
+
+    ``count`` is ``exact``, ``estimated`` or ``auto``, which serves a cached
+    count when there is one, a planner estimate for very large results, and
+    otherwise an exact count.
+    """
     BillToContact = aliased(Contact)
     SendToContact = aliased(Contact)
     AliasedTemplate = aliased(Template)
@@ -64,53 +142,58 @@ async def get_invoices(
     ).filter(Invoice.user_id == user_id)
 
     # Apply filters
-    if invoice_number:
-        stmt = stmt.filter(Invoice.invoice_number.ilike(f"%{invoice_number}%"))
-    if bill_to_name:
-        stmt = stmt.join(BillToContact, Invoice.bill_to).filter(BillToContact.name.ilike(f"%{bill_to_name}%"))
-    if send_to_name:
-        stmt = stmt.join(SendToContact, Invoice.send_to).filter(SendToContact.name.ilike(f"%{send_to_name}%"))
-    if client_type:
-        stmt = stmt.filter(Invoice.client_type == client_type)
-    if invoice_type:
-        stmt = stmt.filter(Invoice.invoice_type == invoice_type)
-    if status:
-        stmt = stmt.filter(Invoice.status == status)
-    if date_from:
-        stmt = stmt.filter(Invoice.invoice_date >= date_from)
-    if date_to:
-        stmt = stmt.filter(Invoice.invoice_date <= date_to)
-    if total_min is not None:
-        stmt = stmt.filter(Invoice.total >= total_min)
-    if total_max is not None:
-        stmt = stmt.filter(Invoice.total <= total_max)
+    filters = dict(
+        invoice_number=invoice_number, bill_to_name=bill_to_name,
+        send_to_name=send_to_name, client_type=client_type,
+        invoice_type=invoice_type, status=status,
+        date_from=date_from, date_to=date_to,
+        total_min=total_min, total_max=total_max
+    )
+    stmt = apply_invoice_filters(stmt, BillToContact, SendToContact, **filters)
 
     # Apply sorting
-    if sort_by:
-        order_func = desc if sort_order.lower() == 'desc' else asc
-        sort_column = {
+    order_func = desc if sort_order.lower() == 'desc' else asc
+    sort_column = {
+        'invoice_number': Invoice.invoice_number,
+        'bill_to_name': func.coalesce(BillToContact.name, ''),
+        'send_to_name': func.coalesce(SendToContact.name, ''),
+        'date': Invoice.invoice_date,
+        'total': Invoice.total,
+        'template_name': func.coalesce(AliasedTemplate.name, ''),
+        'status': Invoice.status,
+        'client_type': Invoice.client_type,
+        'invoice_type': Invoice.invoice_type
+    }.get(sort_by)
+    descending = order_func is desc
+    ranked = []
+    if sort_column is None:
+        sort_by = None
+        # Without an explicit sort, searches list prefix matches first
+        search_columns = {
             'invoice_number': Invoice.invoice_number,
             'bill_to_name': BillToContact.name,
             'send_to_name': SendToContact.name,
-            'date': Invoice.invoice_date,
-            'total': Invoice.total,
-            'template_name': AliasedTemplate.name,
-            'status': Invoice.status,
-            'client_type': Invoice.client_type,
-            'invoice_type': Invoice.invoice_type
-        }.get(sort_by)
-        if sort_column is not None:
-            if sort_by in ['template_name', 'bill_to_name', 'send_to_name']:
-                if sort_by == 'template_name':
-                    stmt = stmt.join(AliasedTemplate, Invoice.template)
-                elif sort_by == 'bill_to_name':
-                    stmt = stmt.join(BillToContact, Invoice.bill_to)
-                elif sort_by == 'send_to_name':
-                    stmt = stmt.join(SendToContact, Invoice.send_to)
-            stmt = stmt.order_by(order_func(sort_column))
+        }
+        ranked = [name for name in search_columns if filters[name]]
+        sort_key = [prefix_rank(search_columns[name], filters[name], descending) for name in ranked]
+    else:
+        sort_key = [sort_column]
+        if sort_by == 'template_name':
+            stmt = stmt.join(AliasedTemplate, Invoice.template)
+        # The name filters already join their contact
+        elif sort_by == 'bill_to_name' and not bill_to_name:
+            stmt = stmt.join(BillToContact, Invoice.bill_to)
+        elif sort_by == 'send_to_name' and not send_to_name:
+            stmt = stmt.join(SendToContact, Invoice.send_to)
+    # The id breaks ties, so the order is total and a cursor can resume after any row
+    sort_key.append(Invoice.id)
+    ordered_stmt = stmt.order_by(*map(order_func, sort_key))
 
     # Apply grouping
     if group_by:
+        if cursor is not None:
+            raise BadRequestError("Cursor pagination is not supported for grouped invoices")
+        stmt = ordered_stmt
         # Perform grouping
         group_columns = [...]  # Define group columns based on group_by
         stmt = stmt.group_by(*group_columns)
@@ -147,14 +230,150 @@ async def get_invoices(
         
         total_count = sum(data['count'] for data in group_data.values())
         
-        return final_result, total_count
+        return final_result, total_count, CountKind.EXACT, None
     else:
-        # Non-grouped query (existing logic)
-        total_count = await db.scalar(select(func.count()).select_from(stmt.subquery()))
-        stmt = stmt.offset(skip).limit(limit)
-        result = await db.execute(stmt)
-        invoices = result.scalars().all()
-        return invoices, total_count
+        signature = tuple(sorted(filters.items()))
+        # Mirrors apply_invoice_filters: totals filter when set, everything else when truthy
+        unfiltered = all(
+            value is None if name in ('total_min', 'total_max') else not value
+            for name, value in filters.items()
+        )
+        generation = invoice_counts.generation(user_id)
+        total_count, total_kind = None, CountKind.EXACT
+        if count == 'auto':
+            total_count = invoice_counts.get(user_id, signature)
+            if total_count is not None:
+                total_kind = CountKind.CACHED
+        threshold = settings.invoice_count_estimate_threshold
+        # Only ask the planner when the user has enough invoices for this list to reach the threshold
+        user_size = invoice_counts.user_size(user_id)
+        if total_count is None and (count == 'estimated' or (count == 'auto' and user_size is not None and user_size >= threshold)):
+            estimate = await estimate_count(db, stmt)
+            if estimate is not None and (count == 'estimated' or estimate >= threshold):
+                total_count, total_kind = estimate, CountKind.ESTIMATED
+                if unfiltered:
+                    invoice_counts.set_user_size(user_id, estimate)
+        count_stmt = select(func.count()).select_from(stmt.subquery())
+
+        stmt = ordered_stmt
+        if cursor is not None:
+            # Keyset pagination: start right after the last row of the previous page
+            if skip:
+                raise BadRequestError("Use either skip or cursor, not both")
+            values = decode_cursor(cursor, sort_by, sort_order)
+            if len(values) != len(sort_key):
+                raise BadRequestError("Invalid cursor")
+            try:
+                if sort_by in CURSOR_DECODERS:
+                    values[0] = CURSOR_DECODERS[sort_by](values[0])
+                values[-1] = int(values[-1])
+            except (TypeError, ValueError, ArithmeticError):
+                raise BadRequestError("Invalid cursor")
+            after = tuple_(*sort_key) < tuple_(*values) if descending else tuple_(*sort_key) > tuple_(*values)
+            stmt = stmt.filter(after)
+
+        # Count in the same query unless the count is known, or the cursor filter would skew it
+        window_count = total_count is None and cursor is None
+        if window_count:
+            stmt = stmt.add_columns(func.count().over().label('total_count'))
+
+        # Fetch one extra row to learn whether there is a next page
+        result = await db.execute(stmt.offset(skip).limit(limit + 1))
+        rows = result.all()
+        invoices = [row[0] for row in rows]
+        if total_count is None:
+            if window_count and (rows or not skip):
+                total_count = rows[0][1] if rows else 0
+            else:
+                total_count = await db.scalar(count_stmt)
+            invoice_counts.set(user_id, signature, total_count, generation)
+            if unfiltered:
+                invoice_counts.set_user_size(user_id, total_count)
+
+        next_cursor = None
+        if len(invoices) > limit > 0:
+            invoices = invoices[:limit]
+            last = invoices[-1]
+            if sort_by is None:
+                values = [prefix_rank_value(SEARCH_VALUES[name](last), filters[name], descending) for name in ranked]
+            else:
+                values = [SORT_VALUES[sort_by](last)]
+            next_cursor = encode_cursor(sort_by, sort_order, [*values, last.id])
+        return invoices, total_count, total_kind, next_cursor
+
+
+async def get_invoice_ids(
+    db: AsyncSession,
+    user_id: int,
+    invoice_ids: List[int] | None = None,
+    **filters: Any
+) -> List[int]:
+    """Ids of the user's invoices matching ``get_invoices``-style filters, in id order."""
+    stmt = select(Invoice.id).filter(Invoice.user_id == user_id)
+    if invoice_ids is not None:
+        stmt = stmt.filter(Invoice.id.in_(invoice_ids))
+    stmt = apply_invoice_filters(stmt, aliased(Contact), aliased(Contact), **filters)
+    result = await db.execute(stmt.order_by(Invoice.id))
+    return list(result.scalars().all())
+
+
+async def get_invoices_by_ids(db: AsyncSession, user_id: int, invoice_ids: List[int]) -> List[Invoice]:
+    """Load full invoice graphs for a chunk of ids in a fixed number of queries."""
+    stmt = select(Invoice).options(
+        selectinload(Invoice.items).selectinload(InvoiceItem.subitems),
+        selectinload(Invoice.bill_to),
+        selectinload(Invoice.send_to),
+        selectinload(Invoice.template)
+    ).filter(Invoice.id.in_(invoice_ids), Invoice.user_id == user_id).order_by(Invoice.id)
+    result = await db.execute(stmt)
+    return list(result.scalars().all())
+
+
+def _statement_filter(stmt, user_id: int, bill_to_id: int, date_from: date | None, date_to: date | None):
+    stmt = stmt.filter(Invoice.user_id == user_id, Invoice.bill_to_id == bill_to_id)
+    if date_from:
+        stmt = stmt.filter(Invoice.invoice_date >= date_from)
+    if date_to:
+        stmt = stmt.filter(Invoice.invoice_date <= date_to)
+    return stmt
+
+
+async def get_statement_totals(
+    db: AsyncSession,
+    user_id: int,
+    bill_to_id: int,
+    date_from: date | None = None,
+    date_to: date | None = None
+) -> List[Any]:
+    """Per-status invoice count and sums for a contact's statement, aggregated in SQL."""
+    stmt = _statement_filter(
+        select(
+            Invoice.status,
+            func.count(Invoice.id).label('invoice_count'),
+            func.coalesce(func.sum(Invoice.subtotal), 0).label('subtotal'),
+            func.coalesce(func.sum(Invoice.tax), 0).label('tax'),
+            func.coalesce(func.sum(Invoice.total), 0).label('total'),
+        ),
+        user_id, bill_to_id, date_from, date_to
+    ).group_by(Invoice.status)
+    result = await db.execute(stmt)
+    return result.all()
+
+
+async def get_statement_lines(
+    db: AsyncSession,
+    user_id: int,
+    bill_to_id: int,
+    date_from: date | None = None,
+    date_to: date | None = None
+) -> List[Any]:
+    """Id, number, date, status and total of each invoice on a statement, without loading items."""
+    stmt = _statement_filter(
+        select(Invoice.id, Invoice.invoice_number, Invoice.invoice_date, Invoice.status, Invoice.total),
+        user_id, bill_to_id, date_from, date_to
+    ).order_by(Invoice.invoice_date, Invoice.id)
+    result = await db.execute(stmt)
+    return result.all()
 
 
 async def create_invoice(db: AsyncSession, invoice: InvoiceCreate, user_id: int) -> Invoice:
@@ -174,7 +393,10 @@ async def create_invoice(db: AsyncSession, invoice: InvoiceCreate, user_id: int)
         db_invoice.calculate_totals()
 
         db.add(db_invoice)
+        await db.flush()
+        await record_invoice_change(db, user_id, None, (db_invoice.status, db_invoice.total))
         await db.commit()
+        invoice_counts.invalidate_user(user_id)
         await db.refresh(db_invoice)
         
         await db.refresh(db_invoice, attribute_names=['items'])
@@ -195,10 +417,11 @@ async def create_invoice(db: AsyncSession, invoice: InvoiceCreate, user_id: int)
 
 
 async def update_invoice(db: AsyncSession, invoice_id: int, invoice: InvoiceCreate, user_id: int) -> Invoice:
-    db_invoice = await get_invoice(db, invoice_id, user_id)
+    db_invoice = await get_invoice(db, invoice_id, user_id, for_update=True)
     if db_invoice is None:
         raise NotFoundError("invoice")
 
+    before = (db_invoice.status, db_invoice.total)
     try:
         # Update invoice fields
         for key, value in invoice.model_dump(exclude={'items'}).items():
@@ -238,8 +461,11 @@ async def update_invoice(db: AsyncSession, invoice_id: int, invoice: InvoiceCrea
 
         # Calculate totals
         db_invoice.calculate_totals()
+        await record_invoice_change(db, user_id, before, (db_invoice.status, db_invoice.total))
 
         await db.commit()
+        pdf_cache.invalidate_invoice(invoice_id)
+        invoice_counts.invalidate_user(user_id)
         await db.refresh(db_invoice, attribute_names=['items'])
         for item in db_invoice.items:
             await db.refresh(item, attribute_names=['subitems'])
@@ -253,12 +479,15 @@ async def update_invoice(db: AsyncSession, invoice_id: int, invoice: InvoiceCrea
 
 
 async def delete_invoice(db: AsyncSession, invoice_id: int, user_id: int) -> Invoice:
-    db_invoice = await get_invoice(db, invoice_id, user_id)
+    db_invoice = await get_invoice(db, invoice_id, user_id, for_update=True)
     if db_invoice is None:
         raise NotFoundError("invoice")
     try:
         await db.delete(db_invoice)
+        await record_invoice_change(db, user_id, (db_invoice.status, db_invoice.total), None)
         await db.commit()
+        pdf_cache.invalidate_invoice(invoice_id)
+        invoice_counts.invalidate_user(user_id)
         logger.info(f"Invoice deleted successfully: ID {invoice_id}")
         return db_invoice
     except Exception as e:
@@ -309,11 +538,7 @@ async def get_grouped_invoices(
     if group_columns:
         stmt = stmt.group_by(*group_columns)
 
-    stmt = stmt.with_only_columns([
-        *group_columns,
-        func.count(Invoice.id).label('invoice_count'),
-        func.sum(Invoice.total).label('total_amount')
-    ]).order_by(*group_columns)
+    stmt = stmt.with_only_columns(*group_columns, *status_aggregates()).order_by(*group_columns)
 
     try:
         result = await db.execute(stmt)
@@ -347,12 +572,15 @@ async def get_grouped_invoices(
             if group_key not in grouped_data:
                 grouped_data[group_key] = {
                     'invoice_count': 0,
-                    'total_amount': 0.0
+                    'total_amount': 0.0,
+                    'status_counts': {status.value: 0 for status in InvoiceStatusEnum}
                 }
 
             # Aggregate data
             grouped_data[group_key]['invoice_count'] += row.invoice_count
             grouped_data[group_key]['total_amount'] += float(row.total_amount) if row.total_amount else 0.0
+            for status, count in status_counts(row).items():
+                grouped_data[group_key]['status_counts'][status] += count
 
         return grouped_data
 
@@ -0,0 +1,96 @@
+"""Bulk export of invoice PDFs as a streamed ZIP archive.
+
+Invoices are loaded in chunks, rendered on the render pool in batches that
+share a template and written into the archive in completion order. At most
+``export_chunk_size`` invoice graphs and ``export_max_in_flight`` batches of
+rendered PDFs are held at once, and each archive entry is flushed to the client
+as soon as it is written, so memory use does not grow with the size of the export.
+"""
+import io
+import logging
+import re
+import zipfile
+from datetime import datetime
+from typing import AsyncIterator, List
+
+from .batch import load_payloads, render_batches
+from .payload import RenderTemplate
+from .spool import RenderedPDF
+
+logger = logging.getLogger(__name__)
+
+COPY_BLOCK_SIZE = 256 * 1024
+
+
+class _ArchiveBuffer(io.RawIOBase):
+    """Write-only, unseekable sink that ``zipfile`` streams into."""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def archive_filename(invoice_number: str) -> str:
+    safe_number = re.sub(r'[^A-Za-z0-9._-]+', '_', invoice_number).strip('_') or 'invoice'
+    return f"invoice_{safe_number}.pdf"
+
+
+async def render_invoices(
+    user_id: int,
+    invoice_ids: List[int],
+    template: RenderTemplate | None = None
+) -> AsyncIterator[tuple[str, RenderedPDF | None]]:
+    """Yield ``(invoice_number, rendered)`` as renders finish; ``rendered`` is None on failure."""
+    async for payload, rendered in render_batches(load_payloads(user_id, invoice_ids, template)):
+        yield payload.invoice.invoice_number, rendered
+
+
+async def stream_invoice_archive(
+    user_id: int,
+    invoice_ids: List[int],
+    template: RenderTemplate | None = None
+) -> AsyncIterator[bytes]:
+    buffer = _ArchiveBuffer()
+    failed: List[str] = []
+    exported = 0
+    timestamp = datetime.now().timetuple()[:6]
+
+    with zipfile.ZipFile(buffer, mode='w', compression=zipfile.ZIP_STORED) as archive:
+        async for invoice_number, rendered in render_invoices(user_id, invoice_ids, template):
+            if rendered is None:
+                failed.append(invoice_number)
+                continue
+            entry = zipfile.ZipInfo(archive_filename(invoice_number), timestamp)
+            try:
+                if rendered.content is not None:
+                    archive.writestr(entry, rendered.content)
+                else:
+                    # Copy large PDFs across in blocks so no entry is ever buffered whole
+                    with archive.open(entry, mode='w', force_zip64=True) as dest, open(rendered.path, 'rb') as src:
+                        while block := src.read(COPY_BLOCK_SIZE):
+                            dest.write(block)
+                            yield buffer.drain()
+            finally:
+                rendered.discard()
+            exported += 1
+            yield buffer.drain()
+
+        if failed:
+            archive.writestr(
+                zipfile.ZipInfo('errors.txt', timestamp),
+                "The following invoices could not be rendered:\n" + "\n".join(failed) + "\n"
+            )
+
+    logger.info(f"Exported {exported} invoice PDFs for user {user_id} ({len(failed)} failed)")
+    yield buffer.drain()
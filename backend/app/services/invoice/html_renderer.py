@@ -0,0 +1,165 @@
+"""HTML rendering of an invoice for instant previews.
+
+The page is built from the same pieces as the PDF: the layout helpers supply
+the text, and the compiled template supplies page geometry, column ratios,
+colors and the paragraph styles, which are translated to CSS. The template's
+``custom_css`` is appended after the generated stylesheet so it can override
+it. Rendering is string formatting only, so a preview costs microseconds; the
+PDF is rendered only when it is actually downloaded.
+"""
+from functools import lru_cache
+from html import escape
+from typing import List
+
+from reportlab.lib.colors import Color
+
+from ..template.fonts import display_name
+from .compiled_template import (BALANCE_BACKGROUND, HEADER_COLUMN_RATIOS, HEADER_DETAIL_RATIOS,
+                                ITEM_COLUMN_RATIOS, TOTALS_COLUMN_RATIOS, CompiledTemplate,
+                                compile_fingerprint, template_fingerprint)
+from .layout import ITEMS_HEADER, address_lines, format_invoice_date, item_rows, totals_rows
+
+ALIGNMENTS = ('left', 'center', 'right', 'justify')
+PARAGRAPH_STYLES = ('InvoiceTitle', 'InvoiceNumber', 'SectionHeader', 'AddressText', 'RightAligned',
+                    'BalanceDue', 'ItemDescription', 'SubItemDescription', 'PaymentTerms')
+
+
+def _css_color(color: Color | None) -> str:
+    if color is None:
+        return '#000000'
+    return '#' + color.hexval()[2:]
+
+
+def _font_css(font_name: str) -> str:
+    if font_name.startswith('Times'):
+        family = "'Times New Roman', Times, serif"
+    elif font_name.startswith('Courier'):
+        family = "'Courier New', Courier, monospace"
+    elif font_name.startswith('Helvetica'):
+        family = "Helvetica, Arial, sans-serif"
+    else:
+        quoted = display_name(font_name).replace("'", "")
+        family = f"'{quoted}', Helvetica, Arial, sans-serif"
+    weight = 'bold' if 'Bold' in font_name else 'normal'
+    style = 'italic' if 'Oblique' in font_name or 'Italic' in font_name else 'normal'
+    return f"font-family: {family}; font-weight: {weight}; font-style: {style};"
+
+
+def _percentages(ratios) -> List[str]:
+    return [f"{ratio * 100:g}%" for ratio in ratios]
+
+
+def _stylesheet(compiled: CompiledTemplate) -> str:
+    width, height = compiled.page_size
+    rules = [
+        "body { margin: 0; background: #e5e5e5; }",
+        (f".page {{ box-sizing: border-box; width: {width:g}pt; min-height: {height:g}pt; margin: 0 auto;"
+         f" padding: {compiled.margin_top:g}pt {compiled.margin_right:g}pt {compiled.margin_bottom:g}pt"
+         f" {compiled.margin_left:g}pt; background: #ffffff; }}"),
+        "p { margin: 0; }",
+        "table { width: 100%; border-collapse: collapse; table-layout: fixed; }",
+        "td, th { padding: 3pt 6pt; vertical-align: top; }",
+        ".header td.details { text-align: right; }",
+        ".header .spacer-top { height: 30pt; } .header .spacer { height: 10pt; }",
+        ".header .gap { height: 20pt; }",
+        f".balance {{ background: {BALANCE_BACKGROUND}; }}",
+        ".balance td { padding: 2pt 6pt 7pt; }",
+        (f".items {{ margin-top: 24pt; border-bottom: 0.5pt solid {_css_color(compiled.primary_color)}; }}"),
+        (f".items th {{ {_font_css(compiled.accent_font)} font-size: {compiled.font_sizes['table_header']}pt;"
+         f" background: {_css_color(compiled.accent_color)}; color: #ffffff; text-align: left;"
+         f" padding-bottom: 8pt; border: 1pt solid #ffffff; }}"),
+        ".items td { padding-top: 1pt; padding-bottom: 1pt; }",
+        (".items td.amount { text-align: right;"
+         " font-family: Helvetica, Arial, sans-serif; font-size: 10pt; }"),
+        ".totals { margin-top: 12pt; }",
+        ".totals td { text-align: right; font-family: Helvetica, Arial, sans-serif; font-size: 10pt; }",
+        (f".totals tr.total td {{ {_font_css(compiled.accent_font)}"
+         f" border-top: 1pt solid {_css_color(compiled.primary_color)}; }}"),
+        ".totals tr.total td.blank { border-top: none; }",
+        ".notes { margin-top: 15pt; }",
+    ]
+    for name in PARAGRAPH_STYLES:
+        style = compiled.styles[name]
+        rules.append(
+            f".{name} {{ {_font_css(style.fontName)} font-size: {style.fontSize:g}pt;"
+            f" line-height: {style.leading:g}pt; color: {_css_color(style.textColor)};"
+            f" text-align: {ALIGNMENTS[style.alignment]}; padding-left: {style.leftIndent:g}pt; }}"
+        )
+    for selector, ratios in (('.header', HEADER_COLUMN_RATIOS), ('.details table', HEADER_DETAIL_RATIOS),
+                             ('.items', ITEM_COLUMN_RATIOS), ('.totals', TOTALS_COLUMN_RATIOS)):
+        for index, percentage in enumerate(_percentages(ratios), start=1):
+            rules.append(f"{selector} col:nth-child({index}) {{ width: {percentage}; }}")
+    return "\n".join(rules)
+
+
+@lru_cache(maxsize=64)
+def _cached_stylesheet(fingerprint: str) -> str:
+    return _stylesheet(compile_fingerprint(fingerprint))
+
+
+def _custom_css(css: str | None) -> str:
+    # Keep user CSS from closing the style element
+    return (css or '').replace('</', '<\\/')
+
+
+def _colgroup(count: int) -> str:
+    return '<colgroup>' + '<col>' * count + '</colgroup>'
+
+
+def render_html(invoice, template) -> str:
+    """Render the invoice as a standalone HTML document."""
+    stylesheet = _cached_stylesheet(template_fingerprint(template))
+    parts = [
+        '<!DOCTYPE html><html><head><meta charset="utf-8">',
+        f'<title>Invoice #{escape(invoice.invoice_number)}</title>',
+        f'<style>{stylesheet}</style>',
+        f'<style>{_custom_css(getattr(template, "custom_css", None))}</style>',
+        '</head><body><div class="page">',
+    ]
+
+    # Header: addresses on the left, number, date and balance on the right
+    parts.append(f'<table class="header">{_colgroup(2)}<tr><td class="addresses"><div class="spacer-top"></div>')
+    for label, contact, spacer in (("Bill To:", invoice.bill_to, True), ("Send To:", invoice.send_to, False)):
+        parts.append(f'<p class="SectionHeader">{label}</p>')
+        parts.extend(f'<p class="AddressText">{escape(line)}</p>' for line in address_lines(contact))
+        if spacer:
+            parts.append('<div class="spacer"></div>')
+    parts.append(
+        '</td><td class="details">'
+        '<p class="InvoiceTitle">INVOICE</p>'
+        f'<p class="InvoiceNumber">#{escape(invoice.invoice_number)}</p>'
+        '<div class="gap"></div>'
+        f'<table>{_colgroup(2)}<tr><td><p class="RightAligned">Date:</p></td>'
+        f'<td><p class="RightAligned">{escape(format_invoice_date(invoice.invoice_date))}</p></td></tr></table>'
+        '<div class="spacer"></div>'
+        f'<table class="balance">{_colgroup(2)}<tr><td><p class="BalanceDue">Balance Due:</p></td>'
+        f'<td><p class="BalanceDue">${invoice.total:,.2f}</p></td></tr></table>'
+        '</td></tr></table>'
+    )
+
+    parts.append(f'<table class="items">{_colgroup(4)}<thead><tr>')
+    parts.extend(f'<th>{label}</th>' for label in ITEMS_HEADER)
+    parts.append('</tr></thead><tbody>')
+    for style, description, unit_price, quantity, total in item_rows(invoice.items):
+        parts.append(
+            f'<tr><td><p class="{style}">{escape(description)}</p></td>'
+            f'<td class="amount">{unit_price}</td><td class="amount">{quantity}</td>'
+            f'<td class="amount">{total}</td></tr>'
+        )
+    parts.append('</tbody></table>')
+
+    rows = totals_rows(invoice)
+    parts.append(f'<table class="totals">{_colgroup(3)}')
+    for index, (label, amount) in enumerate(rows):
+        row_class = ' class="total"' if index == len(rows) - 1 else ''
+        parts.append(f'<tr{row_class}><td class="blank"></td><td>{escape(label)}</td><td>{amount}</td></tr>')
+    parts.append('</table>')
+
+    if invoice.notes:
+        parts.append(
+            '<div class="notes"><p class="SectionHeader">Notes</p>'
+            f'<p class="PaymentTerms">{escape(invoice.notes)}</p></div>'
+        )
+
+    parts.append('</div></body></html>')
+    return ''.join(parts)
@@ -0,0 +1,155 @@
+"""Optional per-phase timing of invoice renders.
+
+When ``render_instrumentation`` is enabled, an endpoint opens a trace with
+``trace_render`` and the code underneath times its phases with ``phase``:
+loading the invoice, compiling the template's styles, assembling flowables
+(or laying out the page, for the canvas engine), building the document and
+serializing it. Phases nest: time spent in an inner phase is not counted
+again in the outer one.
+
+Renders run in pool workers, so a worker collects its own trace and returns
+it; ``render_to_spool`` merges it into the caller's trace, together with the
+time spent waiting for and talking to the worker. When the trace closes, its
+timings, item count, page count and output size are recorded as histograms
+labelled by template id, and endpoints can send the timings back as a
+``Server-Timing`` header.
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass, field
+from typing import Dict, Iterator, List
+
+from reportlab.pdfgen.canvas import Canvas
+
+from ...core.config import settings
+from ...core.metrics import registry
+
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+phase_seconds = registry.histogram(
+    'invoice_render_phase_seconds', 'Time spent in each phase of rendering an invoice PDF.',
+    SECONDS_BUCKETS, ('phase', 'template_id'),
+)
+item_count = registry.histogram(
+    'invoice_render_items', 'Items per rendered invoice.',
+    (1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000, 10000), ('template_id',),
+)
+page_count = registry.histogram(
+    'invoice_render_pages', 'Pages per rendered invoice PDF.',
+    (1, 2, 3, 5, 10, 25, 50, 100, 250), ('template_id',),
+)
+output_bytes = registry.histogram(
+    'invoice_render_output_bytes', 'Size of rendered invoice PDFs.',
+    (5e3, 1e4, 2.5e4, 5e4, 1e5, 2.5e5, 5e5, 1e6, 5e6, 1e7, 5e7), ('template_id',),
+)
+
+
+@dataclass
+class RenderTrace:
+    template_id: int | None = None
+    phases: Dict[str, float] = field(default_factory=dict)
+    items: int | None = None
+    pages: int | None = None
+    output_bytes: int | None = None
+    cache: str | None = None
+    total: float | None = None
+    _open: List[str] = field(default_factory=list, repr=False)
+
+    def add(self, name: str, seconds: float) -> None:
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def worker_result(self) -> dict:
+        """Picklable summary a pool worker sends back to the caller."""
+        result = asdict(self)
+        del result['_open'], result['total']
+        return result
+
+    def merge(self, result: dict, wall_seconds: float) -> None:
+        for name, seconds in result['phases'].items():
+            self.add(name, seconds)
+        # Whatever the worker did not account for was spent queueing and on IPC
+        self.add('queue', max(0.0, wall_seconds - sum(result['phases'].values())))
+        for key in ('items', 'pages', 'output_bytes'):
+            if result.get(key) is not None:
+                setattr(self, key, result[key])
+
+    def server_timing(self) -> str:
+        entries = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in self.phases.items()]
+        if self.total is not None:
+            entries.append(f"total;dur={self.total * 1000:.2f}")
+        if self.cache:
+            entries.append(f'cache;desc="{self.cache}"')
+        return ', '.join(entries)
+
+    def observe(self) -> None:
+        template_id = '' if self.template_id is None else str(self.template_id)
+        for name, seconds in self.phases.items():
+            phase_seconds.observe(seconds, phase=name, template_id=template_id)
+        if self.total is not None:
+            phase_seconds.observe(self.total, phase='total', template_id=template_id)
+        if self.items is not None:
+            item_count.observe(self.items, template_id=template_id)
+        if self.pages is not None:
+            page_count.observe(self.pages, template_id=template_id)
+        if self.output_bytes is not None:
+            output_bytes.observe(self.output_bytes, template_id=template_id)
+
+
+_current: ContextVar[RenderTrace | None] = ContextVar('render_trace', default=None)
+
+
+def current_trace() -> RenderTrace | None:
+    return _current.get()
+
+
+@contextmanager
+def trace_render(template_id: int | None, observe: bool = True) -> Iterator[RenderTrace | None]:
+    """Trace the renders in this block; yields None when instrumentation is off."""
+    if not settings.render_instrumentation:
+        yield None
+        return
+    trace = RenderTrace(template_id=template_id)
+    token = _current.set(trace)
+    start = time.perf_counter()
+    try:
+        yield trace
+    finally:
+        _current.reset(token)
+        trace.total = time.perf_counter() - start
+        if observe:
+            trace.observe()
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    trace = _current.get()
+    if trace is None:
+        yield
+        return
+    trace._open.append(name)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        trace._open.pop()
+        trace.add(name, elapsed)
+        if trace._open:
+            trace.add(trace._open[-1], -elapsed)
+
+
+class TimedCanvas(Canvas):
+    """Canvas that times writing out the finished document as the ``serialize`` phase."""
+
+    def save(self) -> None:
+        with phase('serialize'):
+            super().save()
+
+
+def record(**values) -> None:
+    """Set ``items``, ``pages``, ``output_bytes`` or ``cache`` on the current trace."""
+    trace = _current.get()
+    if trace is not None:
+        for key, value in values.items():
+            setattr(trace, key, value)
@@ -0,0 +1,55 @@
+"""Engine-independent content of an invoice page.
+
+Both PDF engines lay out the same text: the address block, the item rows and
+the totals. Keeping the formatting here guarantees they print identical values.
+"""
+from datetime import date
+from typing import List, Optional
+
+ITEMS_HEADER = ['Item', 'Unit Price', 'Quantity', 'Total']
+
+
+def format_invoice_date(invoice_date: Optional[date]) -> str:
+    return invoice_date.strftime('%B %d, %Y') if invoice_date else ''
+
+
+def address_lines(contact) -> List[str]:
+    return [
+        contact.name,
+        contact.street_address or '',
+        f"{contact.city or ''} {contact.state or ''} {contact.postal_code or ''}",
+    ]
+
+
+def item_rows(items) -> List[tuple]:
+    """Flatten items and their subitems into ``(style, description, unit price, quantity, total)`` rows."""
+    rows = []
+    for item in items:
+        description = item.description
+        if item.discount_percentage > 0:
+            description += f" ({item.discount_percentage}% Discount)"
+        rows.append((
+            'ItemDescription',
+            description,
+            f"${item.unit_price:,.2f}",
+            f"{item.quantity:,.2f}",
+            f"${item.line_total:,.2f}"
+        ))
+        for subitem in item.subitems:
+            rows.append(('SubItemDescription', f"• {subitem.description}", '', '', ''))
+    return rows
+
+
+def totals_rows(invoice) -> List[tuple[str, str]]:
+    """``(label, amount)`` rows of the totals block; the last row is the grand total."""
+    rows = [('Subtotal:', f"${invoice.subtotal:,.2f}")]
+    if invoice.discount_percentage > 0:
+        rows.extend([
+            (f"Discount ({invoice.discount_percentage}%):", f"-${invoice.discount_amount:,.2f}"),
+            ('Discounted Subtotal:', f"${invoice.discounted_subtotal:,.2f}"),
+        ])
+    rows.extend([
+        (f"Tax ({invoice.tax_rate}%):", f"${invoice.tax:,.2f}"),
+        ('Total:', f"${invoice.total:,.2f}")
+    ])
+    return rows
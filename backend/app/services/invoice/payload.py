@@ -0,0 +1,201 @@
+"""Plain, picklable snapshots of the data needed to render an invoice PDF.
+
+ORM instances are bound to a session and cannot cross a process boundary, so the
+API layer converts invoices and templates into these dataclasses before handing
+them to the render pool. Attribute names mirror the ORM models, which lets
+``generate_pdf`` accept either.
+"""
+from dataclasses import dataclass, field
+from datetime import date
+from decimal import Decimal
+from typing import Dict, List, Optional
+
+from ...models.contact import Contact
+from ...models.invoice import Invoice, calculate_invoice_totals, calculate_line_total
+from ...models.template import Template
+from ...schemas.invoice import InvoiceCreate
+from ..template.fonts import resolve_font
+
+
+@dataclass(frozen=True)
+class RenderContact:
+    name: str
+    street_address: Optional[str] = None
+    city: Optional[str] = None
+    state: Optional[str] = None
+    postal_code: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class RenderSubItem:
+    description: str
+
+
+@dataclass(frozen=True)
+class RenderItem:
+    description: str
+    quantity: Decimal
+    unit_price: Decimal
+    discount_percentage: Decimal
+    line_total: Decimal
+    subitems: List[RenderSubItem] = field(default_factory=list)
+
+
+@dataclass(frozen=True)
+class RenderInvoice:
+    invoice_number: str
+    invoice_date: Optional[date]
+    bill_to: RenderContact
+    send_to: RenderContact
+    items: List[RenderItem]
+    tax_rate: Decimal
+    discount_percentage: Decimal
+    subtotal: Decimal
+    tax: Decimal
+    total: Decimal
+    notes: Optional[str] = None
+    id: Optional[int] = None
+
+    @property
+    def discount_amount(self) -> Decimal:
+        return self.subtotal * (self.discount_percentage / Decimal('100'))
+
+    @property
+    def discounted_subtotal(self) -> Decimal:
+        return self.subtotal - self.discount_amount
+
+
+@dataclass(frozen=True)
+class RenderTemplate:
+    colors: dict
+    fonts: dict
+    font_sizes: dict
+    layout: dict
+    id: Optional[int] = None
+    name: Optional[str] = None
+    # Only the HTML preview uses it, so it is not part of the PDF content key
+    custom_css: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class RenderPayload:
+    invoice: RenderInvoice
+    template: RenderTemplate
+
+
+@dataclass(frozen=True)
+class StatementLine:
+    invoice_number: str
+    invoice_date: date
+    status: str
+    total: Decimal
+
+
+@dataclass(frozen=True)
+class StatementSummary:
+    invoice_count: int
+    subtotal: Decimal
+    tax: Decimal
+    total: Decimal
+    status_counts: Dict[str, int]
+    status_totals: Dict[str, Decimal]
+
+
+@dataclass(frozen=True)
+class StatementPayload:
+    contact: RenderContact
+    date_from: Optional[date]
+    date_to: Optional[date]
+    summary: StatementSummary
+    lines: List[StatementLine]
+    # Spool file of pickled RenderInvoice records, in statement order
+    invoices_path: str
+    template: RenderTemplate
+
+
+def contact_payload(contact: Contact) -> RenderContact:
+    return RenderContact(
+        name=contact.name,
+        street_address=contact.street_address,
+        city=contact.city,
+        state=contact.state,
+        postal_code=contact.postal_code,
+    )
+
+
+def invoice_payload(invoice: Invoice) -> RenderInvoice:
+    items = [
+        RenderItem(
+            description=item.description,
+            quantity=item.quantity,
+            unit_price=item.unit_price,
+            discount_percentage=item.discount_percentage or Decimal('0'),
+            line_total=item.line_total,
+            subitems=[RenderSubItem(description=subitem.description) for subitem in item.subitems],
+        )
+        for item in invoice.items
+    ]
+    return RenderInvoice(
+        id=invoice.id,
+        invoice_number=invoice.invoice_number,
+        invoice_date=invoice.invoice_date,
+        bill_to=contact_payload(invoice.bill_to),
+        send_to=contact_payload(invoice.send_to),
+        items=items,
+        tax_rate=invoice.tax_rate or Decimal('0'),
+        discount_percentage=invoice.discount_percentage or Decimal('0'),
+        subtotal=invoice.subtotal,
+        tax=invoice.tax,
+        total=invoice.total,
+        notes=invoice.notes,
+    )
+
+
+def draft_invoice_payload(invoice_data: InvoiceCreate, bill_to: RenderContact, send_to: RenderContact) -> RenderInvoice:
+    """Render snapshot of an unsaved invoice, with totals computed as ``Invoice.calculate_totals`` would."""
+    items = [
+        RenderItem(
+            description=item_data.description,
+            quantity=item_data.quantity,
+            unit_price=item_data.unit_price,
+            discount_percentage=item_data.discount_percentage or Decimal('0'),
+            line_total=calculate_line_total(
+                item_data.quantity, item_data.unit_price, item_data.discount_percentage or Decimal('0')
+            ),
+            subitems=[RenderSubItem(description=subitem.description) for subitem in item_data.subitems],
+        )
+        for item_data in invoice_data.items
+    ]
+    tax_rate = invoice_data.tax_rate or Decimal('0')
+    discount_percentage = invoice_data.discount_percentage or Decimal('0')
+    totals = calculate_invoice_totals(sum((item.line_total for item in items), Decimal('0')), discount_percentage, tax_rate)
+    return RenderInvoice(
+        invoice_number=invoice_data.invoice_number,
+        invoice_date=invoice_data.invoice_date,
+        bill_to=bill_to,
+        send_to=send_to,
+        items=items,
+        tax_rate=tax_rate,
+        discount_percentage=discount_percentage,
+        subtotal=totals['subtotal'],
+        tax=totals['tax'],
+        total=totals['total'],
+        notes=invoice_data.notes,
+    )
+
+
+def template_payload(template: Template) -> RenderTemplate:
+    return RenderTemplate(
+        id=template.id,
+        name=template.name,
+        colors=dict(template.colors),
+        # Custom fonts resolve to the template owner's, so they also key the PDF cache per owner
+        fonts={slot: resolve_font(name, template.user_id) for slot, name in template.fonts.items()},
+        font_sizes=dict(template.font_sizes),
+        layout=dict(template.layout),
+        custom_css=template.custom_css,
+    )
+
+
+def build_render_payload(invoice: Invoice, template: Template) -> RenderPayload:
+    return RenderPayload(invoice=invoice_payload(invoice), template=template_payload(template))
@@ -1,144 +1,209 @@
+import os
+import time
+from dataclasses import dataclass
 from decimal import Decimal
 from io import BytesIO
+from pathlib import Path
+from typing import Any, BinaryIO, Callable, Dict, Iterable, List
 
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import A4, letter
-from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
-from reportlab.lib.units import inch
-from reportlab.platypus import (Paragraph, SimpleDocTemplate, Spacer, Table,
-                                TableStyle)
+from reportlab.platypus import Flowable, Paragraph, SimpleDocTemplate, Spacer, Table
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from ...core.config import settings
 from ...core.exceptions import NotFoundError
-from ...models.invoice import Invoice, InvoiceItem, InvoiceSubItem
+from ...models.invoice import Invoice
 from ...models.template import Template
 from ...schemas.invoice import InvoiceCreate
 from ..contact import crud as crud_contact
+from .canvas_renderer import UnsupportedLayout, render_canvas
+from .compiled_template import CompiledTemplate, compile_template
 from .crud import get_invoice
+from .instrumentation import TimedCanvas, current_trace, phase, record, trace_render
+from .layout import ITEMS_HEADER, address_lines, format_invoice_date, item_rows, totals_rows
+from .payload import (RenderPayload, build_render_payload, contact_payload, draft_invoice_payload,
+                      template_payload)
+from .pdf_cache import content_key, pdf_cache
+from .render_pool import render_pool
+from .spool import RenderedPDF, spool_path
 
 
 def format_currency(amount: Decimal) -> str:
     return f"${amount:,.2f}"
 
 
-def generate_pdf(invoice: Invoice, template: Template) -> bytes:
+def render_invoice_pdf(payload: RenderPayload, output_path: str) -> dict | None:
+    """Render-pool entry point; must stay a module-level function so it pickles.
+
+    Returns the render's phase timings when instrumentation is enabled.
+    """
+    with trace_render(payload.template.id, observe=False) as trace:
+        generate_pdf(payload.invoice, payload.template, output=output_path, invariant=True)
+        record(output_bytes=os.path.getsize(output_path))
+    return trace.worker_result() if trace is not None else None
+
+
+class FlowableStream(list):
+    """Flowable list that refills itself from an iterator of flowable chunks.
+
+    ``doc.build`` consumes flowables from the front of the list it is given and
+    only checks ``len()`` between them, so feeding it through this class keeps
+    only the current chunk in memory while pages are laid out.
+    """
+
+    def __init__(self, chunks: Iterable[List[Flowable]]):
+        super().__init__()
+        self._chunks = iter(chunks)
+
+    def __len__(self) -> int:
+        while not super().__len__():
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return 0
+            self.extend(chunk)
+        return super().__len__()
+
+
+def _row_builder(styles) -> Callable[[tuple], list]:
+    def build_row(row: tuple) -> list:
+        style, description, *values = row
+        return [Paragraph(description, styles[style]), *values]
+    return build_row
+
+
+class PagedItemsTable(Flowable):
+    """Items table for very large invoices, built one page at a time.
+
+    A single ``Table`` creates a cell for every row up front and re-measures all
+    remaining rows each time it is split across a page, so long invoices take
+    quadratic time and hold every cell until the document is finished. This
+    flowable keeps the rows as plain tuples and only builds a ``Table`` for the
+    rows that fit in the current frame, repeating the header row on every page.
+    """
+
+    def __init__(self, header: list, rows: List[tuple], build_row: Callable[[tuple], list],
+                 col_widths: List[float], style, start: int = 0, row_height: float = 12.0):
+        super().__init__()
+        self.header = header
+        self.rows = rows
+        self.build_row = build_row
+        self.col_widths = col_widths
+        self.style = style
+        self.start = start
+        # Running estimate used to size the next table to roughly one frame of rows
+        self.row_height = row_height
+        self._table = None
+        self._avail = None
+
+    def _layout(self, availWidth: float, availHeight: float) -> Table:
+        if self._table is not None and self._avail == (availWidth, availHeight):
+            return self._table
+        remaining = len(self.rows) - self.start
+        window = min(remaining, max(1, int(availHeight / self.row_height) + 2))
+        while True:
+            end = self.start + window
+            table = Table([self.header, *map(self.build_row, self.rows[self.start:end])],
+                          colWidths=self.col_widths, repeatRows=1)
+            table.setStyle(self.style)
+            _, height = table.wrap(availWidth, availHeight)
+            self.row_height = max(1.0, sum(table._rowHeights[1:]) / window)
+            # Grow the window until it overflows the frame or holds every remaining row
+            if height > availHeight or window >= remaining:
+                break
+            window = min(remaining, window + window // 4 + 1)
+        self._table, self._avail = table, (availWidth, availHeight)
+        return table
+
+    def wrap(self, availWidth: float, availHeight: float) -> tuple[float, float]:
+        table = self._layout(availWidth, availHeight)
+        self.width, self.height = table._width, table._height
+        return self.width, self.height
+
+    def split(self, availWidth: float, availHeight: float) -> List[Flowable]:
+        table = self._layout(availWidth, availHeight)
+        pieces = table.split(availWidth, availHeight)
+        if not pieces:
+            return []
+        consumed = len(pieces[0]._cellvalues) - 1
+        if self.start + consumed >= len(self.rows):
+            return [pieces[0]]
+        rest = PagedItemsTable(self.header, self.rows, self.build_row, self.col_widths, self.style,
+                               start=self.start + consumed, row_height=self.row_height)
+        return [pieces[0], rest]
+
+    def draw(self) -> None:
+        self._table.drawOn(self.canv, 0, 0)
+
+
+def build_document(output, compiled: CompiledTemplate, **kwargs) -> SimpleDocTemplate:
+    return SimpleDocTemplate(
+        output,
+        pagesize=compiled.page_size,
+        topMargin=compiled.margin_top,
+        rightMargin=compiled.margin_right,
+        bottomMargin=compiled.margin_bottom,
+        leftMargin=compiled.margin_left,
+        **kwargs
+    )
+
+
+def render_platypus(invoice: Invoice, template: Template, output: str | BinaryIO, invariant: bool = False) -> None:
+    with phase('styles'):
+        compiled = compile_template(template)
+    with phase('flowables'):
+        flowables = build_invoice_flowables(invoice, compiled)
+    doc = build_document(output, compiled, invariant=invariant)
+    with phase('build'):
+        doc.build(flowables, canvasmaker=TimedCanvas)
+    record(pages=doc.page)
+
+
+# Engines a template can select with ``layout["renderer"]``
+RENDERERS: Dict[str, Callable[..., None]] = {
+    'platypus': render_platypus,
+    'canvas': render_canvas,
+}
+DEFAULT_RENDERER = 'platypus'
+
+
+def _render(invoice: Invoice, template: Template, output: str | BinaryIO, invariant: bool) -> None:
+    renderer = RENDERERS.get((template.layout or {}).get('renderer', DEFAULT_RENDERER), render_platypus)
+    try:
+        renderer(invoice, template, output, invariant=invariant)
+    except UnsupportedLayout:
+        render_platypus(invoice, template, output, invariant=invariant)
+
+
+def generate_pdf(
+    invoice: Invoice,
+    template: Template,
+    output: str | BinaryIO | None = None,
+    invariant: bool = False,
+) -> bytes | None:
+    """Render an invoice into ``output`` (a path or binary file), or return the bytes if omitted.
+
+    With ``invariant`` the creation date and document ID are fixed, so identical
+    input always produces byte-identical output.
+    """
+    record(items=len(invoice.items))
+    if output is not None:
+        _render(invoice, template, output, invariant)
+        return None
+
+    buffer = BytesIO()
+    _render(invoice, template, buffer, invariant)
+    pdf = buffer.getvalue()
+    buffer.close()
+    return pdf
+
+
+def build_invoice_flowables(invoice: Invoice, compiled: CompiledTemplate) -> List[Flowable]:
     invoice_number = invoice.invoice_number
-    invoice_date = invoice.invoice_date
-    bill_to = invoice.bill_to
-    send_to = invoice.send_to
-    items = invoice.items
-    subtotal = invoice.subtotal
-    discount_percentage = invoice.discount_percentage
-    discount_amount = invoice.discount_amount
-    discounted_subtotal = invoice.discounted_subtotal
-    tax = invoice.tax
     total = invoice.total
-    buffer = BytesIO()
-    page_size = A4 if template.layout['page_size'].upper() == 'A4' else letter
-    doc = SimpleDocTemplate(
-        buffer,
-        pagesize=page_size,
-        topMargin=template.layout['margin_top'] * inch,
-        rightMargin=template.layout['margin_right'] * inch,
-        bottomMargin=template.layout['margin_bottom'] * inch,
-        leftMargin=template.layout['margin_left'] * inch
-    )
-    
-    available_width = doc.width
 
-    styles = getSampleStyleSheet()
+    styles = compiled.styles
     
-    formatted_date = invoice_date.strftime('%B %d, %Y') if invoice_date else ''
-
-    # Use template configuration for colors
-    primary_color = colors.HexColor(template.colors['primary'])
-    secondary_color = colors.HexColor(template.colors['secondary'])
-    accent_color = colors.HexColor(template.colors['accent'])
-
-    # Use template configuration for fonts
-    main_font = template.fonts['main']
-    accent_font = template.fonts['accent']
-
-    # Custom styles
-    styles.add(ParagraphStyle(
-        name='InvoiceTitle',
-        parent=styles['Title'],
-        fontName=accent_font,
-        fontSize=template.font_sizes['title'],
-        textColor=primary_color,
-        alignment=2,
-        spaceAfter=2
-    ))
-    styles.add(ParagraphStyle(
-        name='InvoiceNumber',
-        parent=styles['Normal'],
-        fontName=accent_font,
-        fontSize=template.font_sizes['invoice_number'],
-        textColor=primary_color,
-        alignment=2,
-        spaceAfter=12
-    ))
-    styles.add(ParagraphStyle(
-        name='SectionHeader',
-        parent=styles['Normal'],
-        fontName=accent_font,
-        fontSize=template.font_sizes['section_header'],
-        textColor=secondary_color,
-        leading=10,
-        spaceBefore=10,
-        spaceAfter=-10
-    ))
-    styles.add(ParagraphStyle(
-        name='AddressText',
-        parent=styles['Normal'],
-        fontName=main_font,
-        fontSize=template.font_sizes['normal_text'],
-        leading=10,
-        spaceBefore=0,
-        spaceAfter=10
-    ))
-    styles.add(ParagraphStyle(
-        name='RightAligned',
-        parent=styles['Normal'],
-        fontName=main_font,
-        alignment=2,
-        fontSize=template.font_sizes['normal_text'],
-        spaceAfter=2
-    ))
-    styles.add(ParagraphStyle(
-        name='BalanceDue',
-        parent=styles['Normal'],
-        fontName=accent_font,
-        fontSize=template.font_sizes['invoice_number'],
-        textColor=colors.black,
-        alignment=2,
-        spaceAfter=0
-    ))
-    styles.add(ParagraphStyle(
-        name='ItemDescription',
-        parent=styles['Normal'],
-        fontName=main_font,
-        fontSize=template.font_sizes['normal_text'],
-        textColor=primary_color,
-    ))
-    styles.add(ParagraphStyle(
-        name='SubItemDescription',
-        parent=styles['Normal'],
-        fontName=main_font,
-        fontSize=template.font_sizes['normal_text'] - 2,
-        textColor=secondary_color,
-        leftIndent=20
-    ))
-    styles.add(ParagraphStyle(
-        name='PaymentTerms',
-        parent=styles['Normal'],
-        fontName=accent_font,
-        fontSize=template.font_sizes.get('small_text', 7),
-        textColor=secondary_color,
-        spaceBefore=10,
-        spaceAfter=1
-    ))
+    formatted_date = format_invoice_date(invoice.invoice_date)
 
     elements = []
 
@@ -146,14 +211,10 @@ def generate_pdf(invoice: Invoice, template: Template) -> bytes:
     left_column = [
         [Spacer(1, 30)],
         [Paragraph("Bill To:", styles['SectionHeader'])],
-        [Paragraph(bill_to.name, styles['AddressText'])],
-        [Paragraph(bill_to.street_address or '', styles['AddressText'])],
-        [Paragraph(f"{bill_to.city or ''} {bill_to.state or ''} {bill_to.postal_code or ''}", styles['AddressText'])],
+        *([Paragraph(line, styles['AddressText'])] for line in address_lines(invoice.bill_to)),
         [Spacer(1, 10)],
         [Paragraph("Send To:", styles['SectionHeader'])],
-        [Paragraph(send_to.name, styles['AddressText'])],
-        [Paragraph(send_to.street_address or '', styles['AddressText'])],
-        [Paragraph(f"{send_to.city or ''} {send_to.state or ''} {send_to.postal_code or ''}", styles['AddressText'])],
+        *([Paragraph(line, styles['AddressText'])] for line in address_lines(invoice.send_to)),
     ]
 
     # Create right column (Invoice details, Date, and Balance Due)
@@ -162,20 +223,12 @@ def generate_pdf(invoice: Invoice, template: Template) -> bytes:
         [Paragraph(f"#{invoice_number}", styles['InvoiceNumber'])],
         [Spacer(1, 20)],
         [Table([[Paragraph("Date:", styles['RightAligned']), Paragraph(formatted_date, styles['RightAligned'])]], 
-               colWidths=[(available_width / 2) * 0.4, (available_width / 2) * 0.6],
-               style=[('ALIGN', (0, 0), (-1, -1), 'RIGHT')])],
+               colWidths=compiled.header_detail_col_widths,
+               style=compiled.date_table_style)],
         [Spacer(1, 10)],
         [Table([[Paragraph("Balance Due:", styles['BalanceDue']), Paragraph(f"${total:,.2f}", styles['BalanceDue'])]], 
-               colWidths=[(available_width / 2) * 0.4, (available_width / 2) * 0.6],
-               style=[
-                   ('BACKGROUND', (0, 0), (-1, 0), "#cccccc"),
-                   ('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
-                   ('ALIGN', (0, 0), (-1, -1), 'RIGHT'),
-                   ('LEFTPADDING', (0, 0), (0, 0), 6),
-                   ('RIGHTPADDING', (1, 0), (1, 0), 6),
-                   ('TOPPADDING', (0, 0), (-1, 0), 2),
-                   ('BOTTOMPADDING', (0, 0), (-1, 0), 7),
-               ])]
+               colWidths=compiled.header_detail_col_widths,
+               style=compiled.balance_table_style)]
     ]
 
     # Combine left and right columns
@@ -183,86 +236,30 @@ def generate_pdf(invoice: Invoice, template: Template) -> bytes:
         Table(left_column, style=[('TOPPADDING', (0, 0), (-1, -1), -2)]),
         Table(right_column, style=[('TOPPADDING', (0, 0), (-1, -1), -3)])
     ]]
-    header_table = Table(header_data, colWidths=[available_width / 2, available_width / 2])
-    header_table.setStyle(TableStyle([
-        ('ALIGN', (0, 0), (0, 0), 'LEFT'),
-        ('ALIGN', (1, 0), (1, 0), 'RIGHT'),
-        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-    ]))
+    header_table = Table(header_data, colWidths=compiled.header_col_widths)
+    header_table.setStyle(compiled.header_table_style)
 
     elements.append(header_table)
     elements.append(Spacer(1, 24))
 
     # Items table
-    items_data = [['Item', 'Unit Price', 'Quantity', 'Total']]
-    for item in items:
-        description = item.description
-        if item.discount_percentage > 0:
-            description += f" ({item.discount_percentage}% Discount)"
-        items_data.append([
-            Paragraph(description, styles['ItemDescription']),
-            f"${item.unit_price:,.2f}",
-            f"{item.quantity:,.2f}",
-            f"${item.line_total:,.2f}"
-        ])
-        # Add subitems
-        for subitem in item.subitems:
-            items_data.append([
-                Paragraph(f"• {subitem.description}", styles['SubItemDescription']),
-                '', '', ''
-            ])
-            
-    col_widths = [
-        available_width * 0.5,
-        available_width * 0.15,
-        available_width * 0.15,
-        available_width * 0.2,
-    ]
-    items_table = Table(items_data, colWidths=col_widths)
-    items_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), accent_color),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('ALIGN', (1, 1), (-1, -1), 'RIGHT'),
-        ('FONTNAME', (0, 0), (-1, 0), accent_font),
-        ('FONTSIZE', (0, 0), (-1, 0), template.font_sizes['table_header']),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.white),
-        ('GRID', (0, 0), (-1, 0), 1, colors.white),
-        ('LINEBELOW', (0, -1), (-1, -1), 0.5, primary_color),
-        ('TOPPADDING', (0, 1), (-1, -1), 1),
-        ('BOTTOMPADDING', (0, 1), (-1, -1), 1),
-    ]))
+    rows = item_rows(invoice.items)
+    build_row = _row_builder(styles)
+    if len(rows) > settings.large_invoice_row_threshold:
+        items_table = PagedItemsTable(ITEMS_HEADER, rows, build_row,
+                                      compiled.item_col_widths, compiled.items_table_style)
+    else:
+        items_table = Table([ITEMS_HEADER, *map(build_row, rows)], colWidths=compiled.item_col_widths)
+        items_table.setStyle(compiled.items_table_style)
 
     elements.append(items_table)
     elements.append(Spacer(1, 12))
 
     # Totals
-    totals_data = [
-        ['', 'Subtotal:', f"${subtotal:,.2f}"],
-    ]
-    
-    if discount_percentage > 0:
-        totals_data.extend([
-            ['', f"Discount ({discount_percentage}%):", f"-${discount_amount:,.2f}"],
-            ['', 'Discounted Subtotal:', f"${discounted_subtotal:,.2f}"],
-        ])
+    totals_data = [['', label, amount] for label, amount in totals_rows(invoice)]
     
-    totals_data.extend([
-        ['', f"Tax ({invoice.tax_rate}%):", f"${tax:,.2f}"],
-        ['', 'Total:', f"${total:,.2f}"]
-    ])
-    
-    totals_table = Table(totals_data, colWidths=[
-        available_width * 0.5,
-        available_width * 0.3,
-        available_width * 0.2
-    ])
-    totals_table.setStyle(TableStyle([
-        ('ALIGN', (1, 0), (2, -1), 'RIGHT'),
-        ('FONTNAME', (0, -1), (-1, -1), accent_font),
-        ('LINEABOVE', (1, -1), (2, -1), 1, primary_color),
-    ]))
+    totals_table = Table(totals_data, colWidths=compiled.totals_col_widths)
+    totals_table.setStyle(compiled.totals_table_style)
     elements.append(totals_table)
 
     # Add notes if provided
@@ -271,19 +268,15 @@ def generate_pdf(invoice: Invoice, template: Template) -> bytes:
         elements.append(Paragraph("Notes", styles['SectionHeader']))
         elements.append(Paragraph(invoice.notes, styles['PaymentTerms']))
 
-    # Build the PDF
-    doc.build(elements)
-    pdf = buffer.getvalue()
-    buffer.close()
-    return pdf
+    return elements
 
 
-async def generate_preview_pdf(
+async def draft_payload(
     db: AsyncSession,
     invoice_data: InvoiceCreate,
     template: Template,
     user_id: int,
-) -> bytes:
+) -> RenderPayload:
     # Retrieve contacts
     bill_to_contact = await crud_contact.get_contact(db, invoice_data.bill_to_id, user_id)
     send_to_contact = await crud_contact.get_contact(db, invoice_data.send_to_id, user_id)
@@ -291,53 +284,52 @@ async def generate_preview_pdf(
     if not bill_to_contact or not send_to_contact:
         raise NotFoundError("contact")
     
-    # Create Invoice ORM instance
-    temp_invoice = Invoice(
-        user_id=0,
-        invoice_number=invoice_data.invoice_number,
-        invoice_date=invoice_data.invoice_date,
-        tax_rate=invoice_data.tax_rate or 0,
-        discount_percentage=invoice_data.discount_percentage or 0,
-        notes=invoice_data.notes,
-        template_id=invoice_data.template_id,
-        bill_to_id=invoice_data.bill_to_id,
-        send_to_id=invoice_data.send_to_id,
+    return RenderPayload(
+        invoice=draft_invoice_payload(
+            invoice_data, contact_payload(bill_to_contact), contact_payload(send_to_contact)
+        ),
+        template=template_payload(template),
     )
-    
-    # Assign contacts directly
-    temp_invoice.bill_to = bill_to_contact
-    temp_invoice.send_to = send_to_contact
-    
-    # Create InvoiceItem ORM instances
-    temp_items = []
-    for item_data in invoice_data.items:
-        temp_item = InvoiceItem(
-            description=item_data.description,
-            quantity=item_data.quantity,
-            unit_price=item_data.unit_price,
-            discount_percentage=item_data.discount_percentage or 0,
-        )
-        # Create InvoiceSubItem ORM instances if any
-        temp_subitems = []
-        if item_data.subitems:
-            for subitem_data in item_data.subitems:
-                temp_subitem = InvoiceSubItem(
-                    description=subitem_data.description,
-                )
-                temp_subitems.append(temp_subitem)
-            temp_item.subitems = temp_subitems
-        temp_items.append(temp_item)
-    temp_invoice.items = temp_items
-
-    # Calculate totals using the ORM method
-    temp_invoice.calculate_totals()
-    
-    # Pass the ORM model directly to the PDF generation function
-    pdf_content = generate_pdf(temp_invoice, template)
-    return pdf_content
 
 
-async def generate_invoice_pdf(db: AsyncSession, invoice_id: int, template_id: int, user_id: int) -> bytes:
+async def generate_preview_pdf(
+    db: AsyncSession,
+    invoice_data: InvoiceCreate,
+    template: Template,
+    user_id: int,
+) -> RenderedPDF:
+    with phase('load'):
+        payload = await draft_payload(db, invoice_data, template, user_id)
+    rendered, _ = await render_cached(payload)
+    return rendered
+
+
+async def render_to_spool(fn: Callable[..., None], *args: Any, timeout: float | None = None) -> Path:
+    """Run a render function on the pool, writing its output to a fresh spool file."""
+    output_path = spool_path()
+    start = time.perf_counter()
+    try:
+        stats = await render_pool.run(fn, *args, str(output_path), timeout=timeout)
+    except BaseException:
+        output_path.unlink(missing_ok=True)
+        raise
+    trace = current_trace()
+    if trace is not None and stats is not None:
+        trace.merge(stats, time.perf_counter() - start)
+    return output_path
+
+
+async def render_cached(payload: RenderPayload) -> tuple[RenderedPDF, str]:
+    key = content_key(payload)
+    rendered = pdf_cache.lookup(key)
+    record(cache='miss' if rendered is None else 'hit')
+    if rendered is None:
+        output_path = await render_to_spool(render_invoice_pdf, payload)
+        rendered = pdf_cache.store(key, output_path)
+    return rendered, key
+
+
+async def _load_payload(db: AsyncSession, invoice_id: int, template_id: int, user_id: int) -> RenderPayload:
     invoice = await get_invoice(db, invoice_id, user_id)
     if not invoice:
         raise NotFoundError("invoice")
@@ -348,4 +340,50 @@ async def generate_invoice_pdf(db: AsyncSession, invoice_id: int, template_id: i
     if not template:
         raise NotFoundError("template")
     
-    return generate_pdf(invoice, template)
\ No newline at end of file
+    return build_render_payload(invoice, template)
+
+
+@dataclass(frozen=True)
+class InvoicePDFKey:
+    key: str
+    # Set when the key was hashed from the loaded invoice, so a render that follows can reuse it
+    payload: RenderPayload | None = None
+    generation: str = ''
+
+
+async def invoice_pdf_key(db: AsyncSession, invoice_id: int, template_id: int, user_id: int) -> InvoicePDFKey:
+    """Content key of the invoice's PDF without rendering it.
+
+    Renders are invariant, so the key identifies the exact bytes and serves as a
+    strong ETag. It comes from the reference index when the invoice has been
+    rendered before, and is otherwise hashed from the loaded invoice.
+    """
+    key = pdf_cache.get_ref(invoice_id, template_id, user_id)
+    if key is not None:
+        return InvoicePDFKey(key)
+    generation = pdf_cache.generation(invoice_id)
+    with phase('load'):
+        payload = await _load_payload(db, invoice_id, template_id, user_id)
+    return InvoicePDFKey(content_key(payload), payload, generation)
+
+
+async def generate_invoice_pdf(
+    db: AsyncSession, invoice_id: int, template_id: int, user_id: int, loaded: InvoicePDFKey | None = None
+) -> tuple[RenderedPDF, str]:
+    """The invoice's PDF and its content key; pass ``loaded`` from ``invoice_pdf_key`` to skip reloading it."""
+    if loaded is not None and loaded.payload is not None:
+        generation, payload = loaded.generation, loaded.payload
+    else:
+        key = pdf_cache.get_ref(invoice_id, template_id, user_id)
+        if key is not None:
+            rendered = pdf_cache.lookup(key)
+            if rendered is not None:
+                record(cache='hit')
+                return rendered, key
+
+        generation = pdf_cache.generation(invoice_id)
+        with phase('load'):
+            payload = await _load_payload(db, invoice_id, template_id, user_id)
+    rendered, key = await render_cached(payload)
+    pdf_cache.set_ref(invoice_id, template_id, user_id, key, generation)
+    return rendered, key
@@ -0,0 +1,292 @@
+"""Content-addressed cache for rendered invoice PDFs.
+
+Rendered PDFs are keyed by a hash of everything that affects the output: the
+invoice header, items, subitems and contacts plus the template's colors, fonts,
+font sizes and layout. Every blob is stored on disk; small ones are also kept
+in an in-memory LRU. Both tiers are bounded by size, and large PDFs are always
+streamed from a file. Blobs handed out from disk are hard-linked into the render
+spool first, so eviction or invalidation in any process cannot remove the file
+while a response is still reading it.
+
+A small reference index on disk maps ``(invoice_id, template_id)`` to the key of
+the last render, so repeat downloads are served without reloading the invoice
+graph. Write paths drop those references through ``invalidate_invoice`` and
+``invalidate_template``; because the index lives on disk, invalidation is seen by
+every worker process sharing the cache directory. Each invalidation also writes
+a fresh generation token for the invoice to disk, and ``set_ref`` checks it both
+before and after writing a reference, so a render that started before an edit
+in any process never leaves a reference to the pre-edit output.
+"""
+import dataclasses
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+from ...core.config import settings
+from .payload import RenderPayload
+from .spool import RenderedPDF, spool_path
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever the rendering code changes in a way that alters the output
+RENDER_VERSION = 3
+
+
+def content_key(payload: RenderPayload) -> str:
+    invoice = dataclasses.asdict(payload.invoice)
+    invoice.pop('id', None)
+    template = payload.template
+    content = {
+        'version': RENDER_VERSION,
+        'invoice': invoice,
+        'template': {
+            'colors': template.colors,
+            'fonts': template.fonts,
+            'font_sizes': template.font_sizes,
+            'layout': template.layout,
+        },
+    }
+    encoded = json.dumps(content, sort_keys=True, default=str, separators=(',', ':'))
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+
+class PDFCache:
+    def __init__(self, directory: str, memory_max_bytes: int, memory_entry_max_bytes: int,
+                 disk_max_bytes: int, enabled: bool = True):
+        self.enabled = enabled
+        self.memory_max_bytes = memory_max_bytes
+        self.memory_entry_max_bytes = min(memory_entry_max_bytes, memory_max_bytes)
+        self.disk_max_bytes = disk_max_bytes
+        self._blob_dir = Path(directory) / 'blobs'
+        self._ref_dir = Path(directory) / 'refs'
+        self._generation_dir = Path(directory) / 'generations'
+        self._memory: OrderedDict[str, bytes] = OrderedDict()
+        self._memory_bytes = 0
+        self._disk_bytes: int | None = None
+        self._lock = threading.Lock()
+
+    # Blob tiers
+
+    def _blob_path(self, key: str) -> Path:
+        return self._blob_dir / key[:2] / f"{key}.pdf"
+
+    def lookup(self, key: str) -> RenderedPDF | None:
+        if not self.enabled:
+            return None
+        with self._lock:
+            pdf = self._memory.get(key)
+            if pdf is not None:
+                self._memory.move_to_end(key)
+                return RenderedPDF(content=pdf)
+
+        path = self._blob_path(key)
+        try:
+            # Touch the file so disk eviction treats it as recently used
+            os.utime(path)
+            size = path.stat().st_size
+        except FileNotFoundError:
+            return None
+        if size <= self.memory_entry_max_bytes:
+            try:
+                pdf = path.read_bytes()
+            except FileNotFoundError:
+                return None
+            self._remember(key, pdf)
+            return RenderedPDF(content=pdf)
+        return self._pin(path)
+
+    def _pin(self, path: Path) -> RenderedPDF | None:
+        """A temporary spool link to a cached blob, which outlives the blob's eviction."""
+        pinned = spool_path()
+        try:
+            os.link(path, pinned)
+        except FileNotFoundError:
+            return None
+        except OSError:
+            # The spool is on another filesystem; copy instead
+            try:
+                shutil.copyfile(path, pinned)
+            except FileNotFoundError:
+                pinned.unlink(missing_ok=True)
+                return None
+        return RenderedPDF(path=pinned, temporary=True)
+
+    def store(self, key: str, rendered_path: Path) -> RenderedPDF:
+        """Move a freshly rendered file into the cache and return the cached copy."""
+        if not self.enabled:
+            return RenderedPDF(path=rendered_path, temporary=True)
+        path = self._blob_path(key)
+        if path.exists():
+            # A concurrent render of the same content got there first
+            pinned = self._pin(path)
+            if pinned is not None:
+                rendered_path.unlink(missing_ok=True)
+                return pinned
+        path.parent.mkdir(parents=True, exist_ok=True)
+        size = rendered_path.stat().st_size
+        # Keep the rendered file as this request's copy and give the cache a second link to it
+        try:
+            os.link(rendered_path, path)
+        except FileExistsError:
+            return RenderedPDF(path=rendered_path, temporary=True)
+        except OSError:
+            # The spool and cache directories are on different filesystems
+            tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+            shutil.copyfile(rendered_path, tmp_path)
+            os.replace(tmp_path, path)
+        with self._lock:
+            if self._disk_bytes is not None:
+                self._disk_bytes += size
+        self._evict_disk()
+        return RenderedPDF(path=rendered_path, temporary=True)
+
+    def discard(self, key: str) -> None:
+        with self._lock:
+            pdf = self._memory.pop(key, None)
+            if pdf is not None:
+                self._memory_bytes -= len(pdf)
+        path = self._blob_path(key)
+        try:
+            size = path.stat().st_size
+            path.unlink()
+        except FileNotFoundError:
+            return
+        with self._lock:
+            if self._disk_bytes is not None:
+                self._disk_bytes -= size
+
+    def _remember(self, key: str, pdf: bytes) -> None:
+        with self._lock:
+            previous = self._memory.pop(key, None)
+            if previous is not None:
+                self._memory_bytes -= len(previous)
+            self._memory[key] = pdf
+            self._memory_bytes += len(pdf)
+            while self._memory_bytes > self.memory_max_bytes:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_bytes -= len(evicted)
+
+    def _evict_disk(self) -> None:
+        with self._lock:
+            if self._disk_bytes is None:
+                self._disk_bytes = sum(p.stat().st_size for p in self._blob_dir.glob('*/*.pdf'))
+            if self._disk_bytes <= self.disk_max_bytes:
+                return
+
+        # Evict least recently used blobs until we are back under 90% of the limit
+        entries = []
+        for path in self._blob_dir.glob('*/*.pdf'):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+
+        total = sum(size for _, size, _ in entries)
+        target = int(self.disk_max_bytes * 0.9)
+        evicted = 0
+        for _, size, path in entries:
+            if total <= target:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+            evicted += 1
+        with self._lock:
+            self._disk_bytes = total
+        logger.info(f"PDF cache evicted {evicted} blobs from disk")
+
+    # Reference index
+
+    def _ref_path(self, invoice_id: int, template_id: int) -> Path:
+        return self._ref_dir / str(invoice_id) / str(template_id)
+
+    def _generation_path(self, invoice_id: int) -> Path:
+        return self._generation_dir / str(invoice_id)
+
+    def generation(self, invoice_id: int) -> str:
+        """Token to pass to ``set_ref``; it changes whenever the invoice is invalidated, in any process."""
+        try:
+            return self._generation_path(invoice_id).read_text()
+        except FileNotFoundError:
+            return ''
+
+    def get_ref(self, invoice_id: int, template_id: int, user_id: int) -> str | None:
+        if not self.enabled:
+            return None
+        try:
+            owner, key = self._ref_path(invoice_id, template_id).read_text().split()
+        except (FileNotFoundError, ValueError):
+            return None
+        if int(owner) != user_id:
+            return None
+        return key
+
+    def set_ref(self, invoice_id: int, template_id: int, user_id: int, key: str, generation: str) -> None:
+        if not self.enabled or generation != self.generation(invoice_id):
+            # The invoice changed while it was being rendered; don't point at stale output
+            return
+        path = self._ref_path(invoice_id, template_id)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        content = f"{user_id} {key}"
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        tmp_path.write_text(content)
+        os.replace(tmp_path, path)
+        # An invalidation that landed between the check and the write may have missed
+        # this reference; it bumps the generation before dropping references, so re-check
+        if generation != self.generation(invoice_id):
+            try:
+                if path.read_text() == content:
+                    path.unlink()
+            except FileNotFoundError:
+                pass
+
+    def _drop_refs(self, paths) -> None:
+        for path in paths:
+            try:
+                _, key = path.read_text().split()
+            except (FileNotFoundError, ValueError):
+                continue
+            path.unlink(missing_ok=True)
+            self.discard(key)
+
+    def invalidate_invoice(self, invoice_id: int) -> None:
+        if not self.enabled:
+            return
+        # A random token rather than a counter, so concurrent invalidations need no read-modify-write
+        path = self._generation_path(invoice_id)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        tmp_path.write_text(os.urandom(8).hex())
+        os.replace(tmp_path, path)
+        invoice_dir = self._ref_dir / str(invoice_id)
+        if invoice_dir.is_dir():
+            self._drop_refs(invoice_dir.iterdir())
+            shutil.rmtree(invoice_dir, ignore_errors=True)
+
+    def invalidate_template(self, template_id: int) -> None:
+        if not self.enabled:
+            return
+        self._drop_refs(self._ref_dir.glob(f"*/{template_id}"))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+            self._disk_bytes = None
+        shutil.rmtree(self._blob_dir, ignore_errors=True)
+        shutil.rmtree(self._ref_dir, ignore_errors=True)
+
+
+pdf_cache = PDFCache(
+    directory=settings.pdf_cache_dir,
+    memory_max_bytes=settings.pdf_cache_memory_max_bytes,
+    memory_entry_max_bytes=settings.pdf_cache_memory_entry_max_bytes,
+    disk_max_bytes=settings.pdf_cache_disk_max_bytes,
+    enabled=settings.pdf_cache_enabled,
+)
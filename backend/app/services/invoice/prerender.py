@@ -0,0 +1,103 @@
+"""Write-behind rendering of invoices right after they are saved.
+
+When enabled, creating or updating an invoice schedules a render with the
+invoice's own template. The result lands in the PDF cache together with its
+reference, so the first ``GET /invoices/{id}/pdf`` is served from storage.
+
+Jobs are keyed by invoice: scheduling an invoice again cancels its pending or
+running job, so a burst of edits renders only the final state. A short delay
+before each job absorbs those bursts. Pre-renders are best effort. They yield to
+interactive renders when the pool is busy and are simply dropped on failure; the
+download then renders on demand as before.
+"""
+import asyncio
+import logging
+from typing import Dict
+
+from ...core.config import settings
+from ...core.exceptions import ServiceUnavailableError
+from ...database import async_session
+from . import crud
+from .payload import build_render_payload
+from .pdf import render_cached
+from .pdf_cache import pdf_cache
+from .render_pool import render_pool
+
+logger = logging.getLogger(__name__)
+
+
+class PrerenderQueue:
+    def __init__(self, enabled: bool, concurrency: int, delay: float, max_pending: int):
+        self.enabled = enabled
+        self.delay = delay
+        self.max_pending = max_pending
+        self._concurrency = max(1, concurrency)
+        self._slots: asyncio.Semaphore | None = None
+        self._jobs: Dict[int, asyncio.Task] = {}
+
+    @property
+    def pending(self) -> int:
+        return len(self._jobs)
+
+    def schedule(self, invoice_id: int, user_id: int) -> None:
+        """Queue a render of the invoice, superseding any job already queued for it."""
+        if not self.enabled or not pdf_cache.enabled:
+            return
+        self.cancel(invoice_id)
+        if len(self._jobs) >= self.max_pending:
+            logger.warning(f"Pre-render queue full, skipping invoice {invoice_id}")
+            return
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self._concurrency)
+        task = asyncio.create_task(self._run(invoice_id, user_id))
+        self._jobs[invoice_id] = task
+        task.add_done_callback(lambda done: self._finished(invoice_id, done))
+
+    def cancel(self, invoice_id: int) -> None:
+        task = self._jobs.pop(invoice_id, None)
+        if task is not None:
+            task.cancel()
+
+    def shutdown(self) -> None:
+        for task in self._jobs.values():
+            task.cancel()
+        self._jobs.clear()
+
+    def _finished(self, invoice_id: int, task: asyncio.Task) -> None:
+        # A superseding job may already own the slot
+        if self._jobs.get(invoice_id) is task:
+            del self._jobs[invoice_id]
+
+    async def _run(self, invoice_id: int, user_id: int) -> None:
+        await asyncio.sleep(self.delay)
+        async with self._slots:
+            # Leave headroom on the pool for requests that are waiting on a PDF
+            if render_pool.pending >= render_pool.max_queue // 2:
+                logger.info(f"Render pool busy, skipping pre-render of invoice {invoice_id}")
+                return
+
+            generation = pdf_cache.generation(invoice_id)
+            try:
+                async with async_session() as db:
+                    invoices = await crud.get_invoices_by_ids(db, user_id, [invoice_id])
+                    if not invoices or invoices[0].template is None:
+                        return
+                    payload = build_render_payload(invoices[0], invoices[0].template)
+                rendered, key = await render_cached(payload)
+            except ServiceUnavailableError as e:
+                logger.info(f"Pre-render of invoice {invoice_id} skipped: {e.detail}")
+                return
+            except Exception as e:
+                logger.error(f"Pre-render of invoice {invoice_id} failed: {str(e)}", exc_info=True)
+                return
+            rendered.discard()
+            pdf_cache.set_ref(invoice_id, payload.template.id, user_id, key, generation)
+            logger.debug(f"Pre-rendered invoice {invoice_id} with template {payload.template.id}")
+
+
+prerender_queue = PrerenderQueue(
+    enabled=settings.prerender_enabled,
+    concurrency=settings.prerender_concurrency,
+    delay=settings.prerender_delay_seconds,
+    max_pending=settings.prerender_max_pending,
+)
@@ -0,0 +1,198 @@
+"""Stateful live-preview sessions for the invoice form.
+
+A session keeps the current draft, its resolved contacts and the template
+snapshot for the lifetime of a WebSocket. Clients send small edits (one field or
+one item at a time); totals and the HTML preview are sent back immediately, and
+the PDF is only rendered when the client asks for it with a ``download``
+message. Sessions started with ``"format": "pdf"`` get PDF previews instead;
+those renders are debounced and coalesced so only the latest draft is rendered,
+and an edit that arrives while a render is in flight cancels it. Cancelling
+drops a render still queued for the pool, but one a worker has already started
+runs to completion; its output only lands in the PDF cache. Contacts are only
+looked up again when the draft starts pointing at a different one.
+
+Messages are parsed into ``schemas.preview`` models by the endpoint, so a
+malformed message gets an ``error`` reply instead of closing the socket.
+"""
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict
+
+from pydantic import ValidationError as PydanticValidationError
+
+from ...core.config import settings
+from ...core.exceptions import AppException, NotFoundError
+from ...database import async_session
+from ...schemas.invoice import InvoiceCreate
+from ...schemas.preview import (PreviewDownload, PreviewInit, PreviewItem, PreviewMessage, PreviewPatch,
+                                PreviewRemoveItem, PreviewTemplate)
+from ..contact import crud as crud_contact
+from ..template.crud import get_template
+from ..template.fonts import prepare_fonts
+from .calculate import calculate_invoice
+from .html_renderer import render_html
+from .payload import (RenderContact, RenderPayload, RenderTemplate, contact_payload,
+                      draft_invoice_payload, template_payload)
+from .pdf import render_cached
+
+logger = logging.getLogger(__name__)
+
+HEADER_FIELDS = set(InvoiceCreate.model_fields) - {'items'}
+
+
+class PreviewSession:
+    def __init__(
+        self,
+        user_id: int,
+        send_json: Callable[[dict], Awaitable[None]],
+        send_bytes: Callable[[bytes], Awaitable[None]],
+        debounce_seconds: float | None = None
+    ):
+        self.user_id = user_id
+        self.send_json = send_json
+        self.send_bytes = send_bytes
+        self.debounce_seconds = (
+            settings.preview_debounce_ms / 1000 if debounce_seconds is None else debounce_seconds
+        )
+        self.format = 'html'
+        self.draft: Dict[str, Any] = {'items': []}
+        self.template: RenderTemplate | None = None
+        self.version = 0
+        self._contacts: Dict[int, RenderContact] = {}
+        self._render_task: asyncio.Task | None = None
+
+    async def handle(self, message: PreviewMessage) -> None:
+        if isinstance(message, PreviewDownload):
+            await self._download()
+            return
+        if isinstance(message, PreviewInit):
+            template_id = message.template_id or message.invoice.get('template_id')
+            if template_id is not None and not isinstance(template_id, int):
+                await self._send_error("template_id must be an integer")
+                return
+            self.format = message.format
+            self.draft = {'items': [], **message.invoice}
+            await self._load_template(template_id)
+        elif isinstance(message, PreviewPatch):
+            unknown = set(message.changes) - HEADER_FIELDS
+            if unknown:
+                await self._send_error(f"Unknown invoice fields: {', '.join(sorted(unknown))}")
+                return
+            self.draft.update(message.changes)
+        elif isinstance(message, PreviewItem):
+            items = self.draft.setdefault('items', [])
+            index = len(items) if message.index is None else message.index
+            if not 0 <= index <= len(items):
+                await self._send_error(f"Item index {index} is out of range")
+                return
+            if index == len(items) or message.insert:
+                items.insert(index, message.item)
+            else:
+                items[index] = message.item
+        elif isinstance(message, PreviewRemoveItem):
+            items = self.draft.setdefault('items', [])
+            if not 0 <= message.index < len(items):
+                await self._send_error(f"Item index {message.index} is out of range")
+                return
+            del items[message.index]
+        elif isinstance(message, PreviewTemplate):
+            await self._load_template(message.template_id)
+
+        self.version += 1
+        await self._draft_changed()
+
+    async def close(self) -> None:
+        self._cancel_render()
+
+    async def _draft_changed(self) -> None:
+        try:
+            invoice = InvoiceCreate(**self.draft)
+        except (PydanticValidationError, AppException) as e:
+            # Incomplete drafts are normal while typing; report and wait for the next edit
+            self._cancel_render()
+            detail = e.errors(include_url=False, include_context=False, include_input=False) if isinstance(e, PydanticValidationError) else e.detail
+            await self.send_json({'type': 'invalid', 'version': self.version, 'detail': detail})
+            return
+
+        calculation = calculate_invoice(invoice)
+        await self.send_json({'type': 'totals', 'version': self.version, **calculation.model_dump(mode='json')})
+
+        self._cancel_render()
+        if self.format == 'html':
+            await self._send_html(invoice)
+        else:
+            self._render_task = asyncio.create_task(self._render(invoice, self.version))
+
+    def _cancel_render(self) -> None:
+        if self._render_task is not None and not self._render_task.done():
+            self._render_task.cancel()
+        self._render_task = None
+
+    async def _payload(self, invoice: InvoiceCreate) -> RenderPayload | None:
+        if self.template is None:
+            await self._send_error("Select a template to preview the invoice")
+            return None
+        bill_to = await self._contact(invoice.bill_to_id)
+        send_to = await self._contact(invoice.send_to_id)
+        return RenderPayload(
+            invoice=draft_invoice_payload(invoice, bill_to, send_to),
+            template=self.template,
+        )
+
+    async def _send_html(self, invoice: InvoiceCreate) -> None:
+        payload = await self._payload(invoice)
+        if payload is not None:
+            await prepare_fonts(payload.template)
+            html = render_html(payload.invoice, payload.template)
+            await self.send_json({'type': 'html', 'version': self.version, 'html': html})
+
+    async def _download(self) -> None:
+        try:
+            invoice = InvoiceCreate(**self.draft)
+        except (PydanticValidationError, AppException):
+            await self._send_error("The invoice is incomplete and cannot be rendered yet")
+            return
+        self._cancel_render()
+        self._render_task = asyncio.create_task(self._render(invoice, self.version, debounce=False))
+
+    async def _render(self, invoice: InvoiceCreate, version: int, debounce: bool = True) -> None:
+        try:
+            if debounce:
+                await asyncio.sleep(self.debounce_seconds)
+            payload = await self._payload(invoice)
+            if payload is None:
+                return
+            rendered, _ = await render_cached(payload)
+            try:
+                content = rendered.content if rendered.content is not None else rendered.path.read_bytes()
+            finally:
+                rendered.discard()
+            await self.send_json({'type': 'pdf', 'version': version, 'size': len(content)})
+            await self.send_bytes(content)
+        except asyncio.CancelledError:
+            raise
+        except AppException as e:
+            await self._send_error(e.detail)
+        except Exception as e:
+            logger.error(f"Live preview render failed: {str(e)}", exc_info=True)
+            await self._send_error("An unexpected error occurred while rendering the preview")
+
+    async def _contact(self, contact_id: int) -> RenderContact:
+        contact = self._contacts.get(contact_id)
+        if contact is None:
+            async with async_session() as db:
+                contact = contact_payload(await crud_contact.get_contact(db, contact_id, self.user_id))
+            self._contacts[contact_id] = contact
+        return contact
+
+    async def _load_template(self, template_id: int | None) -> None:
+        if template_id is None:
+            return
+        async with async_session() as db:
+            template = await get_template(db, template_id, self.user_id)
+            if not template:
+                raise NotFoundError("template")
+            self.template = template_payload(template)
+
+    async def _send_error(self, detail: Any) -> None:
+        await self.send_json({'type': 'error', 'version': self.version, 'detail': detail})
@@ -0,0 +1,146 @@
+"""Asynchronous invoice render jobs.
+
+``POST /render-jobs`` queues a render and returns immediately; clients poll the
+job and download the PDF once it is done. Admission is bounded: the queue holds at
+most ``render_jobs_max_queue`` unfinished jobs, each user may have
+``render_jobs_per_user`` of them, and anything beyond that is rejected with a 429
+rather than piling up. At most ``render_jobs_concurrency`` jobs are handed to the
+render pool at once, which leaves room for the synchronous PDF endpoints.
+
+Jobs are kept in memory by the process that accepted them and expire
+``render_job_ttl_seconds`` after they finish.
+"""
+import asyncio
+import logging
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from enum import Enum
+from typing import Dict
+
+from ...core.config import settings
+from ...core.exceptions import AppException, NotFoundError, TooManyRequestsError
+from ...database import async_session
+from .instrumentation import trace_render
+from .pdf import generate_invoice_pdf
+from .spool import RenderedPDF
+
+logger = logging.getLogger(__name__)
+
+
+class RenderJobStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+
+@dataclass
+class RenderJob:
+    user_id: int
+    invoice_id: int
+    template_id: int
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    status: RenderJobStatus = RenderJobStatus.QUEUED
+    error: str | None = None
+    created_at: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
+    finished_at: datetime | None = None
+    result: RenderedPDF | None = None
+
+    @property
+    def active(self) -> bool:
+        return self.status in (RenderJobStatus.QUEUED, RenderJobStatus.RUNNING)
+
+
+class RenderJobQueue:
+    def __init__(self, max_queue: int, per_user: int, concurrency: int, ttl: float):
+        self.max_queue = max_queue
+        self.per_user = per_user
+        self.ttl = ttl
+        self._concurrency = max(1, concurrency)
+        self._slots: asyncio.Semaphore | None = None
+        self._jobs: Dict[str, RenderJob] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    def submit(self, user_id: int, invoice_id: int, template_id: int) -> RenderJob:
+        self._expire()
+        active = [job for job in self._jobs.values() if job.active]
+        if len(active) >= self.max_queue:
+            logger.warning(f"Render job queue full: {len(active)} active jobs")
+            raise TooManyRequestsError("The render queue is full. Please try again shortly.", retry_after=5)
+        if sum(1 for job in active if job.user_id == user_id) >= self.per_user:
+            raise TooManyRequestsError(
+                f"You already have {self.per_user} renders in progress. Wait for one to finish.",
+                retry_after=2
+            )
+
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self._concurrency)
+        job = RenderJob(user_id=user_id, invoice_id=invoice_id, template_id=template_id)
+        self._jobs[job.id] = job
+        self._tasks[job.id] = asyncio.create_task(self._run(job))
+        return job
+
+    def get(self, job_id: str, user_id: int) -> RenderJob:
+        self._expire()
+        job = self._jobs.get(job_id)
+        if job is None or job.user_id != user_id:
+            raise NotFoundError("render job")
+        return job
+
+    def cancel(self, job_id: str, user_id: int) -> None:
+        job = self.get(job_id, user_id)
+        task = self._tasks.pop(job.id, None)
+        if task is not None:
+            task.cancel()
+        self._remove(job)
+
+    def shutdown(self) -> None:
+        for task in self._tasks.values():
+            task.cancel()
+        self._tasks.clear()
+        for job in list(self._jobs.values()):
+            self._remove(job)
+
+    async def _run(self, job: RenderJob) -> None:
+        try:
+            async with self._slots:
+                job.status = RenderJobStatus.RUNNING
+                async with async_session() as db:
+                    with trace_render(job.template_id):
+                        job.result, _ = await generate_invoice_pdf(
+                            db, job.invoice_id, job.template_id, job.user_id
+                        )
+            job.status = RenderJobStatus.DONE
+            logger.debug(f"Render job {job.id} finished for invoice {job.invoice_id}")
+        except asyncio.CancelledError:
+            raise
+        except AppException as e:
+            job.status = RenderJobStatus.FAILED
+            job.error = e.detail
+        except Exception as e:
+            logger.error(f"Render job {job.id} failed: {str(e)}", exc_info=True)
+            job.status = RenderJobStatus.FAILED
+            job.error = "An unexpected error occurred while rendering the PDF"
+        finally:
+            job.finished_at = datetime.now(timezone.utc)
+            self._tasks.pop(job.id, None)
+
+    def _remove(self, job: RenderJob) -> None:
+        self._jobs.pop(job.id, None)
+        if job.result is not None:
+            job.result.discard()
+
+    def _expire(self) -> None:
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=self.ttl)
+        for job in list(self._jobs.values()):
+            if not job.active and job.finished_at is not None and job.finished_at < cutoff:
+                self._remove(job)
+
+
+render_jobs = RenderJobQueue(
+    max_queue=settings.render_jobs_max_queue,
+    per_user=settings.render_jobs_per_user,
+    concurrency=settings.render_jobs_concurrency,
+    ttl=settings.render_job_ttl_seconds,
+)
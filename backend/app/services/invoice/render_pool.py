@@ -0,0 +1,90 @@
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable
+
+from ...core.config import settings
+from ...core.exceptions import ServiceUnavailableError
+from ..template.fonts import register_fonts
+
+logger = logging.getLogger(__name__)
+
+
+class RenderPool:
+    """Runs CPU-bound render functions off the event loop.
+
+    ``max_queue`` bounds the number of renders that are running or waiting for a
+    worker; further submissions are rejected instead of piling up. A timed out
+    render is abandoned by the caller, but the worker process finishes it in the
+    background because process pool tasks cannot be interrupted.
+    """
+
+    def __init__(self, max_workers: int, max_queue: int, timeout: float, start_method: str = "spawn",
+                 initializer: Callable[[], None] | None = None):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.start_method = start_method
+        self.initializer = initializer
+        self._executor: Executor | None = None
+        self._pending = 0
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def start(self) -> None:
+        if self._executor is not None or self.max_workers <= 0:
+            return
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=multiprocessing.get_context(self.start_method),
+            initializer=self.initializer,
+        )
+        logger.info(f"Render pool started with {self.max_workers} workers")
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+            logger.info("Render pool shut down")
+
+    async def run(self, fn: Callable[..., Any], *args: Any, timeout: float | None = None) -> Any:
+        timeout = timeout or self.timeout
+        if self._pending >= self.max_queue:
+            logger.warning(f"Render queue full: pending={self._pending}")
+            raise ServiceUnavailableError("The PDF renderer is busy. Please try again shortly.")
+
+        self._pending += 1
+        try:
+            return await asyncio.wait_for(self._submit(fn, *args), timeout)
+        except asyncio.TimeoutError:
+            logger.error(f"Render timed out after {timeout}s: {getattr(fn, '__name__', fn)}")
+            raise ServiceUnavailableError("PDF rendering timed out.")
+        finally:
+            self._pending -= 1
+
+    async def _submit(self, fn: Callable[..., Any], *args: Any) -> Any:
+        if self.max_workers <= 0:
+            return await asyncio.to_thread(fn, *args)
+
+        self.start()
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self._executor, fn, *args)
+        except BrokenProcessPool:
+            # A worker died (e.g. OOM-killed); replace the pool so later renders recover
+            logger.error("Render pool broken, restarting workers")
+            self.shutdown()
+            raise ServiceUnavailableError("The PDF renderer restarted. Please try again.")
+
+
+render_pool = RenderPool(
+    max_workers=settings.render_pool_size,
+    max_queue=settings.render_queue_max,
+    timeout=settings.render_timeout_seconds,
+    start_method=settings.render_pool_start_method,
+    initializer=register_fonts,
+)
@@ -0,0 +1,55 @@
+"""Temporary files that rendered PDFs are written to.
+
+Render workers write straight to a file in the spool directory instead of
+returning bytes, so a large document is never copied through the pool's pipe
+or buffered whole in the API process. Endpoints stream the file back.
+"""
+import os
+import time
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+
+from ...core.config import settings
+
+
+@dataclass(frozen=True)
+class RenderedPDF:
+    """A rendered PDF, either on disk or (for small cached documents) in memory.
+
+    ``temporary`` files belong to the request that rendered them and should be
+    deleted once they have been sent.
+    """
+    path: Path | None = None
+    content: bytes | None = None
+    temporary: bool = False
+
+    @property
+    def size(self) -> int:
+        if self.content is not None:
+            return len(self.content)
+        return self.path.stat().st_size
+
+    def discard(self) -> None:
+        if self.temporary and self.path is not None:
+            self.path.unlink(missing_ok=True)
+
+
+def spool_path(suffix: str = '.pdf') -> Path:
+    directory = Path(settings.render_spool_dir)
+    directory.mkdir(parents=True, exist_ok=True)
+    return directory / f"{uuid.uuid4().hex}{suffix}"
+
+
+def purge_spool(max_age_seconds: float = 3600) -> None:
+    """Remove stale files left behind by renders that were abandoned, e.g. on timeout."""
+    directory = Path(settings.render_spool_dir)
+    if not directory.is_dir():
+        return
+    cutoff = time.time() - max_age_seconds
+    for path in directory.iterdir():
+        try:
+            if path.stat().st_mtime < cutoff:
+                os.unlink(path)
+        except OSError:
+            pass
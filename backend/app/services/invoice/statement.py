@@ -0,0 +1,201 @@
+"""Multi-invoice statement PDFs for a single bill-to contact.
+
+A statement opens with a summary page (totals per status and an index of the
+invoices in the period) followed by every invoice on its own pages. Totals come
+from an aggregate query rather than from the invoice objects. Invoice graphs are
+loaded in chunks and appended to a spool file of pickled render payloads, which
+the render worker reads back one invoice at a time while the document is laid
+out, so neither process holds every invoice of the statement at once.
+"""
+import pickle
+from datetime import date
+from decimal import Decimal
+from pathlib import Path
+from typing import Iterator, List
+
+from reportlab.platypus import Flowable, PageBreak, Paragraph, Spacer, Table
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ...core.config import settings
+from ...core.exceptions import BadRequestError, NotFoundError
+from ...models.invoice import InvoiceStatusEnum
+from ..contact import crud as crud_contact
+from ..template.crud import get_template
+from . import crud
+from .compiled_template import CompiledTemplate, compile_template
+from .payload import (RenderInvoice, StatementLine, StatementPayload, StatementSummary, contact_payload,
+                      invoice_payload, template_payload)
+from .pdf import (FlowableStream, build_document, build_invoice_flowables, format_currency,
+                  render_to_spool)
+from .spool import RenderedPDF, spool_path
+
+
+def _format_period(date_from: date | None, date_to: date | None) -> str:
+    if date_from and date_to:
+        return f"{date_from.strftime('%B %d, %Y')} – {date_to.strftime('%B %d, %Y')}"
+    if date_from:
+        return f"Since {date_from.strftime('%B %d, %Y')}"
+    if date_to:
+        return f"Through {date_to.strftime('%B %d, %Y')}"
+    return "All dates"
+
+
+def build_summary_flowables(statement: StatementPayload, compiled: CompiledTemplate) -> List[Flowable]:
+    styles = compiled.styles
+    contact = statement.contact
+    summary = statement.summary
+
+    elements: List[Flowable] = [
+        Paragraph("STATEMENT", styles['InvoiceTitle']),
+        Paragraph(_format_period(statement.date_from, statement.date_to), styles['InvoiceNumber']),
+        Paragraph("Bill To:", styles['SectionHeader']),
+        Spacer(1, 12),
+        Paragraph(contact.name, styles['AddressText']),
+        Paragraph(contact.street_address or '', styles['AddressText']),
+        Paragraph(f"{contact.city or ''} {contact.state or ''} {contact.postal_code or ''}", styles['AddressText']),
+        Spacer(1, 12),
+    ]
+
+    totals_data = [
+        ['', 'Invoices:', f"{summary.invoice_count:,}"],
+        ['', 'Subtotal:', format_currency(summary.subtotal)],
+        ['', 'Tax:', format_currency(summary.tax)],
+    ]
+    for status in InvoiceStatusEnum:
+        if summary.status_counts.get(status.value):
+            totals_data.append([
+                '',
+                f"{status.value.capitalize()} ({summary.status_counts[status.value]}):",
+                format_currency(summary.status_totals[status.value]),
+            ])
+    totals_data.append(['', 'Total:', format_currency(summary.total)])
+    totals_table = Table(totals_data, colWidths=compiled.totals_col_widths)
+    totals_table.setStyle(compiled.totals_table_style)
+    elements.append(totals_table)
+    elements.append(Spacer(1, 24))
+
+    index_data = [['Invoice', 'Date', 'Status', 'Total']]
+    for line in statement.lines:
+        index_data.append([
+            Paragraph(f"#{line.invoice_number}", styles['ItemDescription']),
+            line.invoice_date.strftime('%Y-%m-%d'),
+            line.status.capitalize(),
+            format_currency(line.total),
+        ])
+    index_table = Table(index_data, colWidths=compiled.item_col_widths, repeatRows=1)
+    index_table.setStyle(compiled.items_table_style)
+    elements.append(index_table)
+    return elements
+
+
+def _read_invoices(path: str) -> Iterator[RenderInvoice]:
+    with open(path, 'rb') as f:
+        while True:
+            try:
+                yield pickle.load(f)
+            except EOFError:
+                return
+
+
+def _statement_chunks(statement: StatementPayload, compiled: CompiledTemplate) -> Iterator[List[Flowable]]:
+    yield build_summary_flowables(statement, compiled)
+    for invoice in _read_invoices(statement.invoices_path):
+        yield [PageBreak(), *build_invoice_flowables(invoice, compiled)]
+
+
+def _page_number_drawer(font_name: str):
+    def draw(canvas, doc) -> None:
+        canvas.saveState()
+        canvas.setFont(font_name, 7)
+        canvas.drawRightString(doc.pagesize[0] - doc.rightMargin, doc.bottomMargin / 2, f"Page {doc.page}")
+        canvas.restoreState()
+    return draw
+
+
+def render_statement_pdf(statement: StatementPayload, output_path: str) -> None:
+    """Render-pool entry point for statements."""
+    compiled = compile_template(statement.template)
+    doc = build_document(output_path, compiled)
+    draw_page_number = _page_number_drawer(compiled.main_font)
+    doc.build(
+        FlowableStream(_statement_chunks(statement, compiled)),
+        onFirstPage=draw_page_number,
+        onLaterPages=draw_page_number,
+    )
+
+
+def _status_key(status) -> str:
+    return status.value if isinstance(status, InvoiceStatusEnum) else str(status)
+
+
+async def generate_statement_pdf(
+    db: AsyncSession,
+    contact_id: int,
+    template_id: int,
+    user_id: int,
+    date_from: date | None = None,
+    date_to: date | None = None
+) -> RenderedPDF:
+    contact = await crud_contact.get_contact(db, contact_id, user_id)
+    template = await get_template(db, template_id, user_id)
+    if not template:
+        raise NotFoundError("template")
+
+    totals = await crud.get_statement_totals(db, user_id, contact_id, date_from, date_to)
+    summary = StatementSummary(
+        invoice_count=sum(row.invoice_count for row in totals),
+        subtotal=sum((Decimal(row.subtotal) for row in totals), Decimal('0')),
+        tax=sum((Decimal(row.tax) for row in totals), Decimal('0')),
+        total=sum((Decimal(row.total) for row in totals), Decimal('0')),
+        status_counts={_status_key(row.status): row.invoice_count for row in totals},
+        status_totals={_status_key(row.status): Decimal(row.total) for row in totals},
+    )
+    if summary.invoice_count > settings.statement_max_invoices:
+        raise BadRequestError(
+            f"Statements are limited to {settings.statement_max_invoices} invoices. Narrow the date range."
+        )
+
+    rows = await crud.get_statement_lines(db, user_id, contact_id, date_from, date_to)
+    lines = [
+        StatementLine(
+            invoice_number=row.invoice_number,
+            invoice_date=row.invoice_date,
+            status=_status_key(row.status),
+            total=row.total,
+        )
+        for row in rows
+    ]
+
+    invoices_path = spool_path('.invoices')
+    try:
+        await _spool_invoices(db, user_id, [row.id for row in rows], invoices_path)
+        statement = StatementPayload(
+            contact=contact_payload(contact),
+            date_from=date_from,
+            date_to=date_to,
+            summary=summary,
+            lines=lines,
+            invoices_path=str(invoices_path),
+            template=template_payload(template),
+        )
+        output_path = await render_to_spool(
+            render_statement_pdf, statement, timeout=settings.statement_timeout_seconds
+        )
+    finally:
+        invoices_path.unlink(missing_ok=True)
+    return RenderedPDF(path=output_path, temporary=True)
+
+
+async def _spool_invoices(db: AsyncSession, user_id: int, invoice_ids: List[int], path: Path) -> None:
+    """Write the render payloads of ``invoice_ids`` to ``path`` in order, loading one chunk of invoices at a time."""
+    chunk_size = settings.export_chunk_size
+    with open(path, 'wb') as f:
+        for start in range(0, len(invoice_ids), chunk_size):
+            chunk_ids = invoice_ids[start:start + chunk_size]
+            chunk = await crud.get_invoices_by_ids(db, user_id, chunk_ids)
+            by_id = {invoice.id: invoice_payload(invoice) for invoice in chunk}
+            for invoice in chunk:
+                db.expunge(invoice)
+            for invoice_id in chunk_ids:
+                if invoice_id in by_id:
+                    pickle.dump(by_id[invoice_id], f, protocol=pickle.HIGHEST_PROTOCOL)
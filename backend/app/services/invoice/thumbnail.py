@@ -0,0 +1,213 @@
+"""Small PNG previews of page one of an invoice or a template.
+
+Thumbnails are painted with Pillow from the canvas engine's drawing operations
+rather than by rasterizing a PDF: the page is laid out leniently (anything past
+page one simply falls off the bottom) and text is drawn as bars the width of
+the real text, which is all that is legible at this size.
+
+They are keyed by the PDF content key, so an invoice or template edit yields a
+new thumbnail. Requests never render: a missing thumbnail is queued for the
+render pool and a placeholder is served until it is ready.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from datetime import date
+from decimal import Decimal
+from functools import lru_cache
+from io import BytesIO
+from pathlib import Path
+from typing import Dict
+
+from PIL import Image, ImageDraw
+from reportlab.lib.colors import black
+from reportlab.pdfbase.pdfmetrics import stringWidth
+
+from ...core.config import settings
+from ...core.exceptions import ServiceUnavailableError
+from .canvas_renderer import LineOp, RectOp, TextOp, layout_page
+from .compiled_template import compile_template
+from .payload import (RenderContact, RenderInvoice, RenderItem, RenderPayload, RenderSubItem,
+                      RenderTemplate)
+from .pdf_cache import content_key
+from .render_pool import render_pool
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever painting changes in a way that alters the output
+THUMBNAIL_VERSION = 1
+SUPERSAMPLE = 3
+PAGE_BACKGROUND = (255, 255, 255)
+PAGE_BORDER = (210, 210, 210)
+# Text bars cover roughly the x-height and are drawn lighter than the text
+TEXT_BAR_HEIGHT = 0.55
+TEXT_BAR_TINT = 0.35
+
+
+def sample_invoice() -> RenderInvoice:
+    """Fixed content used to preview a template."""
+    contact = RenderContact(name="Sample Customer", street_address="100 Main Street",
+                            city="Springfield", state="IL", postal_code="62701")
+    items = [
+        RenderItem("Design consultation", Decimal('2'), Decimal('150.00'), Decimal('0'), Decimal('300.00'),
+                   [RenderSubItem("Initial workshop"), RenderSubItem("Follow-up review")]),
+        RenderItem("Implementation", Decimal('10'), Decimal('95.00'), Decimal('10'), Decimal('855.00')),
+        RenderItem("Hosting (monthly)", Decimal('1'), Decimal('45.00'), Decimal('0'), Decimal('45.00')),
+    ]
+    return RenderInvoice(
+        invoice_number="0001",
+        invoice_date=date(2024, 1, 1),
+        bill_to=contact,
+        send_to=contact,
+        items=items,
+        tax_rate=Decimal('8.25'),
+        discount_percentage=Decimal('0'),
+        subtotal=Decimal('1200.00'),
+        tax=Decimal('99.00'),
+        total=Decimal('1299.00'),
+        notes="Thank you for your business.",
+    )
+
+
+def template_sample_payload(template: RenderTemplate) -> RenderPayload:
+    return RenderPayload(invoice=sample_invoice(), template=template)
+
+
+def thumbnail_key(payload: RenderPayload, width: int) -> str:
+    return hashlib.sha256(f"{content_key(payload)}:{THUMBNAIL_VERSION}:{width}".encode()).hexdigest()
+
+
+def _rgb(color, tint: float = 0.0) -> tuple[int, int, int]:
+    color = color or black
+    return tuple(round(255 * (channel + (1 - channel) * tint)) for channel in (color.red, color.green, color.blue))
+
+
+def paint_thumbnail(payload: RenderPayload, width: int) -> bytes:
+    compiled = compile_template(payload.template)
+    ops = layout_page(payload.invoice, compiled, strict=False)
+    page_width, page_height = compiled.page_size
+    scale = width * SUPERSAMPLE / page_width
+    size = (width * SUPERSAMPLE, round(page_height * scale))
+    bottom_margin = compiled.margin_bottom
+
+    def point(x: float, y: float) -> tuple[float, float]:
+        return x * scale, (page_height - y) * scale
+
+    image = Image.new('RGB', size, PAGE_BACKGROUND)
+    draw = ImageDraw.Draw(image)
+    for op in ops:
+        if isinstance(op, RectOp):
+            left, top = point(op.x, op.y + op.height)
+            right, bottom = point(op.x + op.width, max(op.y, bottom_margin))
+            if bottom > top:
+                draw.rectangle((left, top, right, bottom), fill=_rgb(op.color))
+    for op in ops:
+        if isinstance(op, TextOp) and op.y >= bottom_margin:
+            text_width = stringWidth(op.text, op.font, op.size)
+            x = op.x - text_width if op.align_right else op.x
+            left, top = point(x, op.y + op.size * TEXT_BAR_HEIGHT)
+            right, bottom = point(x + text_width, op.y)
+            draw.rectangle((left, top, right, bottom), fill=_rgb(op.color, TEXT_BAR_TINT))
+    for op in ops:
+        if isinstance(op, LineOp) and min(op.y1, op.y2) >= bottom_margin:
+            draw.line((point(op.x1, op.y1), point(op.x2, op.y2)), fill=_rgb(op.color),
+                      width=max(1, round(op.width * scale)))
+
+    image = image.resize((width, round(page_height * width / page_width)), Image.LANCZOS)
+    ImageDraw.Draw(image).rectangle((0, 0, image.width - 1, image.height - 1), outline=PAGE_BORDER)
+    buffer = BytesIO()
+    image.save(buffer, format='PNG', optimize=True)
+    return buffer.getvalue()
+
+
+def render_thumbnail(payload: RenderPayload, width: int, output_path: str) -> None:
+    """Render-pool entry point; must stay a module-level function so it pickles."""
+    data = paint_thumbnail(payload, width)
+    tmp_path = f"{output_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, output_path)
+
+
+@lru_cache(maxsize=4)
+def placeholder(width: int) -> bytes:
+    """Blank page outline served while a thumbnail is being rendered."""
+    image = Image.new('RGB', (width, round(width * 11 / 8.5)), (245, 245, 245))
+    ImageDraw.Draw(image).rectangle((0, 0, image.width - 1, image.height - 1), outline=PAGE_BORDER)
+    buffer = BytesIO()
+    image.save(buffer, format='PNG', optimize=True)
+    return buffer.getvalue()
+
+
+class ThumbnailStore:
+    """Rendered thumbnails on disk, plus the background queue that produces them."""
+
+    def __init__(self, directory: str, concurrency: int):
+        self.directory = Path(directory)
+        self._concurrency = max(1, concurrency)
+        self._slots: asyncio.Semaphore | None = None
+        self._jobs: Dict[str, asyncio.Task] = {}
+
+    def path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.png"
+
+    def get(self, key: str) -> Path | None:
+        path = self.path(key)
+        try:
+            # Touch the file so purging keeps thumbnails that are still requested
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def schedule(self, key: str, payload: RenderPayload, width: int) -> None:
+        if key in self._jobs:
+            return
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self._concurrency)
+        task = asyncio.create_task(self._run(key, payload, width))
+        self._jobs[key] = task
+        task.add_done_callback(lambda _: self._jobs.pop(key, None))
+
+    async def _run(self, key: str, payload: RenderPayload, width: int) -> None:
+        async with self._slots:
+            # Leave the pool to renders somebody is waiting on; the next request reschedules
+            if render_pool.pending >= render_pool.max_queue // 2:
+                return
+            path = self.path(key)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            try:
+                await render_pool.run(render_thumbnail, payload, width, str(path))
+            except ServiceUnavailableError as e:
+                logger.info(f"Thumbnail render skipped: {e.detail}")
+            except Exception as e:
+                logger.error(f"Thumbnail render failed: {str(e)}", exc_info=True)
+
+    def shutdown(self) -> None:
+        for task in self._jobs.values():
+            task.cancel()
+        self._jobs.clear()
+
+    def purge(self, max_age_seconds: float) -> None:
+        """Remove thumbnails that have not been requested for ``max_age_seconds``."""
+        if not self.directory.is_dir():
+            return
+        cutoff = time.time() - max_age_seconds
+        for path in self.directory.glob('*/*.png'):
+            try:
+                if path.stat().st_mtime < cutoff:
+                    path.unlink()
+            except OSError:
+                pass
+
+
+thumbnail_store = ThumbnailStore(
+    directory=settings.thumbnail_dir,
+    concurrency=settings.thumbnail_concurrency,
+)
+
+
+def purge_thumbnails() -> None:
+    thumbnail_store.purge(settings.thumbnail_max_age_days * 86400)
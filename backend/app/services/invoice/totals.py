@@ -0,0 +1,184 @@
+"""Invoice counts and amounts per status, for the dashboard totals and the grouped views.
+
+``status_aggregates`` are the columns of one aggregate query: the invoice count,
+the summed total and a conditional ``COUNT(*) FILTER (WHERE status = ...)`` per
+status, so a single round trip answers what took one query per status.
+
+With ``invoice_totals_rollup`` enabled, ``get_invoice_totals`` reads
+``invoice_status_totals`` instead: one row per user and status that invoice
+create, update and delete adjust in the same transaction as the invoice, so the
+dashboard costs the same however many invoices a user has. The writes maintain
+the rollup whether or not it is read, and the migration that adds it fills it
+from the existing invoices, so it can be switched on at any time. Updates and
+deletes lock the invoice row before reading the status and total they replace,
+so concurrent writes to one invoice cannot both subtract the same old values.
+
+Rows written behind the application's back (bulk SQL, restores, the query plan
+harness's seed) leave the rollup stale; ``invoice_totals_drift`` reports the
+differences and ``rebuild_invoice_totals`` recomputes the rows from the
+invoices, both from the command line:
+
+    python -m backend.app.services.invoice.totals [--user-id ID] [--rebuild]
+"""
+import argparse
+import asyncio
+import sys
+from decimal import Decimal
+from typing import Any, Dict, List, Tuple
+
+from sqlalchemy import delete, func, select, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ...core.config import settings
+from ...models.invoice import Invoice, InvoiceStatusEnum, InvoiceStatusTotal
+
+
+def _status_label(status: InvoiceStatusEnum) -> str:
+    return f"{status.value.lower()}_count"
+
+
+def status_aggregates() -> List[Any]:
+    return [
+        func.count(Invoice.id).label('invoice_count'),
+        func.coalesce(func.sum(Invoice.total), 0).label('total_amount'),
+        *[func.count(Invoice.id).filter(Invoice.status == status).label(_status_label(status))
+          for status in InvoiceStatusEnum],
+    ]
+
+
+def status_counts(row) -> Dict[str, int]:
+    """Per-status counts of a row selected with ``status_aggregates``."""
+    return {status.value: getattr(row, _status_label(status)) for status in InvoiceStatusEnum}
+
+
+async def get_invoice_totals(db: AsyncSession, user_id: int) -> dict:
+    if settings.invoice_totals_rollup:
+        result = await db.execute(
+            select(InvoiceStatusTotal.status, InvoiceStatusTotal.invoice_count, InvoiceStatusTotal.total_amount)
+            .filter(InvoiceStatusTotal.user_id == user_id)
+        )
+        counts = {status.value: 0 for status in InvoiceStatusEnum}
+        total_amount = Decimal('0')
+        for row in result:
+            counts[row.status.value] = row.invoice_count
+            total_amount += row.total_amount
+        return {'total_count': sum(counts.values()), 'total_amount': total_amount, 'status_counts': counts}
+
+    result = await db.execute(select(*status_aggregates()).filter(Invoice.user_id == user_id))
+    row = result.one()
+    return {'total_count': row.invoice_count, 'total_amount': row.total_amount, 'status_counts': status_counts(row)}
+
+
+async def record_invoice_change(
+    db: AsyncSession,
+    user_id: int,
+    before: Tuple[InvoiceStatusEnum, Decimal] | None,
+    after: Tuple[InvoiceStatusEnum, Decimal] | None
+) -> None:
+    """Apply an invoice write to the user's rollup rows; ``before``/``after`` are (status, total), None when absent.
+
+    Runs in the caller's transaction, so the rollup commits or rolls back with the invoice.
+    """
+    deltas: Dict[InvoiceStatusEnum, List[Any]] = {}
+    if before is not None:
+        status, total = before
+        deltas.setdefault(status, [0, Decimal('0')])
+        deltas[status][0] -= 1
+        deltas[status][1] -= total or 0
+    if after is not None:
+        status, total = after
+        deltas.setdefault(status, [0, Decimal('0')])
+        deltas[status][0] += 1
+        deltas[status][1] += total or 0
+
+    for status, (count, amount) in deltas.items():
+        if not count and not amount:
+            continue
+        stmt = insert(InvoiceStatusTotal).values(
+            user_id=user_id, status=status, invoice_count=count, total_amount=amount
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[InvoiceStatusTotal.user_id, InvoiceStatusTotal.status],
+            set_={
+                'invoice_count': InvoiceStatusTotal.invoice_count + stmt.excluded.invoice_count,
+                'total_amount': InvoiceStatusTotal.total_amount + stmt.excluded.total_amount,
+            },
+        )
+        await db.execute(stmt)
+
+
+def _aggregate_rows(user_id: int | None):
+    stmt = select(
+        Invoice.user_id, Invoice.status, func.count(Invoice.id), func.coalesce(func.sum(Invoice.total), 0)
+    ).group_by(Invoice.user_id, Invoice.status)
+    if user_id is not None:
+        stmt = stmt.filter(Invoice.user_id == user_id)
+    return stmt
+
+
+async def invoice_totals_drift(db: AsyncSession, user_id: int | None = None) -> List[Dict[str, Any]]:
+    """Rollup rows that disagree with the invoices, for one user or all of them."""
+    rollup_stmt = select(
+        InvoiceStatusTotal.user_id, InvoiceStatusTotal.status,
+        InvoiceStatusTotal.invoice_count, InvoiceStatusTotal.total_amount
+    )
+    if user_id is not None:
+        rollup_stmt = rollup_stmt.filter(InvoiceStatusTotal.user_id == user_id)
+    expected = {(row[0], row[1]): (row[2], Decimal(row[3])) for row in await db.execute(_aggregate_rows(user_id))}
+    actual = {(row[0], row[1]): (row[2], Decimal(row[3])) for row in await db.execute(rollup_stmt)}
+
+    drift = []
+    for key in sorted(expected.keys() | actual.keys(), key=lambda key: (key[0], key[1].value)):
+        # An emptied status keeps a zero row, which matches no invoices
+        want = expected.get(key, (0, Decimal('0')))
+        have = actual.get(key, (0, Decimal('0')))
+        if want != have:
+            drift.append({
+                'user_id': key[0], 'status': key[1].value,
+                'invoice_count': have[0], 'expected_count': want[0],
+                'total_amount': have[1], 'expected_amount': want[1],
+            })
+    return drift
+
+
+async def rebuild_invoice_totals(db: AsyncSession, user_id: int | None = None) -> None:
+    """Recompute the rollup rows from the invoices, for one user or all of them, and commit."""
+    if db.get_bind().dialect.name == 'postgresql':
+        # Holds off the writes' upserts until the rebuilt rows commit; reads carry on
+        await db.execute(text("LOCK TABLE invoice_status_totals IN EXCLUSIVE MODE"))
+    stmt = delete(InvoiceStatusTotal)
+    if user_id is not None:
+        stmt = stmt.filter(InvoiceStatusTotal.user_id == user_id)
+    await db.execute(stmt)
+    await db.execute(insert(InvoiceStatusTotal).from_select(
+        ['user_id', 'status', 'invoice_count', 'total_amount'], _aggregate_rows(user_id)
+    ))
+    await db.commit()
+
+
+async def _main(args) -> int:
+    from ...database import async_session, engine
+
+    engine.echo = False
+    async with async_session() as db:
+        drift = await invoice_totals_drift(db, args.user_id)
+        for row in drift:
+            print(f"user {row['user_id']} {row['status']}: {row['invoice_count']} invoices {row['total_amount']}, "
+                  f"expected {row['expected_count']} invoices {row['expected_amount']}", file=sys.stderr)
+        if drift and args.rebuild:
+            await rebuild_invoice_totals(db, args.user_id)
+            print(f"rebuilt invoice_status_totals for {len({row['user_id'] for row in drift})} users", file=sys.stderr)
+            return 0
+    return 1 if drift else 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Check invoice_status_totals against the invoices and rebuild it.")
+    parser.add_argument('--user-id', type=int, help="Only this user (default: all users)")
+    parser.add_argument('--rebuild', action='store_true', help="Recompute the rows if any disagree")
+    return asyncio.run(_main(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
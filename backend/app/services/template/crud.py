@@ -9,6 +9,7 @@ from sqlalchemy.future import select
 from ...core.exceptions import AlreadyExistsError, BadRequestError, NotFoundError
 from ...models.template import Template
 from ...schemas.template import TemplateCreate
+from ..invoice.pdf_cache import pdf_cache
 
 logger = logging.getLogger(__name__)
 
@@ -99,6 +100,7 @@ DEFAULT_TEMPLATES = {
 
 
 async def create_or_update_default_templates(db: AsyncSession):
+    changed_ids = []
     for name, config in DEFAULT_TEMPLATES.items():
         template_name = name.capitalize()
         template_data = {
@@ -109,6 +111,8 @@ async def create_or_update_default_templates(db: AsyncSession):
         result = await db.execute(select(Template).filter(Template.name == template_name))
         db_template = result.scalar_one_or_none()
         if db_template:
+            if any(getattr(db_template, key) != value for key, value in config.items()):
+                changed_ids.append(db_template.id)
             for key, value in template_data.items():
                 if key != 'id':
                     setattr(db_template, key, value)
@@ -122,6 +126,9 @@ async def create_or_update_default_templates(db: AsyncSession):
         await db.rollback()
         raise
 
+    for template_id in changed_ids:
+        pdf_cache.invalidate_template(template_id)
+
 
 async def create_template(db: AsyncSession, template: TemplateCreate, user_id: int):
     db_template = Template(**template.model_dump(), user_id=user_id)
@@ -173,6 +180,7 @@ async def update_template(db: AsyncSession, template_id: int, template: Template
         await db.commit()
         await db.refresh(db_template)
         logger.info(f"Template updated: id={template_id}, user_id={user_id}")
+        pdf_cache.invalidate_template(template_id)
         get_template.cache_clear()  # Clear the cache for this template
         get_templates.cache_clear()  # Clear the cache for all templates
         return db_template
@@ -224,6 +232,7 @@ async def delete_template(db: AsyncSession, template_id: int, user_id: int) -> T
     await db.delete(db_template)
     await db.commit()
     logger.info(f"Template deleted: id={template_id}, user_id={user_id}")
+    pdf_cache.invalidate_template(template_id)
     get_template.cache_clear()  # Clear the cache for this template
     get_templates.cache_clear()  # Clear the cache for all templates
     return db_template
@@ -239,6 +248,7 @@ async def soft_delete_template(db: AsyncSession, template_id: int, user_id: int)
     try:
         await db.commit()
         logger.info(f"Template soft deleted: id={template_id}, user_id={user_id}")
+        pdf_cache.invalidate_template(template_id)
         get_template.cache_clear()
         get_templates.cache_clear()
         return db_template
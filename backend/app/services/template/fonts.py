@@ -0,0 +1,142 @@
+"""Local store of TrueType fonts that templates can reference.
+
+Fonts belong to the user who uploaded them and are saved to ``font_dir`` as
+``<user_id>/<name>.ttf``. A template uses one by putting its name in
+``fonts["main"]`` or ``fonts["accent"]``; only the template owner's fonts are
+accepted, and ``template_payload`` resolves the name to the owner's font
+(``owned_font_name``), so templates of different users never share one.
+
+Parsing a font file is slow for large fonts, so it happens once per process:
+the API process and every render worker register all stored fonts at startup,
+and a font uploaded later is registered on first use. Requests that compile a
+template in the API process call ``prepare_fonts`` first, which does that
+registration in a thread instead of on the event loop. ReportLab embeds only
+the glyphs a document uses, so custom fonts add little to each PDF.
+"""
+import asyncio
+import logging
+import os
+import re
+from io import BytesIO
+from pathlib import Path
+from typing import Iterable, List
+
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFError, TTFont
+
+from ...core.config import settings
+from ...core.exceptions import AlreadyExistsError, BadRequestError
+
+logger = logging.getLogger(__name__)
+
+STANDARD_FONTS = frozenset(pdfmetrics.standardFonts)
+FONT_NAME_PATTERN = re.compile(r'^[A-Za-z0-9][A-Za-z0-9_-]{0,63}$')
+OWNED_FONT_PATTERN = re.compile(r'^u(\d+)/([A-Za-z0-9][A-Za-z0-9_-]{0,63})$')
+FONT_EXTENSION = '.ttf'
+
+
+def _font_dir(user_id: int) -> Path:
+    return Path(settings.font_dir) / str(user_id)
+
+
+def font_path(user_id: int, name: str) -> Path:
+    return _font_dir(user_id) / f"{name}{FONT_EXTENSION}"
+
+
+def owned_font_name(user_id: int, name: str) -> str:
+    """Name a user's stored font is registered under with ReportLab."""
+    return f"u{user_id}/{name}"
+
+
+def resolve_font(name, user_id: int | None):
+    """The name a template owned by ``user_id`` renders ``name`` with; standard fonts stay as they are."""
+    if user_id is None or not isinstance(name, str) or name in STANDARD_FONTS or not FONT_NAME_PATTERN.match(name):
+        return name
+    return owned_font_name(user_id, name)
+
+
+def display_name(name: str) -> str:
+    """The name the user gave a font, without its owner."""
+    match = OWNED_FONT_PATTERN.match(name)
+    return match.group(2) if match else name
+
+
+def stored_fonts(user_id: int) -> List[str]:
+    directory = _font_dir(user_id)
+    if not directory.is_dir():
+        return []
+    return sorted(path.stem for path in directory.glob(f"*{FONT_EXTENSION}"))
+
+
+def is_registered(name: str) -> bool:
+    return name in STANDARD_FONTS or name in pdfmetrics.getRegisteredFontNames()
+
+
+def ensure_font(name: str) -> bool:
+    """Make ``name`` usable in this process, registering it from the store if needed."""
+    if is_registered(name):
+        return True
+    match = OWNED_FONT_PATTERN.match(name)
+    if not match:
+        return False
+    path = font_path(int(match.group(1)), match.group(2))
+    if not path.is_file():
+        return False
+    try:
+        pdfmetrics.registerFont(TTFont(name, str(path)))
+    except TTFError as e:
+        logger.error(f"Could not register font {name}: {str(e)}")
+        return False
+    return True
+
+
+def register_fonts() -> None:
+    """Register every stored font; run once per process at startup."""
+    root = Path(settings.font_dir)
+    user_dirs = [path for path in root.iterdir() if path.is_dir() and path.name.isdigit()] if root.is_dir() else []
+    registered = [
+        name
+        for user_dir in user_dirs
+        for name in stored_fonts(int(user_dir.name))
+        if ensure_font(owned_font_name(int(user_dir.name), name))
+    ]
+    if registered:
+        logger.info(f"Registered {len(registered)} custom fonts in process {os.getpid()}")
+
+
+async def prepare_fonts(template) -> None:
+    """Register the fonts of a ``RenderTemplate`` that this process has not loaded yet, off the event loop."""
+    names = [name for name in template.fonts.values() if isinstance(name, str) and not is_registered(name)]
+    if names:
+        await asyncio.to_thread(lambda: [ensure_font(name) for name in names])
+
+
+def unknown_fonts(names: Iterable[str], user_id: int) -> List[str]:
+    """Names among ``names`` that are neither standard fonts nor fonts ``user_id`` has stored."""
+    return sorted({
+        str(name) for name in names
+        if not isinstance(name, str)
+        or (name not in STANDARD_FONTS and not (FONT_NAME_PATTERN.match(name) and font_path(user_id, name).is_file()))
+    })
+
+
+def store_font(user_id: int, name: str, data: bytes) -> None:
+    if not FONT_NAME_PATTERN.match(name):
+        raise BadRequestError("Font names may only contain letters, digits, '-' and '_' (up to 64 characters).")
+    if name in STANDARD_FONTS or font_path(user_id, name).exists():
+        raise AlreadyExistsError("font")
+    if len(data) > settings.font_max_bytes:
+        raise BadRequestError(f"Font files may not exceed {settings.font_max_bytes} bytes.")
+    try:
+        # Parse before storing so a broken file never reaches the render workers
+        font = TTFont(owned_font_name(user_id, name), BytesIO(data))
+    except Exception as e:
+        raise BadRequestError(f"Not a usable TrueType font: {str(e)}")
+
+    path = font_path(user_id, name)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    tmp_path.write_bytes(data)
+    os.replace(tmp_path, path)
+    pdfmetrics.registerFont(font)
+    logger.info(f"Stored font {name} for user {user_id} ({len(data)} bytes)")
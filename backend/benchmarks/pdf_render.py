@@ -0,0 +1,278 @@
+"""Benchmark ``generate_pdf`` across invoice sizes, item shapes and default templates.
+
+Every case runs in a fresh interpreter so peak RSS belongs to that case alone.
+Results are written as JSON that can be diffed against a run from another commit:
+
+    python -m backend.benchmarks.pdf_render --output results.json
+    python -m backend.benchmarks.pdf_render --sizes 1 10 100 --compare results.json
+
+Run from the repository root with the backend environment (``.env``) available.
+For each template and variant the report includes the scaling exponent between
+consecutive sizes: about 1.0 is linear, and anything much higher points at a
+superlinear blowup.
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timezone
+from decimal import Decimal
+
+DEFAULT_SIZES = [1, 10, 100, 1000, 10000]
+VARIANTS = {
+    'plain': {'subitems': 0, 'discounts': False},
+    'subitems': {'subitems': 2, 'discounts': False},
+    'discounts': {'subitems': 0, 'discounts': True},
+    'full': {'subitems': 2, 'discounts': True},
+}
+SUPERLINEAR_EXPONENT = 1.2
+
+
+def build_payload(template_name: str, items: int, subitems: int, discounts: bool, renderer: str = 'platypus'):
+    from backend.app.services.invoice.payload import (RenderContact, RenderInvoice, RenderItem,
+                                                      RenderPayload, RenderSubItem, RenderTemplate)
+    from backend.app.models.invoice import calculate_invoice_totals, calculate_line_total
+    from backend.app.services.template.crud import DEFAULT_TEMPLATES
+
+    render_items = []
+    for i in range(items):
+        quantity = Decimal(i % 7 + 1)
+        unit_price = Decimal('12.50') + Decimal(i % 13)
+        discount = Decimal((i % 4) * 5) if discounts else Decimal('0')
+        render_items.append(RenderItem(
+            description=f"Consulting services, work package {i + 1}",
+            quantity=quantity,
+            unit_price=unit_price,
+            discount_percentage=discount,
+            line_total=calculate_line_total(quantity, unit_price, discount),
+            subitems=[RenderSubItem(f"Deliverable {i + 1}.{j + 1}") for j in range(subitems)],
+        ))
+
+    discount_percentage = Decimal('10') if discounts else Decimal('0')
+    tax_rate = Decimal('8.25')
+    subtotal = sum((item.line_total for item in render_items), Decimal('0'))
+    totals = calculate_invoice_totals(subtotal, discount_percentage, tax_rate)
+    contact = RenderContact(
+        name="Benchmark Customer LLC",
+        street_address="100 Main Street",
+        city="Springfield",
+        state="IL",
+        postal_code="62701",
+    )
+    invoice = RenderInvoice(
+        invoice_number="BENCH-0001",
+        invoice_date=date(2024, 1, 1),
+        bill_to=contact,
+        send_to=contact,
+        items=render_items,
+        tax_rate=tax_rate,
+        discount_percentage=discount_percentage,
+        subtotal=subtotal,
+        tax=totals['tax'],
+        total=totals['total'],
+        notes="Thank you for your business.",
+    )
+    config = DEFAULT_TEMPLATES[template_name]
+    template = RenderTemplate(
+        name=template_name,
+        colors=config['colors'],
+        fonts=config['fonts'],
+        font_sizes=config['font_sizes'],
+        layout={**config['layout'], 'renderer': renderer},
+    )
+    return RenderPayload(invoice=invoice, template=template)
+
+
+def _max_rss_bytes() -> int:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+
+def run_case(case: dict) -> dict:
+    """Render one case in the current process and return its measurements."""
+    from backend.app.services.invoice.pdf import generate_pdf
+
+    payload = build_payload(case['template'], case['items'], renderer=case.get('renderer', 'platypus'),
+                            **VARIANTS[case['variant']])
+    baseline_rss = _max_rss_bytes()
+    timings = []
+    size = 0
+    with tempfile.TemporaryDirectory() as directory:
+        output_path = os.path.join(directory, 'invoice.pdf')
+        for _ in range(case['repeat']):
+            start = time.perf_counter()
+            generate_pdf(payload.invoice, payload.template, output=output_path)
+            timings.append(time.perf_counter() - start)
+            size = os.path.getsize(output_path)
+
+    return {
+        **case,
+        'wall_seconds': statistics.median(timings),
+        'wall_seconds_min': min(timings),
+        'peak_rss_bytes': _max_rss_bytes(),
+        'render_rss_bytes': max(0, _max_rss_bytes() - baseline_rss),
+        'output_bytes': size,
+    }
+
+
+def _spawn_case(case: dict, timeout: float) -> dict:
+    command = [sys.executable, '-m', 'backend.benchmarks.pdf_render', '--run-case', json.dumps(case)]
+    try:
+        completed = subprocess.run(command, capture_output=True, text=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        return {**case, 'error': f"timed out after {timeout:g}s"}
+    if completed.returncode != 0:
+        return {**case, 'error': completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else 'failed'}
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def _case_name(result: dict) -> str:
+    name = f"{result['template']}/{result['variant']}/{result['items']}"
+    renderer = result.get('renderer', 'platypus')
+    return name if renderer == 'platypus' else f"{renderer}:{name}"
+
+
+def scaling_curves(results: list) -> dict:
+    """Scaling exponent between consecutive sizes for every template and variant."""
+    series: dict = {}
+    for result in results:
+        if 'error' not in result:
+            series.setdefault(_case_name(result).rsplit('/', 1)[0], []).append(result)
+
+    curves = {}
+    for name, points in series.items():
+        points.sort(key=lambda r: r['items'])
+        segments = []
+        for low, high in zip(points, points[1:]):
+            if low['wall_seconds'] <= 0 or high['wall_seconds'] <= 0:
+                continue
+            exponent = (math.log(high['wall_seconds'] / low['wall_seconds'])
+                        / math.log(high['items'] / low['items']))
+            segments.append({
+                'from_items': low['items'],
+                'to_items': high['items'],
+                'time_exponent': round(exponent, 3),
+                'superlinear': exponent > SUPERLINEAR_EXPONENT,
+            })
+        curves[name] = segments
+    return curves
+
+
+def _git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: list, baseline_path: str, threshold: float) -> list:
+    with open(baseline_path) as f:
+        baseline = {_case_name(r): r for r in json.load(f)['results'] if 'error' not in r}
+
+    rows = []
+    for result in results:
+        previous = baseline.get(_case_name(result))
+        if previous is None or 'error' in result:
+            continue
+        time_ratio = result['wall_seconds'] / previous['wall_seconds'] if previous['wall_seconds'] else math.inf
+        rss_ratio = (result['peak_rss_bytes'] / previous['peak_rss_bytes']
+                     if previous['peak_rss_bytes'] else math.inf)
+        rows.append({
+            'case': _case_name(result),
+            'time_ratio': round(time_ratio, 3),
+            'rss_ratio': round(rss_ratio, 3),
+            'size_ratio': round(result['output_bytes'] / previous['output_bytes'], 3) if previous['output_bytes'] else None,
+            'regressed': time_ratio > threshold or rss_ratio > threshold,
+        })
+    return rows
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES)
+    parser.add_argument('--templates', nargs='+', help="Default template names (all by default)")
+    parser.add_argument('--variants', nargs='+', choices=sorted(VARIANTS), default=sorted(VARIANTS))
+    parser.add_argument('--renderers', nargs='+', choices=['platypus', 'canvas'], default=['platypus'])
+    parser.add_argument('--repeat', type=int, default=3, help="Renders per case; the median time is reported")
+    parser.add_argument('--timeout', type=float, default=900, help="Seconds before a case is abandoned")
+    parser.add_argument('--output', help="Write results to this JSON file instead of stdout")
+    parser.add_argument('--compare', metavar='BASELINE', help="Results file from an earlier run to compare against")
+    parser.add_argument('--threshold', type=float, default=1.1,
+                        help="Time or RSS ratio above which a case counts as a regression")
+    parser.add_argument('--run-case', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_case:
+        print(json.dumps(run_case(json.loads(args.run_case))))
+        return 0
+
+    from backend.app.services.template.crud import DEFAULT_TEMPLATES
+    templates = args.templates or list(DEFAULT_TEMPLATES)
+    unknown = set(templates) - set(DEFAULT_TEMPLATES)
+    if unknown:
+        parser.error(f"Unknown templates: {', '.join(sorted(unknown))}")
+
+    results = []
+    cases = [
+        {'template': template, 'variant': variant, 'items': items, 'renderer': renderer, 'repeat': args.repeat}
+        for renderer in args.renderers
+        for template in templates
+        for variant in args.variants
+        for items in sorted(args.sizes)
+    ]
+    for case in cases:
+        result = _spawn_case(case, args.timeout)
+        results.append(result)
+        if 'error' in result:
+            print(f"{_case_name(result):40} ERROR {result['error']}", file=sys.stderr)
+        else:
+            print(
+                f"{_case_name(result):40} {result['wall_seconds']:9.3f}s "
+                f"{result['peak_rss_bytes'] / 2**20:8.1f} MiB {result['output_bytes'] / 1024:10.1f} KiB",
+                file=sys.stderr,
+            )
+
+    report = {
+        'meta': {
+            'revision': _git_revision(),
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+        },
+        'results': results,
+        'scaling': scaling_curves(results),
+    }
+    if args.compare:
+        report['comparison'] = compare(results, args.compare, args.threshold)
+
+    for name, segments in report['scaling'].items():
+        for segment in segments:
+            if segment['superlinear']:
+                print(f"superlinear: {name} {segment['from_items']}->{segment['to_items']} items "
+                      f"(exponent {segment['time_exponent']})", file=sys.stderr)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+    regressions = [row for row in report.get('comparison', []) if row['regressed']]
+    for row in regressions:
+        print(f"regression: {row['case']} time x{row['time_ratio']} rss x{row['rss_ratio']}", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,249 @@
+"""Check the PostgreSQL plans of the invoice and contact list queries for sequential scans.
+
+Each case calls the real query builders (``get_invoices`` with its filters,
+sorts and a cursor page, statements, exports and contact search) for one user of
+a large seeded dataset, captures every statement they execute and runs
+``EXPLAIN`` on it. A plan that reads ``invoices`` or ``contacts`` with a
+sequential scan fails the run, so an index dropped or a query changed in a way
+the indexes no longer serve shows up before it reaches production:
+
+    python -m backend.benchmarks.query_plans --seed --users 20 --invoices 20000
+    python -m backend.benchmarks.query_plans --output plans.json
+
+Run from the repository root against a scratch PostgreSQL database
+(``DATABASE_URL``) migrated to head. ``--seed`` replaces the harness's own users
+and their data and leaves everything else alone; later runs reuse them.
+"""
+import argparse
+import asyncio
+import json
+import sys
+from datetime import date, datetime, timezone
+
+HARNESS_EMAIL = "plan-harness-{}@example.invalid"
+CHECKED_TABLES = {'invoices', 'contacts'}
+PAGE_SIZE = 50
+
+SORTS = [None, 'invoice_number', 'bill_to_name', 'send_to_name', 'date', 'total', 'status']
+FILTERS = {
+    'unfiltered': {},
+    'status': {'status': 'OVERDUE'},
+    'date_range': {'date_from': date(2020, 1, 1), 'date_to': date(2020, 3, 31)},
+    'total_range': {'total_min': 1000, 'total_max': 1500},
+    'status_date_range': {'status': 'PAID', 'date_from': date(2021, 1, 1), 'date_to': date(2021, 12, 31)},
+    'invoice_number_search': {'invoice_number': '00042'},
+    'bill_to_name_search': {'bill_to_name': 'Contact 17 '},
+}
+# Sorting every invoice of a user by a contact name reads all of that user's rows
+# and may fairly scan the contacts it joins
+SEQ_SCAN_ALLOWED = {'bill_to_name': {'contacts'}, 'send_to_name': {'contacts'}}
+
+
+class RecordingSession:
+    """Passes queries through to a session and keeps the statements it ran."""
+
+    def __init__(self, session):
+        self._session = session
+        self.statements = []
+
+    def __getattr__(self, name):
+        return getattr(self._session, name)
+
+    async def execute(self, statement, *args, **kwargs):
+        self.statements.append(statement)
+        return await self._session.execute(statement, *args, **kwargs)
+
+    async def scalar(self, statement, *args, **kwargs):
+        self.statements.append(statement)
+        return await self._session.scalar(statement, *args, **kwargs)
+
+
+async def seed(db, users: int, invoices: int, contacts: int) -> None:
+    from sqlalchemy import delete, select, text
+
+    from backend.app.models.contact import Contact
+    from backend.app.models.invoice import Invoice
+    from backend.app.models.template import Template
+    from backend.app.models.user import User
+    from backend.app.services.invoice.totals import rebuild_invoice_totals
+
+    emails = [HARNESS_EMAIL.format(n) for n in range(users)]
+    old_users = select(User.id).filter(User.email.like(HARNESS_EMAIL.format('%')))
+    await db.execute(delete(Invoice).filter(Invoice.user_id.in_(old_users)))
+    await db.execute(delete(Contact).filter(Contact.user_id.in_(old_users)))
+    await db.execute(delete(User).filter(User.id.in_(old_users)))
+
+    template_id = await db.scalar(select(Template.id).filter(Template.is_default == True).limit(1))
+    if template_id is None:
+        template_id = await db.scalar(select(Template.id).filter(Template.name == 'plan-harness'))
+    if template_id is None:
+        template = Template(name='plan-harness', colors={}, fonts={}, font_sizes={}, layout={})
+        db.add(template)
+        await db.flush()
+        template_id = template.id
+
+    user_ids = []
+    for email in emails:
+        user = User(email=email, hashed_password='!')
+        db.add(user)
+        await db.flush()
+        user_ids.append(user.id)
+        result = await db.execute(text(
+            "INSERT INTO contacts (user_id, name, email) "
+            "SELECT :user_id, 'Contact ' || n || ' ' || substr(md5(n::text), 1, 8), "
+            "       'contact' || n || '@example' || :user_id || '.invalid' "
+            "FROM generate_series(1, :count) AS n RETURNING id"
+        ), {'user_id': user.id, 'count': contacts})
+        contact_ids = list(result.scalars())
+        await db.execute(text(
+            "INSERT INTO invoices (user_id, invoice_number, invoice_date, bill_to_id, send_to_id, tax_rate, "
+            "                      discount_percentage, template_id, status, client_type, invoice_type, "
+            "                      subtotal, tax, total) "
+            "SELECT :user_id, 'PH' || :user_id || '-' || lpad(n::text, 7, '0'), "
+            "       DATE '2019-01-01' + (n * 7919 % 2200), "
+            "       (CAST(:contact_ids AS integer[]))[1 + n % :contact_count], "
+            "       (CAST(:contact_ids AS integer[]))[1 + n * 31 % :contact_count], "
+            "       8.25, 0, :template_id, "
+            "       ((ARRAY['PAID', 'UNPAID', 'OVERDUE'])[1 + n % 3])::invoicestatusenum, "
+            "       ((ARRAY['INDIVIDUAL', 'BUSINESS'])[1 + n % 2])::clienttypeenum, "
+            "       ((ARRAY['SERVICE', 'PRODUCT'])[1 + n % 2])::invoicetypeenum, "
+            "       s.subtotal, round(s.subtotal * 0.0825, 2), round(s.subtotal * 1.0825, 2) "
+            "FROM generate_series(1, :count) AS n, "
+            "     LATERAL (SELECT round((n * 7907 % 500000) / 100.0, 2) AS subtotal) AS s"
+        ), {'user_id': user.id, 'contact_ids': contact_ids, 'contact_count': len(contact_ids),
+            'template_id': template_id, 'count': invoices})
+        print(f"seeded {email}: {invoices} invoices, {contacts} contacts", file=sys.stderr)
+    await db.commit()
+    # The invoices went in as raw SQL, past the writes that keep the rollup current
+    for user_id in user_ids:
+        await rebuild_invoice_totals(db, user_id)
+    for table in ('invoices', 'contacts'):
+        await db.execute(text(f"ANALYZE {table}"))
+    await db.commit()
+
+
+def _cases(user_id: int, contact_id: int) -> list:
+    """(name, coroutine factory taking a session, tables allowed a sequential scan)."""
+    from backend.app.services.contact import crud as crud_contact
+    from backend.app.services.invoice import crud
+
+    async def list_pages(db, sort_by, filters):
+        _, _, _, next_cursor = await crud.get_invoices(
+            db, user_id, limit=PAGE_SIZE, sort_by=sort_by, sort_order='desc', count='exact', **filters
+        )
+        if next_cursor:
+            await crud.get_invoices(db, user_id, limit=PAGE_SIZE, sort_by=sort_by, sort_order='desc',
+                                    count='exact', cursor=next_cursor, **filters)
+
+    cases = []
+    for sort_by in SORTS:
+        for filter_name, filters in FILTERS.items():
+            cases.append((
+                f"list sort={sort_by or 'default'} filter={filter_name}",
+                lambda db, sort_by=sort_by, filters=filters: list_pages(db, sort_by, filters),
+                SEQ_SCAN_ALLOWED.get(sort_by, set()),
+            ))
+    for filter_name, filters in FILTERS.items():
+        cases.append((f"export ids filter={filter_name}",
+                      lambda db, filters=filters: crud.get_invoice_ids(db, user_id, **filters), set()))
+    cases.append(("statement totals",
+                  lambda db: crud.get_statement_totals(db, user_id, contact_id, date(2020, 1, 1), None), set()))
+    cases.append(("statement lines",
+                  lambda db: crud.get_statement_lines(db, user_id, contact_id, date(2020, 1, 1), None), set()))
+    cases.append(("contacts list sort=name",
+                  lambda db: crud_contact.get_contacts(db, user_id, sort_by='name'), set()))
+    cases.append(("contacts name search",
+                  lambda db: crud_contact.get_contacts(db, user_id, name='Contact 12'), set()))
+    cases.append(("contacts email search",
+                  lambda db: crud_contact.get_contacts(db, user_id, email='contact12@'), set()))
+    return cases
+
+
+def plan_nodes(plan: dict):
+    yield plan
+    for child in plan.get('Plans', []):
+        yield from plan_nodes(child)
+
+
+async def check_plans(analyze: bool) -> list:
+    from sqlalchemy import select
+
+    from backend.app.database import async_session
+    from backend.app.models.contact import Contact
+    from backend.app.models.user import User
+    from backend.app.services.invoice.counts import explain
+
+    async with async_session() as db:
+        user_id = await db.scalar(select(User.id).filter(User.email == HARNESS_EMAIL.format(0)))
+        if user_id is None:
+            raise SystemExit("No harness data; run with --seed first")
+        contact_id = await db.scalar(select(Contact.id).filter(Contact.user_id == user_id).limit(1))
+
+    results = []
+    for name, run, allowed in _cases(user_id, contact_id):
+        async with async_session() as session:
+            db = RecordingSession(session)
+            await run(db)
+            for index, statement in enumerate(db.statements):
+                plan = await explain(session, statement, analyze=analyze)
+                nodes = list(plan_nodes(plan['Plan']))
+                seq_scans = sorted({node['Relation Name'] for node in nodes
+                                    if node['Node Type'] == 'Seq Scan' and node.get('Relation Name') in CHECKED_TABLES})
+                results.append({
+                    'case': name,
+                    'statement': index,
+                    'total_cost': plan['Plan']['Total Cost'],
+                    'execution_ms': plan.get('Execution Time'),
+                    'indexes': sorted({node['Index Name'] for node in nodes if 'Index Name' in node}),
+                    'seq_scans': seq_scans,
+                    'failed': bool(set(seq_scans) - allowed),
+                })
+    return results
+
+
+async def _main(args) -> list:
+    from backend.app.database import async_session, engine
+
+    engine.echo = False
+    if args.seed:
+        async with async_session() as db:
+            await seed(db, args.users, args.invoices, args.contacts)
+    return await check_plans(args.analyze)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--seed', action='store_true', help="(Re)create the harness dataset first")
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--invoices', type=int, default=20000, help="Invoices per seeded user")
+    parser.add_argument('--contacts', type=int, default=500, help="Contacts per seeded user")
+    parser.add_argument('--analyze', action='store_true', help="Use EXPLAIN ANALYZE and report execution times")
+    parser.add_argument('--output', help="Write results to this JSON file instead of stdout")
+    args = parser.parse_args()
+
+    results = asyncio.run(_main(args))
+    for row in results:
+        timing = f" {row['execution_ms']:9.2f} ms" if row['execution_ms'] is not None else ""
+        status = "FAIL" if row['failed'] else "ok  "
+        print(f"{status} {row['case']:55} #{row['statement']} cost {row['total_cost']:>12.2f}{timing} "
+              f"{', '.join(row['indexes']) or '-'}", file=sys.stderr)
+
+    report = {
+        'meta': {'timestamp': datetime.now(timezone.utc).isoformat()},
+        'results': results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+    failures = [row for row in results if row['failed']]
+    for row in failures:
+        print(f"sequential scan: {row['case']} #{row['statement']} on {', '.join(row['seq_scans'])}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())